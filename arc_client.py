@@ -0,0 +1,291 @@
+"""
+Cliente común para las APIs de Arc XP, usado por todos los scripts.
+
+Centraliza lo que antes cada script armaba por su cuenta: sesión con conexiones keep-alive
+reutilizables, headers de autenticación, gzip, timeouts, reintentos con backoff + jitter,
+manejo de 429/`Retry-After` y el limitador de velocidad (opcionalmente compartido entre
+procesos vía ARC_RATE_BUDGET_FILE). La velocidad se ajusta en un solo lugar: las variables
+MAX_REQUESTS_PER_SECOND y RATE_LIMIT_BURST. Cada intento queda registrado en arc_metrics.
+
+Cada cliente pertenece a una familia de endpoints (`content` por defecto; `draft`, `video`,
+`photo` para los borrados) con su propio limitador y pool de conexiones. Una familia puede
+tener su propia cuota con MAX_REQUESTS_PER_SECOND_<FAMILIA> y RATE_LIMIT_BURST_<FAMILIA>.
+
+Con ARC_QUOTA_BROKER (ver quota_broker.py) los limitadores además piden cada token al broker
+local, que reparte la cuota entre los scripts que corren a la vez según la `priority` del
+cliente: `interactive` > `audit` (default) > `bulk`.
+
+- `ArcClient`: interfaz bloqueante sobre requests (auditoria_notas, verify_sample, ...).
+  `get()` devuelve un `requests.Response` y los errores son excepciones de requests.
+- `AsyncArcClient`: interfaz asíncrona sobre aiohttp (pipeline_notas, auditoria_videos).
+  Los errores HTTP finales se lanzan como `aiohttp.ClientResponseError`.
+"""
+import asyncio
+import email.utils
+import json
+import os
+import random
+import time
+from collections import namedtuple
+
+from arc_metrics import metrics
+from quota_broker import DEFAULT_PRIORITY, quota_client_from_env
+from rate_limiter import AsyncRateLimiter, RateLimiter, shared_budget_from_env
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    requests = None
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_POOL_SIZE = 30
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+RETRYABLE_STATUSES = {500, 502, 503, 504}
+DEFAULT_FAMILY = "content"
+
+
+def content_api_base(org_id=None):
+    """URL base de las APIs de la organización. ARC_API_BASE_URL la reemplaza (p. ej. por mock_arc_server.py)."""
+    override = os.getenv("ARC_API_BASE_URL")
+    if override:
+        return override.rstrip("/")
+    return f"https://api.{org_id or os.getenv('ORG_ID')}.arcpublishing.com"
+
+
+def _family_env(name, family, default):
+    value = os.getenv(name, default)
+    if family and family != DEFAULT_FAMILY:
+        value = os.getenv(f"{name}_{family.upper()}", value)
+    return value
+
+
+def default_rate(family=None):
+    # Límite real de la organización: 900 req/min = 15 req/s.
+    return float(_family_env("MAX_REQUESTS_PER_SECOND", family, "15.0"))
+
+
+def default_burst(family=None):
+    return float(_family_env("RATE_LIMIT_BURST", family, "10"))
+
+
+def parse_retry_after(value, default):
+    """`Retry-After` puede venir en segundos o como fecha HTTP."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+        return max(0.0, when.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+def backoff_delay(attempt):
+    """Backoff exponencial con jitter para no sincronizar los reintentos de varios workers."""
+    return min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+
+def _default_headers(token):
+    return {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json",
+        "Accept-Encoding": "gzip, deflate",
+    }
+
+
+class AsyncResponse(namedtuple("AsyncResponse", "status body headers request_info")):
+    """Respuesta ya leída de `AsyncArcClient.request` (la conexión ya volvió al pool)."""
+
+    def json(self):
+        return json.loads(self.body)
+
+    def text(self):
+        return self.body.decode("utf-8", "replace")
+
+
+class ArcClient:
+    """Cliente bloqueante. Seguro para usar desde varios threads."""
+
+    def __init__(self, token=None, limiter=None, rate=None, burst=None, timeout=DEFAULT_TIMEOUT,
+                 max_retries=DEFAULT_MAX_RETRIES, pool_size=DEFAULT_POOL_SIZE, headers=None, verbose=True,
+                 family=DEFAULT_FAMILY, priority=DEFAULT_PRIORITY):
+        if requests is None:
+            raise RuntimeError("ArcClient requiere el paquete 'requests'")
+        token = token or os.getenv("ARC_ACCESS_TOKEN")
+        self.family = family
+        rate = rate or default_rate(family)
+        burst = burst or default_burst(family)
+        self.limiter = limiter or RateLimiter(rate, burst=burst, shared_budget=shared_budget_from_env(rate, burst, family),
+                                              broker=quota_client_from_env(family, priority))
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.verbose = verbose
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(_default_headers(token))
+        if headers:
+            self.session.headers.update(headers)
+
+    def request(self, method, url, params=None, timeout=None, **kwargs):
+        """
+        Hace la petición respetando el limitador y reintentando 429, 5xx y errores de conexión.
+        Devuelve la última `requests.Response` (sin levantar por status).
+        """
+        timeout = timeout or self.timeout
+        for attempt in range(self.max_retries):
+            t0 = time.monotonic()
+            self.limiter.wait()
+            t1 = time.monotonic()
+            metrics.observe_limiter(t1 - t0, self.limiter.rate, self.family)
+            try:
+                response = self.session.request(method, url, params=params, timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.observe_request(url, method, "error", time.monotonic() - t1)
+                if attempt == self.max_retries - 1:
+                    raise
+                delay = backoff_delay(attempt)
+                metrics.observe_retry(url, "connection", delay)
+                if self.verbose:
+                    print(f"Error de conexión ({e}). Reintentando en {delay:.1f}s...")
+                time.sleep(delay)
+                continue
+
+            metrics.observe_request(url, method, response.status_code, time.monotonic() - t1)
+            if response.status_code == 429 and attempt < self.max_retries - 1:
+                wait = parse_retry_after(response.headers.get("Retry-After"), backoff_delay(attempt))
+                metrics.observe_retry(url, "429", wait)
+                self.limiter.on_throttle(wait)
+                if self.verbose:
+                    print(f"429 Rate Limit. Esperando {wait:.2f}s (nueva velocidad {self.limiter.rate:.2f} req/s)...")
+                continue
+            if response.status_code in RETRYABLE_STATUSES and attempt < self.max_retries - 1:
+                delay = backoff_delay(attempt)
+                metrics.observe_retry(url, "5xx", delay)
+                if self.verbose:
+                    print(f"Error servidor {response.status_code}. Reintentando en {delay:.1f}s...")
+                time.sleep(delay)
+                continue
+            if response.status_code < 400:
+                self.limiter.on_success()
+            return response
+        return response
+
+    def get(self, url, params=None, timeout=None, **kwargs):
+        return self.request("GET", url, params=params, timeout=timeout, **kwargs)
+
+    def get_json(self, url, params=None, timeout=None):
+        """GET que levanta `requests.HTTPError` si el status final es de error y devuelve el JSON."""
+        response = self.get(url, params=params, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AsyncArcClient:
+    """Cliente asíncrono. Usar como `async with AsyncArcClient() as client:`."""
+
+    def __init__(self, token=None, limiter=None, rate=None, burst=None, timeout=DEFAULT_TIMEOUT,
+                 max_retries=DEFAULT_MAX_RETRIES, pool_size=DEFAULT_POOL_SIZE, headers=None, verbose=True,
+                 family=DEFAULT_FAMILY, priority=DEFAULT_PRIORITY):
+        if aiohttp is None:
+            raise RuntimeError("AsyncArcClient requiere el paquete 'aiohttp'")
+        self.token = token or os.getenv("ARC_ACCESS_TOKEN")
+        self.family = family
+        rate = rate or default_rate(family)
+        burst = burst or default_burst(family)
+        self.limiter = limiter or AsyncRateLimiter(rate, burst=burst, shared_budget=shared_budget_from_env(rate, burst, family),
+                                                   broker=quota_client_from_env(family, priority))
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self.verbose = verbose
+        self.headers = _default_headers(self.token)
+        if headers:
+            self.headers.update(headers)
+        self.session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(headers=self.headers, connector=connector)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def request(self, method, url, params=None, headers=None, timeout=None, label=None):
+        """
+        Hace la petición respetando el limitador y reintentando 429, 5xx y errores de conexión.
+        Devuelve un `AsyncResponse` con la última respuesta, sin levantar por status.
+        `label` (por ejemplo el ID o el sitio) sólo se usa en los mensajes.
+        """
+        label = f"[{label}] " if label else ""
+        client_timeout = aiohttp.ClientTimeout(total=timeout or self.timeout)
+        for attempt in range(self.max_retries):
+            t0 = time.monotonic()
+            await self.limiter.wait()
+            t1 = time.monotonic()
+            metrics.observe_limiter(t1 - t0, self.limiter.rate, self.family)
+            try:
+                async with self.session.request(method, url, params=params, headers=headers, timeout=client_timeout) as response:
+                    result = AsyncResponse(response.status, await response.read(), response.headers, response.request_info)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                metrics.observe_request(url, method, "error", time.monotonic() - t1)
+                if attempt == self.max_retries - 1:
+                    raise aiohttp.ClientError(f"{label}{e!r}") from e
+                delay = backoff_delay(attempt)
+                metrics.observe_retry(url, "connection", delay)
+                if self.verbose:
+                    print(f"❌ {label}Error de conexión: {e!r}. Reintentando en {delay:.1f}s...")
+                await asyncio.sleep(delay)
+                continue
+
+            metrics.observe_request(url, method, result.status, time.monotonic() - t1)
+            if result.status == 429 and attempt < self.max_retries - 1:
+                wait = parse_retry_after(result.headers.get("Retry-After"), backoff_delay(attempt))
+                metrics.observe_retry(url, "429", wait)
+                self.limiter.on_throttle(wait)
+                if self.verbose:
+                    print(f"⚠️ {label}429 Rate Limit. Esperando {wait:.2f}s (nueva velocidad {self.limiter.rate:.2f} req/s)...")
+                continue
+            if result.status in RETRYABLE_STATUSES and attempt < self.max_retries - 1:
+                delay = backoff_delay(attempt)
+                metrics.observe_retry(url, "5xx", delay)
+                if self.verbose:
+                    print(f"🔥 {label}Error servidor {result.status}. Reintentando en {delay:.1f}s...")
+                await asyncio.sleep(delay)
+                continue
+            if result.status < 400:
+                self.limiter.on_success()
+            return result
+        return result
+
+    async def get_json(self, url, params=None, timeout=None, label=None):
+        """GET que levanta `aiohttp.ClientResponseError` si el status final es de error y devuelve el JSON."""
+        result = await self.request("GET", url, params=params, timeout=timeout, label=label)
+        if result.status >= 400:
+            text = result.text()[:500]
+            if self.verbose:
+                print(f"Error HTTP {result.status}{f' para {label}' if label else ''}: {text}")
+            raise aiohttp.ClientResponseError(result.request_info, (), status=result.status, message=text, headers=result.headers)
+        return result.json()
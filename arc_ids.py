@@ -0,0 +1,298 @@
+"""
+Contenedores compactos para cientos de miles de IDs de Arc en memoria.
+
+En lugar de listas de tuplas de strings (`(vid, website_name)`, `(sid, pub, url)`), que repiten
+el nombre del sitio y el texto de la fecha en cada fila:
+
+- Los IDs de 26 caracteres base32 (notas, imágenes) y los UUID (videos) se empaquetan en
+  ID_WIDTH bytes fijos. Los que no tienen ninguno de esos formatos se guardan aparte.
+- Los nombres de sitio se internan como códigos chicos (`array('H')`).
+- Las fechas se guardan como epoch en milisegundos (`array('q')`).
+
+`IdSet` sirve para pertenencia y deduplicado en streaming (reemplaza a los sets de strings o
+de hashes); `IdTable` guarda filas (id, sitio, fecha, url[, last_updated]), las deduplica
+por ID y las ordena por fecha.
+"""
+import heapq
+import re
+import uuid
+from array import array
+from itertools import repeat
+
+from timestamps import NO_DATE, argsort, bucket_keys, epoch_ms_to_iso, to_epoch_ms
+
+ID_WIDTH = 17
+
+# Base32 de Arc (A-Z2-7) -> base32hex (0-9A-V), que `int(s, 32)` entiende directamente.
+_B32 = "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"
+_TO_B32HEX = str.maketrans(_B32, "0123456789ABCDEFGHIJKLMNOPQRSTUV")
+_B32_RE = re.compile(r"^[A-Z2-7]{26}$")
+_UUID_RE = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+# 26 * 5 = 130 bits: el primer byte de un ID base32 nunca pasa de 0x03, así que un primer byte
+# 0x80 marca un UUID sin ambigüedad.
+_UUID_TAG = b"\x80"
+# Para desempaquetar de a 10 bits: los 1024 pares de caracteres base32 posibles.
+_B32_PAIRS = [a + b for a in _B32 for b in _B32]
+_PAIR_SHIFTS = tuple(range(120, -1, -10))
+
+
+def pack_id(arc_id):
+    """Empaqueta un ID base32 o UUID en ID_WIDTH bytes. Devuelve None si no tiene ninguno de esos formatos."""
+    if len(arc_id) == 26 and _B32_RE.match(arc_id):
+        return int(arc_id.translate(_TO_B32HEX), 32).to_bytes(ID_WIDTH, "big")
+    if len(arc_id) == 36 and _UUID_RE.match(arc_id):
+        return _UUID_TAG + uuid.UUID(arc_id).bytes
+    return None
+
+
+def unpack_id(key):
+    """Inversa de `pack_id`."""
+    if key[:1] == _UUID_TAG:
+        return str(uuid.UUID(bytes=bytes(key[1:])))
+    value = int.from_bytes(key, "big")
+    return "".join([_B32_PAIRS[(value >> shift) & 1023] for shift in _PAIR_SHIFTS])
+
+
+# Los sitios son pocos y fijos durante una corrida: un único registro por proceso permite
+# concatenar tablas sin remapear códigos.
+_site_names = []
+_site_codes = {}
+
+
+def intern_site(name):
+    code = _site_codes.get(name)
+    if code is None:
+        code = _site_codes[name] = len(_site_names)
+        _site_names.append(name)
+    return code
+
+
+def site_name(code):
+    return _site_names[code]
+
+
+def _key_at(blob, i):
+    return blob[i * ID_WIDTH:(i + 1) * ID_WIDTH]
+
+
+class IdSet:
+    """
+    Set exacto de IDs a ~ID_WIDTH bytes por ID. Las claves se acumulan en un set chico de
+    pendientes que se mezcla cada tanto con un bloque ordenado; la búsqueda en el bloque es
+    binaria. Los IDs sin formato conocido (p. ej. con --no-validate) van a un set de strings.
+    """
+    MIN_PENDING = 65536
+
+    def __init__(self, ids=()):
+        self._sorted = b""
+        self._pending = set()
+        self._others = set()
+        for arc_id in ids:
+            self.add(arc_id)
+
+    def _sorted_len(self):
+        return len(self._sorted) // ID_WIDTH
+
+    def _in_sorted(self, key):
+        blob = self._sorted
+        lo, hi = 0, len(blob) // ID_WIDTH
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _key_at(blob, mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo < len(blob) // ID_WIDTH and _key_at(blob, lo) == key
+
+    def _merge(self):
+        blob = self._sorted
+        merged = bytearray()
+        existing = (_key_at(blob, i) for i in range(len(blob) // ID_WIDTH))
+        for key in heapq.merge(existing, sorted(self._pending)):
+            merged += key
+        self._sorted = bytes(merged)
+        self._pending = set()
+
+    def add(self, arc_id):
+        key = pack_id(arc_id)
+        if key is None:
+            self._others.add(arc_id)
+            return
+        if key in self._pending or self._in_sorted(key):
+            return
+        self._pending.add(key)
+        # Umbral proporcional al bloque: el costo total de las mezclas queda acotado
+        if len(self._pending) >= max(self.MIN_PENDING, self._sorted_len() // 8):
+            self._merge()
+
+    def __contains__(self, arc_id):
+        key = pack_id(arc_id)
+        if key is None:
+            return arc_id in self._others
+        return key in self._pending or self._in_sorted(key)
+
+    def __len__(self):
+        return self._sorted_len() + len(self._pending) + len(self._others)
+
+
+class IdTable:
+    """
+    Filas (id, sitio, publish_date, url, last_updated) en columnas compactas. La url y
+    last_updated son opcionales: su columna sólo existe si alguna fila la trae. Las
+    publish_date que no tienen la forma fija `...:SSZ` (offsets, milisegundos, texto
+    ilegible) guardan además su texto, así `rows()` devuelve la fecha tal como vino.
+
+    `rows(*fields)` genera tuplas con los campos pedidos ("id", "site", "publish_date", "url",
+    "last_updated"), en el orden actual de la tabla.
+    """
+    FIELDS = ("id", "site", "publish_date", "url", "last_updated")
+
+    def __init__(self):
+        self._keys = bytearray()
+        self._others = []
+        self._sites = array("H")
+        self._dates = array("q")
+        self._date_texts = {}
+        self._urls = None
+        self._updated = None
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Construye una tabla desde tuplas (id, sitio[, publish_date[, url[, last_updated]]])."""
+        table = cls()
+        for row in rows:
+            table.append(*row)
+        return table
+
+    def append(self, arc_id, site, publish_date=None, url=None, last_updated=None):
+        key = pack_id(arc_id)
+        if key is None:
+            # Marca 0xFF + índice en la lista de IDs sin formato conocido
+            key = b"\xff" + len(self._others).to_bytes(ID_WIDTH - 1, "big")
+            self._others.append(arc_id)
+        n = len(self._dates)
+        self._keys += key
+        self._sites.append(intern_site(site))
+        ms = to_epoch_ms(publish_date)
+        self._dates.append(ms)
+        if publish_date and (ms == NO_DATE or len(publish_date) != 20 or publish_date[19] != "Z"):
+            self._date_texts[n] = publish_date
+        if url is not None and self._urls is None:
+            self._urls = [None] * n
+        if self._urls is not None:
+            self._urls.append(url)
+        if last_updated is not None and self._updated is None:
+            self._updated = array("q", [NO_DATE]) * n
+        if self._updated is not None:
+            self._updated.append(to_epoch_ms(last_updated))
+
+    def extend(self, other):
+        """Agrega al final todas las filas de otra IdTable."""
+        if other._others:
+            for row in other.rows():
+                self.append(*row)
+            return
+        n = len(self)
+        self._keys += other._keys
+        self._sites.extend(other._sites)
+        self._dates.extend(other._dates)
+        for i, text in other._date_texts.items():
+            self._date_texts[n + i] = text
+        if other._urls is not None and self._urls is None:
+            self._urls = [None] * n
+        if self._urls is not None:
+            self._urls.extend(other._urls if other._urls is not None else [None] * len(other))
+        if other._updated is not None and self._updated is None:
+            self._updated = array("q", [NO_DATE]) * n
+        if self._updated is not None:
+            self._updated.extend(other._updated if other._updated is not None else array("q", [NO_DATE]) * len(other))
+
+    def __len__(self):
+        return len(self._dates)
+
+    def _iter_ids(self):
+        blob = bytes(self._keys)
+        for start in range(0, len(blob), ID_WIDTH):
+            key = blob[start:start + ID_WIDTH]
+            if key[0] == 0xFF:
+                yield self._others[int.from_bytes(key[1:], "big")]
+            else:
+                yield unpack_id(key)
+
+    def _column(self, name):
+        n = len(self)
+        if name == "id":
+            return self._iter_ids()
+        if name == "site":
+            return map(_site_names.__getitem__, self._sites)
+        if name == "publish_date":
+            texts = self._date_texts
+            if not texts:
+                return map(epoch_ms_to_iso, self._dates)
+            return (texts[i] if i in texts else epoch_ms_to_iso(ms) for i, ms in enumerate(self._dates))
+        if name == "url":
+            return iter(self._urls) if self._urls is not None else repeat(None, n)
+        if name == "last_updated":
+            return map(epoch_ms_to_iso, self._updated) if self._updated is not None else repeat(None, n)
+        raise ValueError(f"Campo desconocido: {name}")
+
+    def rows(self, *fields):
+        return zip(*[self._column(name) for name in (fields or self.FIELDS)])
+
+    def _reorder(self, order):
+        keys = self._keys
+        self._keys = bytearray().join(_key_at(keys, i) for i in order)
+        self._sites = array("H", (self._sites[i] for i in order))
+        self._dates = array("q", (self._dates[i] for i in order))
+        if self._date_texts:
+            texts = self._date_texts
+            self._date_texts = {new: texts[old] for new, old in enumerate(order) if old in texts}
+        if self._urls is not None:
+            self._urls = [self._urls[i] for i in order]
+        if self._updated is not None:
+            self._updated = array("q", (self._updated[i] for i in order))
+
+    def _take(self, order):
+        table = IdTable()
+        table.__dict__.update(self.__dict__)
+        table._reorder(order)
+        return table
+
+    def group_by_date(self, level="year"):
+        """
+        Separa las filas por bucket de calendario UTC de su publish_date (ver
+        timestamps.bucket_keys). Devuelve {clave: IdTable}; las filas sin fecha van en None.
+        """
+        groups = {}
+        for i, key in enumerate(bucket_keys(self._dates, level)):
+            groups.setdefault(key, []).append(i)
+        return {key: self._take(order) for key, order in groups.items()}
+
+    def sort_by_date(self):
+        """Ordena por publish_date ascendente (estable; las filas sin fecha quedan primero)."""
+        self._reorder(argsort(self._dates))
+
+    def dedupe(self):
+        """Elimina IDs repetidos conservando la primera aparición. Devuelve cuántos quitó."""
+        # Se compara la clave empaquetada (sin desempaquetar cada ID); las 0xFF + posición
+        # se resuelven al ID original
+        blob = bytes(self._keys)
+        others = self._others
+        seen = set()
+        keep = []
+        for i in range(len(self)):
+            key = blob[i * ID_WIDTH:(i + 1) * ID_WIDTH]
+            if key[0] == 0xFF:
+                key = others[int.from_bytes(key[1:], "big")]
+            if key not in seen:
+                seen.add(key)
+                keep.append(i)
+        removed = len(self) - len(keep)
+        if removed:
+            self._reorder(keep)
+        return removed
+
+    def max_date(self, field="publish_date"):
+        """Fecha ISO más reciente de `field` ("publish_date" o "last_updated"), o None si no hay."""
+        column = self._dates if field == "publish_date" else self._updated
+        return epoch_ms_to_iso(max(column, default=NO_DATE) if column is not None else NO_DATE)
@@ -0,0 +1,272 @@
+"""
+Métricas de las corridas de borrado y auditoría: qué limita una corrida (la cuota, la
+latencia de Arc o el propio cliente) sin tener que leer un `print` por petición.
+
+arc_client registra cada intento contra la API en el registro global `metrics`:
+
+- `arc_requests_total{endpoint,method,status}` y `arc_request_duration_seconds{endpoint}`
+  (histograma por intento). El endpoint es el path con los IDs reemplazados por `{id}`.
+- `arc_retries_total{endpoint,reason}` (429, 5xx, conexión) y `arc_backoff_seconds_total`
+  (espera pedida por cada reintento: Retry-After o backoff).
+- `arc_limiter_wait_seconds_total`: tiempo esperando un token del limitador.
+- `arc_limiter_rate{family}`: velocidad actual del limitador (AIMD) de cada familia de endpoints.
+
+Los scripts suman `arc_items_total{tool,site,outcome}` (notas borradas, videos encontrados...)
+para el throughput por sitio.
+
+Exportación:
+- ARC_METRICS_PORT=9108: texto de Prometheus en http://127.0.0.1:9108/metrics (y el resumen
+  en /summary.json) mientras corre el script.
+- ARC_METRICS_SUMMARY=metricas.json: resumen JSON al terminar.
+"""
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+METRICS_PORT = os.getenv("ARC_METRICS_PORT", "")
+METRICS_SUMMARY_PATH = os.getenv("ARC_METRICS_SUMMARY", "")
+# Límites (segundos) de los buckets del histograma de latencia
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_ID_SEGMENT = re.compile(r"^(?:[A-Z2-7]{26}|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|\d+)$")
+
+
+def endpoint_label(url):
+    """`https://api.org.arcpublishing.com/draft/v1/story/ABC...` -> `/draft/v1/story/{id}`."""
+    path = urlsplit(url).path or "/"
+    return "/".join("{id}" if _ID_SEGMENT.match(part) else part for part in path.split("/"))
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "n")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.n = 0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += seconds
+        self.n += 1
+
+    def quantile(self, q):
+        """Estimación por interpolación lineal dentro del bucket (como histogram_quantile)."""
+        if not self.n:
+            return None
+        target = q * self.n
+        seen = 0
+        lower = 0.0
+        for i, count in enumerate(self.counts):
+            upper = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1]
+            if count and seen + count >= target:
+                return lower + (upper - lower) * (target - seen) / count
+            seen += count
+            lower = upper
+        return LATENCY_BUCKETS[-1]
+
+
+class Metrics:
+    """Registro de métricas en memoria. Seguro entre threads; registrar cuesta un lock y un dict."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.requests = {}        # (endpoint, method, status) -> n
+            self.latency = {}         # endpoint -> _Histogram
+            self.retries = {}         # (endpoint, reason) -> n
+            self.backoff = {}         # endpoint -> segundos
+            self.limiter_wait = 0.0
+            self.limiter_rate = None
+            self.limiter_rates = {}   # familia -> req/s
+            self.items = {}           # (tool, site, outcome) -> n
+
+    def observe_request(self, url, method, status, seconds):
+        """Un intento HTTP terminado; `status` es el código o "error" si no hubo respuesta."""
+        endpoint = endpoint_label(url)
+        with self.lock:
+            key = (endpoint, method, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            hist = self.latency.get(endpoint)
+            if hist is None:
+                hist = self.latency[endpoint] = _Histogram()
+            hist.observe(seconds)
+
+    def observe_retry(self, url, reason, backoff_seconds):
+        endpoint = endpoint_label(url)
+        with self.lock:
+            key = (endpoint, reason)
+            self.retries[key] = self.retries.get(key, 0) + 1
+            self.backoff[endpoint] = self.backoff.get(endpoint, 0.0) + backoff_seconds
+
+    def observe_limiter(self, wait_seconds, rate, family="content"):
+        with self.lock:
+            self.limiter_wait += wait_seconds
+            self.limiter_rate = rate
+            self.limiter_rates[family] = rate
+
+    def add_items(self, tool, site, outcome="ok", n=1):
+        key = (tool, site or "", outcome)
+        with self.lock:
+            self.items[key] = self.items.get(key, 0) + n
+
+    # --- Exportación ---
+
+    def render_prometheus(self):
+        def labels(**kv):
+            return "{" + ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in kv.items()) + "}"
+
+        with self.lock:
+            lines = ["# TYPE arc_requests_total counter"]
+            for (endpoint, method, status), n in sorted(self.requests.items()):
+                lines.append(f"arc_requests_total{labels(endpoint=endpoint, method=method, status=status)} {n}")
+            lines.append("# TYPE arc_request_duration_seconds histogram")
+            for endpoint, hist in sorted(self.latency.items()):
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), hist.counts):
+                    cumulative += count
+                    lines.append(f"arc_request_duration_seconds_bucket{labels(endpoint=endpoint, le=bound)} {cumulative}")
+                lines.append(f"arc_request_duration_seconds_sum{labels(endpoint=endpoint)} {hist.total:.6f}")
+                lines.append(f"arc_request_duration_seconds_count{labels(endpoint=endpoint)} {hist.n}")
+            lines.append("# TYPE arc_retries_total counter")
+            for (endpoint, reason), n in sorted(self.retries.items()):
+                lines.append(f"arc_retries_total{labels(endpoint=endpoint, reason=reason)} {n}")
+            lines.append("# TYPE arc_backoff_seconds_total counter")
+            for endpoint, seconds in sorted(self.backoff.items()):
+                lines.append(f"arc_backoff_seconds_total{labels(endpoint=endpoint)} {seconds:.6f}")
+            lines.append("# TYPE arc_limiter_wait_seconds_total counter")
+            lines.append(f"arc_limiter_wait_seconds_total {self.limiter_wait:.6f}")
+            if self.limiter_rates:
+                lines.append("# TYPE arc_limiter_rate gauge")
+                for family, rate in sorted(self.limiter_rates.items()):
+                    lines.append(f"arc_limiter_rate{labels(family=family)} {rate:.3f}")
+            lines.append("# TYPE arc_items_total counter")
+            for (tool, site, outcome), n in sorted(self.items.items()):
+                lines.append(f"arc_items_total{labels(tool=tool, site=site, outcome=outcome)} {n}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self, concurrency=None):
+        """
+        Resumen de la corrida. `limited_by` es una lectura rápida de dónde se fue el tiempo:
+        `quota` si pesa más la espera del limitador + backoff que las peticiones en sí,
+        `latency` si pesan más las peticiones, y `client` si (conociendo la concurrencia) los
+        workers pasaron la mayor parte del tiempo sin esperar ni a la API ni al limitador.
+        """
+        with self.lock:
+            elapsed = max(1e-9, time.time() - self.started)
+            endpoints = {}
+            for endpoint, hist in sorted(self.latency.items()):
+                statuses = {status: n for (e, _, status), n in self.requests.items() if e == endpoint}
+                endpoints[endpoint] = {
+                    "requests": hist.n,
+                    "statuses": dict(sorted(statuses.items())),
+                    "latency_avg_ms": round(hist.total / hist.n * 1000, 1) if hist.n else None,
+                    "latency_p50_ms": round(hist.quantile(0.5) * 1000, 1) if hist.n else None,
+                    "latency_p99_ms": round(hist.quantile(0.99) * 1000, 1) if hist.n else None,
+                    "retries": {reason: n for (e, reason), n in self.retries.items() if e == endpoint},
+                    "backoff_seconds": round(self.backoff.get(endpoint, 0.0), 3),
+                }
+            sites = {}
+            for (tool, site, outcome), n in sorted(self.items.items()):
+                entry = sites.setdefault(f"{tool}:{site}" if site else tool, {"items": 0})
+                entry[outcome] = n
+                entry["items"] += n
+            for entry in sites.values():
+                entry["items_per_second"] = round(entry["items"] / elapsed, 2)
+            request_time = sum(h.total for h in self.latency.values())
+            backoff_time = sum(self.backoff.values())
+            limiter_wait = self.limiter_wait
+            n_requests = sum(h.n for h in self.latency.values())
+            limiter_rate = self.limiter_rate
+            limiter_rates = dict(sorted(self.limiter_rates.items()))
+
+        waiting = limiter_wait + backoff_time
+        if not n_requests:
+            limited_by = None
+        elif concurrency and (request_time + waiting) < 0.5 * elapsed * concurrency:
+            limited_by = "client"
+        else:
+            limited_by = "quota" if waiting > request_time else "latency"
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "requests": n_requests,
+            "requests_per_second": round(n_requests / elapsed, 2),
+            "request_seconds": round(request_time, 3),
+            "limiter_wait_seconds": round(limiter_wait, 3),
+            "backoff_seconds": round(backoff_time, 3),
+            "limiter_rate": limiter_rate,
+            "limiter_rates": limiter_rates,
+            "limited_by": limited_by,
+            "endpoints": endpoints,
+            "sites": sites,
+        }
+
+    def write_summary(self, path, concurrency=None):
+        data = self.summary(concurrency)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+        return data
+
+
+metrics = Metrics()
+
+_server = None
+_server_lock = threading.Lock()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics"):
+            body, ctype = metrics.render_prometheus().encode("utf-8"), "text/plain; version=0.0.4"
+        elif self.path.startswith("/summary.json"):
+            body, ctype = json.dumps(metrics.summary(), ensure_ascii=False).encode("utf-8"), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_metrics_server(port=None, host="127.0.0.1"):
+    """Sirve /metrics y /summary.json en un thread daemon. Sin puerto (ni ARC_METRICS_PORT) no hace nada."""
+    global _server
+    port = port or METRICS_PORT
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, int(port)), _Handler)
+            threading.Thread(target=_server.serve_forever, name="arc-metrics", daemon=True).start()
+            print(f"Métricas en http://{host}:{_server.server_address[1]}/metrics")
+    return _server
+
+
+def finish_run(summary_path=None, concurrency=None):
+    """Al terminar una corrida: escribe el resumen JSON (si hay ruta) y lo devuelve."""
+    path = summary_path or METRICS_SUMMARY_PATH
+    if not path:
+        return None
+    data = metrics.write_summary(path, concurrency)
+    print(f"Resumen de métricas en '{path}' (limitado por: {data['limited_by']}).")
+    return data
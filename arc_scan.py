@@ -0,0 +1,52 @@
+"""
+Paginación por cursor sobre el endpoint /content/v4/scan de la Content API.
+
+A diferencia de search/published con `from` + `size`, cada página se pide con el marcador
+`scrollId` que devolvió la anterior (campo `next`), así que el costo por página es el mismo
+de la primera a la última y no existe el límite de 10.000 resultados: no hace falta
+particionar por fecha para poder recorrer todo.
+
+Los iteradores no hacen I/O por sí mismos: reciben una función `fetch(params) -> dict`
+(bloqueante o corrutina) que cada script implementa con su sesión, timeouts y reintentos.
+"""
+import os
+
+SCAN_PATH = "/content/v4/scan"
+SCAN_PAGE_SIZE = 100
+# "scan" (default) usa cursores; "offset" fuerza la paginación from + size con particionado.
+PAGINATION_MODE = os.getenv("PAGINATION_MODE", "scan").strip().lower()
+
+
+def scan_enabled():
+    return PAGINATION_MODE == "scan"
+
+
+def _next_params(params, data):
+    next_id = data.get("next")
+    if not next_id:
+        return None
+    next_params = dict(params)
+    next_params["scrollId"] = next_id
+    return next_params
+
+
+def scan_pages(fetch, params):
+    """Genera listas de `content_elements`, una por página, hasta agotar el cursor."""
+    while params is not None:
+        data = fetch(params)
+        elems = data.get("content_elements", [])
+        if not elems:
+            return
+        yield elems
+        params = _next_params(params, data)
+
+
+async def scan_pages_async(fetch, params):
+    """Versión asíncrona de `scan_pages` para un `fetch` corrutina."""
+    while params is not None:
+        data = await fetch(params)
+        elems = data.get("content_elements", [])
+        if not elems:
+            return
+        yield elems
+        params = _next_params(params, data)
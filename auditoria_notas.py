@@ -1,29 +1,29 @@
 import os
 import requests
-import time
-from datetime import datetime, timedelta
+from datetime import datetime
 import sys
 import csv
 from dotenv import load_dotenv
 from tqdm import tqdm
 import urllib.parse
+import itertools
+import heapq
 import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from partition_planner import plan_from_epochs, plan_partitions
+from count_cache import shared_cache
+from content_index import shared_index
+from arc_ids import IdSet, IdTable
+from timestamps import dt_to_iso, parse_iso, to_epoch_ms_array
+from external_sort import ExternalSorter, iso_sort_key, write_sorted_csv
+from report_archive import ARCHIVE_EXT, archive_path_for, read_archive_rows, write_archive
+from photo_usage import PhotoUsageIndex, USAGE_COLUMNS, ORPHAN_COLUMNS, ORPHAN_REVIEW_COLUMNS, review_rows, write_rows_csv
+from arc_client import ArcClient, content_api_base
+from arc_metrics import finish_run, metrics, start_metrics_server
+from arc_scan import SCAN_PATH, SCAN_PAGE_SIZE, scan_enabled, scan_pages
 
 
-def parse_iso(s: str) -> datetime:
-    if not s:
-        return None
-    try:
-        if s.endswith('Z'):
-            return datetime.strptime(s, "%Y-%m-%dT%H:%M:%SZ")
-        return datetime.fromisoformat(s)
-    except Exception:
-        # fallback: try trimming timezone
-        try:
-            return datetime.strptime(s.split('+')[0], "%Y-%m-%dT%H:%M:%S")
-        except Exception:
-            return None
-
 load_dotenv()
 
 ARC_ACCESS_TOKEN = os.getenv("ARC_ACCESS_TOKEN")
@@ -32,20 +32,44 @@ WEBSITE_NAMES_STR = os.getenv("WEBSITE_NAMES")
 YEARS_TO_AUDIT_STR = os.getenv("YEARS_TO_AUDIT")
 REPORTS_DIR = os.getenv("REPORTS_DIR", "reports_fotos")
 
-API_BASE_URL = f"https://api.{ORG_ID}.arcpublishing.com"
+API_BASE_URL = content_api_base(ORG_ID)
 PAGE_SIZE = 100
 # Usaremos el endpoint /content/v4/search/published (mismo que en auditoria_videos)
 SEARCH_ENDPOINT = f"{API_BASE_URL}/content/v4/search/published"
+# Cursor de /scan: sin límite de 10k ni costo creciente por offset (ver arc_scan.py)
+SCAN_ENDPOINT = f"{API_BASE_URL}{SCAN_PATH}"
 OUTPUT_FILENAME = "reporte_uso_de_fotos.csv"
 MAX_RESULT_WINDOW = 10000
-
-
-def dt_to_iso(dt: datetime) -> str:
-    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
-
-
-def midpoint_dt(start: datetime, end: datetime) -> datetime:
-    return start + (end - start) / 2
+# AUDIT_MODE=incremental: sólo trae lo publicado/modificado desde la marca de agua de cada sitio
+# y lo mezcla en los CSV anuales existentes.
+INCREMENTAL = os.getenv("AUDIT_MODE", "full").strip().lower() == "incremental"
+WATERMARK_FILENAME = "_watermark.json"
+# Jobs (sitio, año) que se ejecutan en paralelo; la velocidad total la limita arc_client.
+AUDIT_WORKERS = int(os.getenv("AUDIT_WORKERS", "6"))
+# AUDIT_PHOTOS=1: además arma el índice de uso de fotos y el listado de imágenes huérfanas
+# (sólo para revisar, salvo con CONFIRM_ORPHANS=1).
+AUDIT_PHOTOS = os.getenv("AUDIT_PHOTOS", "").strip().lower() in ("1", "true", "si", "yes")
+ORPHANS_FILENAME = "imagenes_huerfanas_{site}.csv"
+ORPHANS_REVIEW_FILENAME = "imagenes_huerfanas_{site}_revision.csv"
+NOTAS_HEADER = ["story_id", "publish_date", "url"]
+# REPORT_FORMAT=csv (default) | archive | both: `archive` escribe los reportes de notas como
+# `.arcc` columnar (ver report_archive.py) en lugar de CSV.
+REPORT_FORMAT = os.getenv("REPORT_FORMAT", "csv").strip().lower()
+STORY_ID_SOURCE_INCLUDE = ["_id", "publish_date", "canonical_url", "website_url", "display_url", "url", "websites"]
+# Sólo los campos que mira parse_ans_for_photos: el cuerpo completo de las notas pesa mucho.
+# `promo_items` va entero porque sus claves (basic, lead_art, ...) no son fijas.
+PHOTO_SOURCE_INCLUDE = [
+    "_id", "type", "publish_date", "promo_items",
+    "content_elements._id", "content_elements.type",
+    "content_elements.content_elements._id", "content_elements.content_elements.type",
+    "content_elements.promo_items",
+]
+# Todo lo que puede usar una imagen: notas, galerías y videos, publicados y sin publicar
+# (borradores, programados, despublicados), que search/published nunca devuelve.
+PHOTO_REF_SOURCES = [(f"type:{t}", published) for t in ("story", "gallery", "video") for published in (True, False)]
+# CONFIRM_ORPHANS=1: WEBSITE_NAMES cubre todos los sitios de la organización que pueden usar
+# estas imágenes, así que las huérfanas se pueden borrar (ver write_photo_reports).
+CONFIRM_ORPHANS = os.getenv("CONFIRM_ORPHANS", "").strip().lower() in ("1", "true", "si", "yes")
 
 
 def fetch_count_for_query(session, website_name, q):
@@ -61,119 +85,197 @@ def fetch_count_for_query(session, website_name, q):
     return data.get("count", 0)
 
 
-def collect_stories_by_date_range(session, website_name, start_dt: datetime, end_dt: datetime):
+def scan_content(session, website_name, q, source_include, published=True):
     """
-    Recursively collect photo data for stories in [start_dt, end_dt], subdividing when a window
-    returns more than MAX_RESULT_WINDOW hits.
-    Returns list of photo_data dicts (same shape as parse_story_for_photos returns flattened).
+    Genera páginas (listas de ANS) de todos los resultados de `q` usando el cursor de /scan.
+    Con `published=False` recorre el contenido sin publicar en lugar del publicado.
+    Lanza requests.exceptions.RequestException si el endpoint falla.
     """
-    results = []
+    params = {
+        "website": website_name,
+        "q": q,
+        "size": SCAN_PAGE_SIZE,
+        "_sourceInclude": ",".join(source_include),
+    }
+    if not published:
+        params["published"] = "false"
+
+    def fetch(p):
+        resp = session.get(SCAN_ENDPOINT, params=p, timeout=60)
+        resp.raise_for_status()
+        return resp.json()
+
+    return scan_pages(fetch, params)
+
+
+def plan_story_windows(session, website_name, start_dt: datetime, end_dt: datetime, failures=None):
+    """
+    Arma el plan de ventanas de fechas (cada una bajo MAX_RESULT_WINDOW) para las notas del sitio.
+    Los counts de cada nivel (años, meses, días...) se piden en paralelo; un count fallido se
+    registra y cuenta como 0 para no abortar el plan completo (las ventanas fallidas se agregan
+    a `failures` si se pasa una lista). Counts y planes se guardan en el cache persistente
+    (count_cache) para no repetirlos en la próxima corrida.
+    """
+    cache = shared_cache()
+    if cache:
+        plan = cache.get_plan(website_name, "story", start_dt, end_dt, MAX_RESULT_WINDOW)
+        if plan is not None:
+            print(f"Plan para '{website_name}' {dt_to_iso(start_dt)}..{dt_to_iso(end_dt)} tomado del cache ({len(plan)} ventanas).")
+            return plan
+
+    def fetch_count(s_dt, e_dt):
+        q = f"type:story AND publish_date:[{dt_to_iso(s_dt)} TO {dt_to_iso(e_dt)}]"
+        return fetch_count_for_query(session, website_name, q)
+
+    if cache:
+        fetch_count = cache.cached_count_fn(website_name, "story", fetch_count)
+
+    failed = []
+
+    def count_window(s_dt, e_dt):
+        try:
+            return fetch_count(s_dt, e_dt)
+        except requests.exceptions.RequestException as e:
+            print(f"  Error al obtener count para rango {dt_to_iso(s_dt)}..{dt_to_iso(e_dt)}: {e}")
+            failed.append((s_dt, e_dt))
+            return 0
 
-    def retrieve_window(s_dt: datetime, e_dt: datetime):
+    plan = plan_partitions(start_dt, end_dt, count_window, max_window=MAX_RESULT_WINDOW)
+    if failures is not None:
+        failures.extend(failed)
+    # Un plan con counts fallidos está incompleto: no se guarda
+    if cache and not failed:
+        cache.put_plan(website_name, "story", start_dt, end_dt, MAX_RESULT_WINDOW, plan)
+    print(f"Plan para '{website_name}' {dt_to_iso(start_dt)}..{dt_to_iso(end_dt)}: {len(plan)} ventanas, {sum(c for _, _, c in plan)} notas.")
+    return plan
+
+
+def iter_story_pages_by_date_range(session, website_name, start_dt: datetime, end_dt: datetime, source_include, failures):
+    """
+    Recorre las notas en [start_dt, end_dt] ventana por ventana del plan de particionado (ver
+    plan_story_windows), así ninguna ventana supera MAX_RESULT_WINDOW, y genera cada página
+    (lista de documentos con `source_include`). Cada ventana se pagina hasta su count real.
+    Si ese count ya supera MAX_RESULT_WINDOW (el plan del cache quedó viejo), se invalidan
+    los counts y planes cacheados de la ventana y se la vuelve a partir con counts frescos.
+    Los counts y páginas que fallan se agregan a `failures`: el recorrido quedó incompleto.
+    """
+    windows = deque(plan_story_windows(session, website_name, start_dt, end_dt, failures))
+    while windows:
+        s_dt, e_dt, count = windows.popleft()
         s_iso = dt_to_iso(s_dt)
         e_iso = dt_to_iso(e_dt)
-        print(f"Consultando rango {s_iso} .. {e_iso} para sitio '{website_name}'...")
         q = f"type:story AND publish_date:[{s_iso} TO {e_iso}]"
-        try:
-            count = fetch_count_for_query(session, website_name, q)
-        except requests.exceptions.RequestException as e:
-            print(f"  Error al obtener count para rango {s_iso}..{e_iso}: {e}")
-            return []
-
-        print(f"  -> count={count} (límite {MAX_RESULT_WINDOW})")
-        if count == 0:
-            return []
-        if count > MAX_RESULT_WINDOW:
-            mid = midpoint_dt(s_dt, e_dt)
-            left = retrieve_window(s_dt, mid)
-            # avoid overlapping by adding 1 second to mid for the right range
-            right = retrieve_window(mid + timedelta(seconds=1), e_dt)
-            return left + right
-
-        # count within window, fetch paginated
-        collected = []
         params = {
             "website": website_name,
             "q": q,
             "size": PAGE_SIZE,
-            "_sourceInclude": ",".join(["_id", "publish_date", "promo_items", "content_elements"]),
+            "_sourceInclude": ",".join(source_include),
             "track_total_hits": "true",
             "from": 0,
         }
         offset = 0
-        while offset < count:
+        total = count
+        while offset < min(total, MAX_RESULT_WINDOW):
             try:
                 resp = session.get(SEARCH_ENDPOINT, params=params, timeout=60)
                 resp.raise_for_status()
                 data = resp.json()
             except requests.exceptions.RequestException as e:
                 print(f"  Error al recuperar página para rango {s_iso}..{e_iso}: {e}")
+                failures.append((s_dt, e_dt))
+                break
+
+            total = data.get("count", total)
+            if offset == 0 and total > MAX_RESULT_WINDOW:
+                if e_dt <= s_dt:
+                    print(f"  ⚠️ El segundo {s_iso} tiene {total} notas (> {MAX_RESULT_WINDOW}): no se puede partir más.")
+                    failures.append((s_dt, e_dt))
+                    break
+                print(f"  La ventana {s_iso}..{e_iso} ya tiene {total} notas (> {MAX_RESULT_WINDOW}, el plan tenía {count}); se vuelve a partir.")
+                cache = shared_cache()
+                if cache:
+                    cache.invalidate(website_name, "story", s_dt, e_dt)
+                windows.extendleft(reversed(plan_story_windows(session, website_name, s_dt, e_dt, failures)))
                 break
 
             stories = data.get("content_elements", [])
-            for story in stories:
-                photo_data = parse_story_for_photos(story)
-                if photo_data:
-                    collected.extend(photo_data)
+            if not stories:
+                break
+            yield stories
 
             offset += len(stories)
-            if offset >= count:
-                break
             params["from"] = offset
-            time.sleep(0.2)
 
-        return collected
 
-    results = retrieve_window(start_dt, end_dt)
-    return results
+def iter_story_photos_by_date_range(session, website_name, start_dt: datetime, end_dt: datetime, failures=None):
+    """
+    Recorre las notas en [start_dt, end_dt] con iter_story_pages_by_date_range y genera, por
+    cada página, la lista de referencias a fotos (la forma de parse_ans_for_photos) sin
+    acumularlas. Lo que falla se agrega a `failures` (si se pasa una lista).
+    """
+    if failures is None:
+        failures = []
+    for stories in iter_story_pages_by_date_range(session, website_name, start_dt, end_dt, PHOTO_SOURCE_INCLUDE, failures):
+        photos = []
+        for story in stories:
+            photos.extend(parse_ans_for_photos(story))
+        yield photos
+
 
-def parse_story_for_photos(story_ans):
+def parse_ans_for_photos(ans):
     """
-    Analiza un objeto de historia en formato ANS y extrae todas las referencias a imágenes.
-    Devuelve una lista de diccionarios con los detalles de cada foto encontrada.
+    Analiza un documento ANS (nota, galería o video) y extrae todas sus referencias a imágenes:
+    cualquier clave de `promo_items` (incluidas las imágenes y promos de una galería o un video
+    usados como promo), las imágenes y galerías de `content_elements` (el cuerpo de una nota o
+    las fotos de una galería) y las promos de galerías y videos del cuerpo.
+    Devuelve una lista de diccionarios con los detalles de cada foto encontrada. En
+    `story_id` va el ID del documento que usa la foto, sea del tipo que sea.
     """
     found_photos = []
-    story_id = story_ans.get("_id")
-    publish_date = story_ans.get("publish_date")
+    doc_id = ans.get("_id")
+    publish_date = ans.get("publish_date")
+    # Las referencias de galerías y videos se distinguen por el prefijo de su ubicación
+    doc_type = ans.get("type") or "story"
+    prefix = "" if doc_type == "story" else f"{doc_type}."
 
-    # 1. Buscar en la imagen principal (promo_items)
-    promo_item = story_ans.get("promo_items", {}).get("basic")
-    if promo_item and promo_item.get("type") == "image":
-        photo_id = promo_item.get("_id")
+    def add(photo_id, location):
         if photo_id:
             found_photos.append({
                 "photo_id": photo_id,
-                "story_id": story_id,
+                "story_id": doc_id,
                 "publish_date": publish_date,
-                "location": "promo_items"
+                "location": prefix + location
             })
 
-    # 2. Buscar en los elementos de contenido (imágenes y galerías)
-    for element in story_ans.get("content_elements", []):
-        # Imagen directa
-        if element.get("type") == "image":
-            photo_id = element.get("_id")
-            if photo_id:
-                found_photos.append({
-                    "photo_id": photo_id,
-                    "story_id": story_id,
-                    "publish_date": publish_date,
-                    "location": "content_elements.image"
-                })
-        # Galería (que contiene imágenes)
-        elif element.get("type") == "gallery":
-            gallery_id = element.get("_id")
-            for gallery_image in element.get("content_elements", []):
-                if gallery_image.get("type") == "image":
-                    photo_id = gallery_image.get("_id")
-                    if photo_id:
-                        found_photos.append({
-                            "photo_id": photo_id,
-                            "story_id": story_id,
-                            "publish_date": publish_date,
-                            "location": f"content_elements.gallery({gallery_id})"
-                        })
-    
+    def add_element(element, location):
+        # Imagen directa, galería (con sus imágenes) o video/galería con su propia promo
+        if not isinstance(element, dict):
+            return
+        element_type = element.get("type")
+        if element_type == "image":
+            add(element.get("_id"), location)
+            return
+        if element_type not in ("gallery", "video"):
+            return
+        location = f"{location}.{element_type}({element.get('_id')})"
+        if element_type == "gallery":
+            for gallery_image in element.get("content_elements") or []:
+                if isinstance(gallery_image, dict) and gallery_image.get("type") == "image":
+                    add(gallery_image.get("_id"), location)
+        for key, promo in (element.get("promo_items") or {}).items():
+            add_element(promo, f"{location}.promo_items.{key}")
+
+    # 1. Todas las promos (basic, lead_art, ...)
+    for key, promo in (ans.get("promo_items") or {}).items():
+        add_element(promo, f"promo_items.{key}")
+
+    # 2. Los elementos de contenido: el cuerpo de una nota o las imágenes de una galería
+    for element in ans.get("content_elements") or []:
+        if isinstance(element, dict) and element.get("type") == "image":
+            add(element.get("_id"), "content_elements.image")
+        else:
+            add_element(element, "content_elements")
+
     return found_photos
 
 
@@ -206,246 +308,130 @@ def extract_story_url(story_ans):
 
     return None
 
-def fetch_stories_for_year(session, website_name, year):
+def iter_story_ids_by_date_range(session, website_name, start_dt: datetime, end_dt: datetime, failures=None):
     """
-    Obtiene todas las historias para un año y sitio específicos, extrayendo los datos de las fotos.
-    Utiliza el endpoint /scan para manejar grandes volúmenes de datos de forma eficiente.
+    Like iter_story_photos_by_date_range, but yields (story_id, publish_date, url) per story.
     """
-    print(f"\n--- Iniciando auditoría para el sitio: '{website_name}' en el año {year} ---")
-    
-    all_photo_data = []
+    if failures is None:
+        failures = []
+    for stories in iter_story_pages_by_date_range(session, website_name, start_dt, end_dt, STORY_ID_SOURCE_INCLUDE, failures):
+        for story in stories:
+            sid = story.get("_id")
+            if sid:
+                yield sid, story.get("publish_date"), extract_story_url(story)
+
 
-    # Construir la consulta de OpenSearch para obtener las notas de un año específico
-    # Construir consulta DSL para notas del año
+def iter_story_ids_for_year(session, website_name, year, show_progress=True, failures=None):
+    """
+    Yields (story_id, publish_date, url) for every story of a given site and year, page by page.
+    Pages with the /scan cursor; if scan is disabled or unavailable, falls back to from+size
+    pagination with date partitioning when yearly totals exceed MAX_RESULT_WINDOW.
+    Requests that fail in the fallback are appended to `failures` (the year is incomplete).
+    """
+    if failures is None:
+        failures = []
+    print(f"\n--- Obteniendo IDs de notas para el sitio: '{website_name}' en el año {year} ---")
     gte = f"{year}-01-01T00:00:00Z"
     lte = f"{year}-12-31T23:59:59Z"
-    query_dsl = {
-        "query": {
-            "bool": {
-                "must": [
-                    {"term": {"type": "story"}},
-                    {"range": {"publish_date": {"gte": gte, "lte": lte}}}
-                ]
-            }
-        },
-        "_source": ["_id", "publish_date", "promo_items", "content_elements"]
-    }
+    q = f"type:story AND publish_date:[{gte} TO {lte}]"
 
-    try:
-        # Para compatibilidad con el endpoint 'search/published' usamos GET con paginación
-        q = f"type:story AND publish_date:[{gte} TO {lte}]"
+    # IDs ya entregados por un scan que se cortó a mitad: el respaldo no los repite
+    yielded = None
+    if scan_enabled():
+        scanned = IdSet()
+        try:
+            with tqdm(desc=f"Recuperando IDs de notas {year} para '{website_name}' (scan)", disable=not show_progress) as pbar:
+                for stories in scan_content(session, website_name, q, STORY_ID_SOURCE_INCLUDE):
+                    for story in stories:
+                        sid = story.get("_id")
+                        if sid:
+                            scanned.add(sid)
+                            yield sid, story.get("publish_date"), extract_story_url(story)
+                    pbar.update(len(stories))
+            return
+        except requests.exceptions.RequestException as e:
+            print(f"Scan no disponible para '{website_name}' ({e}); usando paginación por offset.")
+            yielded = scanned if len(scanned) else None
+
+    def fallback_rows():
         params = {
             "website": website_name,
             "q": q,
             "size": PAGE_SIZE,
-            "_sourceInclude": ",".join(["_id", "publish_date", "promo_items", "content_elements"]),
+            "_sourceInclude": ",".join(STORY_ID_SOURCE_INCLUDE),
             "track_total_hits": "true",
             "from": 0
         }
 
-        # llamada inicial para obtener count y primeros elementos
-        response = session.get(SEARCH_ENDPOINT, params=params, timeout=60)
-        response.raise_for_status()
-        data = response.json()
-        total = data.get("count", 0)
-        stories = data.get("content_elements", [])
-
-        if total == 0 or not stories:
-            print(f"No se encontraron notas para '{website_name}' en {year}.")
-            return []
-
-        # Si el total excede el límite del result window, usar particionado por fecha
-        if total > MAX_RESULT_WINDOW:
-            print(f"El año {year} para '{website_name}' tiene {total} notas (> {MAX_RESULT_WINDOW}). Usando particionado por fecha dentro del año.")
-            start_dt = parse_iso(gte)
-            end_dt = parse_iso(lte)
-            if not start_dt or not end_dt:
-                print(f"No se pudieron parsear las fechas del año {year}.")
-                return []
-            all_photo_data = collect_stories_by_date_range(session, website_name, start_dt, end_dt)
-            print(f"Auditoría para '{website_name}' en {year} completada (particionado). Se encontraron {len(all_photo_data)} referencias a fotos.")
-            return all_photo_data
-
-        pbar = tqdm(total=total, desc=f"Procesando notas de {year} para '{website_name}'")
-
-        offset = 0
-        while offset < total:
-            # procesar lote
-            for story in stories:
-                photo_data = parse_story_for_photos(story)
-                if photo_data:
-                    all_photo_data.extend(photo_data)
-
-            pbar.update(len(stories))
-
-            offset += len(stories)
-            if offset >= total:
-                break
-
-            params["from"] = offset
+        try:
             response = session.get(SEARCH_ENDPOINT, params=params, timeout=60)
             response.raise_for_status()
             data = response.json()
+            total = data.get("count", 0)
             stories = data.get("content_elements", [])
-            time.sleep(0.3)
-
-        pbar.close()
-        print(f"Auditoría para '{website_name}' en {year} completada. Se encontraron {len(all_photo_data)} referencias a fotos.")
-
-    except requests.exceptions.RequestException as e:
-        print(f"\nLa auditoría falló para el sitio '{website_name}' en el año {year}: {e}")
-        if 'pbar' in locals() and pbar:
-            pbar.close()
-        return []
-
-    return all_photo_data
 
+            if total == 0 or not stories:
+                print(f"No se encontraron notas para '{website_name}' en {year}.")
+                return
+
+            if total > MAX_RESULT_WINDOW:
+                print(f"El año {year} para '{website_name}' tiene {total} notas (> {MAX_RESULT_WINDOW}). Usando particionado por fecha dentro del año.")
+                start_dt = parse_iso(gte)
+                end_dt = parse_iso(lte)
+                if not start_dt or not end_dt:
+                    print(f"No se pudieron parsear las fechas del año {year}.")
+                    return
+                yield from iter_story_ids_by_date_range(session, website_name, start_dt, end_dt, failures)
+                return
+
+            # regular pagination
+            offset = 0
+            with tqdm(total=total, desc=f"Recuperando IDs de notas {year} para '{website_name}'", disable=not show_progress) as pbar:
+                while offset < total:
+                    for story in stories:
+                        sid = story.get("_id")
+                        if sid:
+                            yield sid, story.get("publish_date"), extract_story_url(story)
+
+                    pbar.update(len(stories))
+                    offset += len(stories)
+                    if offset >= total or not stories:
+                        break
+                    params["from"] = offset
+                    response = session.get(SEARCH_ENDPOINT, params=params, timeout=60)
+                    response.raise_for_status()
+                    data = response.json()
+                    stories = data.get("content_elements", [])
 
-def collect_story_ids_by_date_range(session, website_name, start_dt: datetime, end_dt: datetime):
-    """
-    Similar to collect_stories_by_date_range but collects story ids and publish_date tuples.
-    """
-    results = []
-
-    def retrieve_window(s_dt: datetime, e_dt: datetime):
-        s_iso = dt_to_iso(s_dt)
-        e_iso = dt_to_iso(e_dt)
-        print(f"Consultando rango {s_iso} .. {e_iso} para sitio '{website_name}' (stories)...")
-        q = f"type:story AND publish_date:[{s_iso} TO {e_iso}]"
-        try:
-            count = fetch_count_for_query(session, website_name, q)
         except requests.exceptions.RequestException as e:
-            print(f"  Error al obtener count para rango {s_iso}..{e_iso}: {e}")
-            return []
-
-        if count == 0:
-            return []
-        if count > MAX_RESULT_WINDOW:
-            mid = midpoint_dt(s_dt, e_dt)
-            left = retrieve_window(s_dt, mid)
-            right = retrieve_window(mid + timedelta(seconds=1), e_dt)
-            return left + right
-
-        collected = []
-        params = {
-            "website": website_name,
-            "q": q,
-            "size": PAGE_SIZE,
-            "_sourceInclude": ",".join(["_id", "publish_date", "canonical_url", "website_url", "display_url", "url", "websites"]),
-            "track_total_hits": "true",
-            "from": 0,
-        }
-        offset = 0
-        while offset < count:
-            try:
-                resp = session.get(SEARCH_ENDPOINT, params=params, timeout=60)
-                resp.raise_for_status()
-                data = resp.json()
-            except requests.exceptions.RequestException as e:
-                print(f"  Error al recuperar página para rango {s_iso}..{e_iso}: {e}")
-                break
-
-            stories = data.get("content_elements", [])
-            for story in stories:
-                sid = story.get("_id")
-                pub = story.get("publish_date")
-                url = extract_story_url(story)
-                if sid:
-                    collected.append((sid, pub, url))
+            print(f"\nLa recuperación de IDs falló para el sitio '{website_name}' en el año {year}: {e}")
+            failures.append((gte, lte))
 
-            offset += len(stories)
-            if offset >= count:
-                break
-            params["from"] = offset
-            time.sleep(0.2)
+    for row in fallback_rows():
+        if yielded is None or row[0] not in yielded:
+            yield row
 
-        return collected
 
-    results = retrieve_window(start_dt, end_dt)
-    return results
-
-
-def fetch_story_ids_for_year(session, website_name, year):
+def iter_site_images(session, website_name):
     """
-    Retrieve all story IDs (and publish_date) for a given site and year. Uses date partitioning
-    when yearly totals exceed MAX_RESULT_WINDOW to avoid from+size limits.
-    Returns list of tuples (story_id, publish_date).
+    Genera páginas (listas de dicts con 'photo_id', 'url' y 'website_name') de todos los assets
+    de tipo image del sitio. Usa /scan; la paginación por offset queda como respaldo y se corta
+    en MAX_RESULT_WINDOW.
     """
-    print(f"\n--- Obteniendo IDs de notas para el sitio: '{website_name}' en el año {year} ---")
-    gte = f"{year}-01-01T00:00:00Z"
-    lte = f"{year}-12-31T23:59:59Z"
-    q = f"type:story AND publish_date:[{gte} TO {lte}]"
-
-    params = {
-        "website": website_name,
-        "q": q,
-        "size": PAGE_SIZE,
-        "_sourceInclude": ",".join(["_id", "publish_date", "canonical_url", "website_url", "display_url", "url", "websites"]),
-        "track_total_hits": "true",
-        "from": 0
-    }
-
-    try:
-        response = session.get(SEARCH_ENDPOINT, params=params, timeout=60)
-        response.raise_for_status()
-        data = response.json()
-        total = data.get("count", 0)
-        stories = data.get("content_elements", [])
-
-        if total == 0 or not stories:
-            print(f"No se encontraron notas para '{website_name}' en {year}.")
-            return []
-
-        if total > MAX_RESULT_WINDOW:
-            print(f"El año {year} para '{website_name}' tiene {total} notas (> {MAX_RESULT_WINDOW}). Usando particionado por fecha dentro del año.")
-            start_dt = parse_iso(gte)
-            end_dt = parse_iso(lte)
-            if not start_dt or not end_dt:
-                print(f"No se pudieron parsear las fechas del año {year}.")
-                return []
-            return collect_story_ids_by_date_range(session, website_name, start_dt, end_dt)
-
-        # regular pagination
-        results = []
-        offset = 0
-        pbar = tqdm(total=total, desc=f"Recuperando IDs de notas {year} para '{website_name}'")
-        while offset < total:
-            for story in stories:
-                sid = story.get("_id")
-                pub = story.get("publish_date")
-                url = extract_story_url(story)
-                if sid:
-                    results.append((sid, pub, url))
-
-            pbar.update(len(stories))
-            offset += len(stories)
-            if offset >= total:
-                break
-            params["from"] = offset
-            response = session.get(SEARCH_ENDPOINT, params=params, timeout=60)
-            response.raise_for_status()
-            data = response.json()
-            stories = data.get("content_elements", [])
-            time.sleep(0.2)
-
-        pbar.close()
-        return results
-
-    except requests.exceptions.RequestException as e:
-        print(f"\nLa recuperación de IDs falló para el sitio '{website_name}' en el año {year}: {e}")
-        return []
+    q = "type:image"
 
+    def to_image(e):
+        return {"photo_id": e.get("_id"), "url": e.get("display_url") or e.get("url"), "website_name": website_name}
 
-def fetch_all_images_for_site(session, website_name):
-    """
-    Recupera todos los assets de tipo image para un sitio (usa /scan para grandes volúmenes).
-    Devuelve lista de dicts con al menos 'photo_id' y opcionalmente 'url'.
-    """
-    print(f"Obteniendo listados de imágenes para sitio '{website_name}'...")
-    images = []
+    if scan_enabled():
+        try:
+            for elems in scan_content(session, website_name, q, ["_id", "display_url", "url"]):
+                yield [to_image(e) for e in elems]
+            return
+        except requests.exceptions.RequestException as e:
+            print(f"Scan no disponible para '{website_name}' ({e}); usando paginación por offset.")
 
-    # Usar search/published con paginación (GET)
-    q = "type:image"
+    # Usar search/published con paginación (GET); sólo alcanza hasta MAX_RESULT_WINDOW
     params = {
         "website": website_name,
         "q": q,
@@ -461,13 +447,13 @@ def fetch_all_images_for_site(session, website_name):
         data = resp.json()
         total = data.get("count", 0)
         elems = data.get("content_elements", [])
+        if total > MAX_RESULT_WINDOW:
+            print(f"Advertencia: '{website_name}' tiene {total} imágenes; con paginación por offset sólo se recuperan {MAX_RESULT_WINDOW}.")
+            total = MAX_RESULT_WINDOW
 
         offset = 0
-        while offset < total:
-            for e in elems:
-                pid = e.get("_id")
-                url = e.get("display_url") or e.get("url")
-                images.append({"photo_id": pid, "url": url, "website_name": website_name})
+        while offset < total and elems:
+            yield [to_image(e) for e in elems]
 
             offset += len(elems)
             if offset >= total:
@@ -478,14 +464,9 @@ def fetch_all_images_for_site(session, website_name):
             resp.raise_for_status()
             data = resp.json()
             elems = data.get("content_elements", [])
-            time.sleep(0.2)
 
     except requests.exceptions.RequestException as e:
         print(f"Error al obtener imágenes para '{website_name}': {e}")
-        return images
-
-    print(f"Se recuperaron {len(images)} imágenes para '{website_name}'.")
-    return images
 
 
 def get_extreme_publish_date(session, website_name, ascending=True):
@@ -507,28 +488,478 @@ def get_extreme_publish_date(session, website_name, ascending=True):
     except Exception:
         return None
 
-def save_data_to_csv(all_data, filename):
+def notas_sorter():
+    """ExternalSorter de filas (sid, pub, url) por publish_date (ver external_sort.iso_sort_key)."""
+    return ExternalSorter(key=lambda row: iso_sort_key(row[1]))
+
+
+def write_notas_report(notas_fn, sorted_rows):
+    """
+    Escribe el reporte de notas en los formatos de REPORT_FORMAT. `sorted_rows()` debe
+    devolver un iterable nuevo de filas (sid, pub, url) ordenadas por fecha en cada llamada.
+    Devuelve cuántas filas escribió.
+    """
+    written = 0
+    if REPORT_FORMAT in ("csv", "both"):
+        written = write_sorted_csv(notas_fn, NOTAS_HEADER, sorted_rows())
+        print(f"Guardadas {written} notas en '{notas_fn}' (ordenadas por fecha).")
+    if REPORT_FORMAT in ("archive", "both"):
+        archive_fn = archive_path_for(notas_fn)
+        site = os.path.basename(os.path.dirname(notas_fn)) or None
+        written = write_archive(archive_fn, sorted_rows(), site=site)
+        print(f"Guardadas {written} notas en '{archive_fn}'.")
+    return written
+
+
+def read_notas_csv(notas_fn):
+    """
+    Genera las filas (sid, pub, url) de un `notas_publicadas_*.csv` existente. Si sólo
+    existe la versión `.arcc` (REPORT_FORMAT=archive), lee esa.
+    """
+    if not os.path.isfile(notas_fn):
+        archive_fn = archive_path_for(notas_fn)
+        if os.path.isfile(archive_fn):
+            yield from read_archive_rows(archive_fn)
+        return
+    with open(notas_fn, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for r in reader:
+            if r:
+                yield r[0], r[1] if len(r) > 1 else "", r[2] if len(r) > 2 else ""
+
+
+# --- Auditoría incremental ---
+
+def watermark_path(site_dir):
+    return os.path.join(site_dir, WATERMARK_FILENAME)
+
+
+def load_watermark(site_dir):
+    """Devuelve {'publish_date': ..., 'last_updated': ...} o None si el sitio nunca se auditó."""
+    try:
+        with open(watermark_path(site_dir), encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if data.get("publish_date") else None
+
+
+def report_years(site_dir, website_name):
+    """Años (ordenados) que tienen `notas_publicadas_<site>_<year>.csv` o su `.arcc` en `site_dir`."""
+    prefix = f"notas_publicadas_{website_name}_"
+    try:
+        return sorted({os.path.splitext(fn)[0][len(prefix):] for fn in os.listdir(site_dir)
+                       if fn.startswith(prefix) and fn.endswith((".csv", ARCHIVE_EXT))})
+    except OSError:
+        return []
+
+
+def watermark_from_reports(site_dir, website_name):
+    """Para sitios auditados antes de existir la marca de agua: toma la fecha máxima del CSV más reciente."""
+    for year in reversed(report_years(site_dir, website_name)):
+        pubs = [pub for _, pub, _ in read_notas_csv(os.path.join(site_dir, f"notas_publicadas_{website_name}_{year}.csv")) if pub]
+        if pubs:
+            return {"publish_date": max(pubs)}
+    return None
+
+
+def save_watermark(site_dir, watermark):
+    # Escritura atómica: un corte a mitad no deja una marca de agua corrupta
+    tmp = watermark_path(site_dir) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(watermark, f)
+    os.replace(tmp, watermark_path(site_dir))
+
+
+def max_watermark(watermark, story_tuples):
+    """Actualiza la marca de agua con la publish_date (y last_updated, si viene) más reciente."""
+    watermark = dict(watermark or {})
+    for t in story_tuples:
+        pub = t[1] if len(t) > 1 else None
+        if pub and pub > watermark.get("publish_date", ""):
+            watermark["publish_date"] = pub
+        updated = t[3] if len(t) > 3 else None
+        if updated and updated > watermark.get("last_updated", ""):
+            watermark["last_updated"] = updated
+    return watermark or None
+
+
+def fetch_stories_since(session, website_name, watermark):
     """
-    Guarda la lista de diccionarios de datos en un archivo CSV.
+    Recupera las notas publicadas o modificadas desde la marca de agua como una IdTable
+    (id, sitio, publish_date, url, last_updated).
     """
-    if not all_data:
+    pub_wm = watermark["publish_date"]
+    upd_wm = watermark.get("last_updated") or pub_wm
+    q = f"type:story AND (publish_date:[{pub_wm} TO *] OR last_updated_date:[{upd_wm} TO *])"
+    source_include = ["_id", "publish_date", "last_updated_date", "canonical_url", "website_url", "display_url", "url", "websites"]
+
+    def add_page(table, stories):
+        for story in stories:
+            if story.get("_id"):
+                table.append(story["_id"], website_name, story.get("publish_date"),
+                             extract_story_url(story), story.get("last_updated_date"))
+
+    if scan_enabled():
+        try:
+            results = IdTable()
+            for stories in scan_content(session, website_name, q, source_include):
+                add_page(results, stories)
+            return results
+        except requests.exceptions.RequestException as e:
+            print(f"Scan no disponible para '{website_name}' ({e}); usando paginación por offset.")
+
+    results = IdTable()
+    params = {"website": website_name, "q": q, "size": PAGE_SIZE, "_sourceInclude": ",".join(source_include),
+              "track_total_hits": "true", "from": 0}
+    total = None
+    while total is None or params["from"] < min(total, MAX_RESULT_WINDOW):
+        data = session.get_json(SEARCH_ENDPOINT, params=params, timeout=60)
+        total = data.get("count", 0)
+        stories = data.get("content_elements", [])
+        if not stories:
+            break
+        add_page(results, stories)
+        params["from"] += len(stories)
+    if total and total > MAX_RESULT_WINDOW:
+        print(f"Advertencia: {total} notas desde la marca de agua; sin scan sólo se recuperan {MAX_RESULT_WINDOW}.")
+    return results
+
+
+def merge_into_year_files(site_dir, website_name, stories):
+    """
+    Mezcla las notas nuevas/modificadas (IdTable) en los `notas_publicadas_<site>_<year>.csv`
+    existentes (por story_id: las nuevas se agregan, las existentes se actualizan). Una nota
+    cuya publish_date cambió de año sale del reporte del año anterior. Sólo se reescriben
+    los años que recibieron o perdieron notas.
+
+    Los reportes ya están ordenados por fecha: cada uno se recorre en streaming, sin las filas
+    de los IDs recibidos, y se mezcla con las recibidas para su año (ordenadas en la IdTable).
+    Los reportes de los demás años se leen para encontrar las notas que se mudaron.
+    """
+    # Año UTC: una fecha con offset puede caer en otro año que el de su texto
+    by_year = stories.group_by_date("year")
+    by_year.pop(None, None)
+    new_by_year = {}
+    for year, table in by_year.items():
+        table.dedupe()
+        table.sort_by_date()
+        new_by_year[year] = [(sid, pub or "", url or "") for sid, pub, url in table.rows("id", "publish_date", "url")]
+    received = {row[0] for rows in new_by_year.values() for row in rows}
+
+    for year in sorted(set(report_years(site_dir, website_name)) | set(new_by_year)):
+        notas_fn = os.path.join(site_dir, f"notas_publicadas_{website_name}_{year}.csv")
+        new_rows = new_by_year.get(year, [])
+        if not new_rows and not any(row[0] in received for row in read_notas_csv(notas_fn)):
+            continue
+        # IDs quitados en cada pasada (con REPORT_FORMAT=both la segunda lee el CSV ya mezclado)
+        removed_per_pass = []
+
+        def sorted_rows(notas_fn=notas_fn, new_rows=new_rows):
+            removed = set()
+            removed_per_pass.append(removed)
+
+            def existing_rows():
+                for row in read_notas_csv(notas_fn):
+                    if row[0] in received:
+                        removed.add(row[0])
+                    else:
+                        yield row
+
+            return heapq.merge(existing_rows(), new_rows, key=lambda row: iso_sort_key(row[1]))
+
+        try:
+            write_notas_report(notas_fn, sorted_rows)
+        except (IOError, ValueError) as e:
+            print(f"Error al escribir archivo '{notas_fn}': {e}")
+            continue
+        removed = removed_per_pass[0]
+        updated = sum(1 for row in new_rows if row[0] in removed)
+        moved = len(removed) - updated
+        if new_rows:
+            print(f"{website_name} {year}: {len(new_rows) - updated} notas nuevas, {updated} actualizadas.")
+        if moved:
+            print(f"{website_name} {year}: {moved} notas pasaron a otro año.")
+
+
+def audit_site_incremental(session, website_name, site_dir, watermark):
+    """Trae sólo lo nuevo desde la marca de agua, lo mezcla en los CSV anuales y avanza la marca."""
+    print(f"\n--- Auditoría incremental de '{website_name}' desde {watermark['publish_date']} ---")
+    try:
+        stories = fetch_stories_since(session, website_name, watermark)
+    except requests.exceptions.RequestException as e:
+        print(f"La auditoría incremental falló para '{website_name}': {e}")
+        return
+    if not len(stories):
+        print(f"Sin novedades para '{website_name}'.")
         return
 
+    index = shared_index()
+    if index:
+        index.upsert((sid, "story", website_name, pub, url, updated)
+                     for sid, pub, url, updated in stories.rows("id", "publish_date", "url", "last_updated"))
+
+    metrics.add_items("notas", website_name, "incremental", len(stories))
+    newest = (None, stories.max_date(), None, stories.max_date("last_updated"))
+    merge_into_year_files(site_dir, website_name, stories)
+    save_watermark(site_dir, max_watermark(watermark, [newest]))
+
+
+# --- Auditoría de uso de fotos ---
+
+def iter_site_photo_refs(session, website_name, failures):
+    """
+    Recorre una sola vez cada fuente de PHOTO_REF_SOURCES del sitio (notas, galerías y videos,
+    publicados y sin publicar) y genera, por página, sus referencias a fotos. Usa /scan; sin
+    scan, sólo las notas publicadas tienen respaldo (particionado por fecha entre la más vieja
+    y la más nueva). Lo que no se pudo recorrer se agrega a `failures`.
+    """
+    for q, published in PHOTO_REF_SOURCES:
+        label = f"{q} ({'publicado' if published else 'sin publicar'})"
+        if scan_enabled():
+            try:
+                for docs in scan_content(session, website_name, q, PHOTO_SOURCE_INCLUDE, published):
+                    photos = []
+                    for doc in docs:
+                        photos.extend(parse_ans_for_photos(doc))
+                    yield photos
+                continue
+            except requests.exceptions.RequestException as e:
+                # Lo ya indexado no se pierde: las referencias repetidas se ignoran al insertar
+                print(f"Scan no disponible para '{website_name}' {label} ({e}); usando paginación por offset.")
+
+        if (q, published) != ("type:story", True):
+            print(f"'{website_name}': {label} no se puede recorrer sin scan.")
+            failures.append((q, published))
+            continue
+        oldest = parse_iso(get_extreme_publish_date(session, website_name, ascending=True))
+        newest = parse_iso(get_extreme_publish_date(session, website_name, ascending=False))
+        if not oldest or not newest:
+            print(f"No se pudo determinar el rango de fechas de las notas de '{website_name}'.")
+            failures.append((None, None))
+            continue
+        start_dt = datetime(oldest.year, 1, 1)
+        end_dt = datetime(newest.year, 12, 31, 23, 59, 59)
+        yield from iter_story_photos_by_date_range(session, website_name, start_dt, end_dt, failures)
+
+
+def audit_photos_for_site(session, website_name, photo_index):
+    """
+    Rehace en `photo_index` las referencias a fotos de las notas, galerías y videos del sitio
+    (ver iter_site_photo_refs) y su inventario de imágenes. Cada página se inserta apenas llega,
+    sin acumular nada en memoria. Devuelve False si no se pudo recorrer alguna fuente (las
+    referencias del sitio quedaron incompletas).
+    """
+    print(f"\n--- Auditoría de uso de fotos para '{website_name}' ---")
+    photo_index.reset_site(website_name)
+
+    refs = 0
+    failures = []
+    with tqdm(desc=f"Indexando fotos usadas en '{website_name}'", unit=" refs") as pbar:
+        for photos in iter_site_photo_refs(session, website_name, failures):
+            added = photo_index.add_refs(website_name, photos)
+            metrics.add_items("fotos", website_name, "refs", added)
+            refs += added
+            pbar.update(len(photos))
+
+    images = 0
+    with tqdm(desc=f"Indexando inventario de imágenes de '{website_name}'", unit=" imgs") as pbar:
+        for page in iter_site_images(session, website_name):
+            added = photo_index.add_images(page)
+            metrics.add_items("fotos", website_name, "imagenes", added)
+            images += added
+            pbar.update(len(page))
+
+    print(f"'{website_name}': {refs} referencias a fotos, {images} imágenes en el inventario.")
+    if failures:
+        print(f"⚠️ '{website_name}': {len(failures)} fuentes o rangos no se pudieron recorrer; las referencias a fotos están incompletas.")
+    return not failures
+
+
+def write_photo_reports(photo_index, sites, incomplete_sites=(), confirmed=False):
+    """
+    Escribe el reporte de uso (OUTPUT_FILENAME) y, por sitio, las imágenes huérfanas. Se llama
+    después de indexar todos los sitios para que cuenten los usos cruzados entre sitios.
+
+    Sólo cuentan como usos los documentos de los sitios auditados (`sites`): una imagen usada
+    únicamente por otro sitio aparece como huérfana. Por eso, sin `confirmed` (CONFIRM_ORPHANS:
+    `sites` son todos los sitios de la organización) las huérfanas van a ORPHANS_REVIEW_FILENAME,
+    que pipeline_notas.py no borra, y no a ORPHANS_FILENAME. Si algún sitio no se recorrió
+    completo (`incomplete_sites`) no se escribe ningún listado. En los dos casos se borran los
+    listados borrables de corridas anteriores.
+    """
+    n = write_rows_csv(OUTPUT_FILENAME, USAGE_COLUMNS,
+                       itertools.chain.from_iterable(photo_index.iter_usage(site) for site in sites))
+    print(f"\n¡Éxito! Se guardaron {n} referencias a fotos en el archivo '{OUTPUT_FILENAME}'.")
+    for site in sites:
+        orphans_fn = os.path.join(REPORTS_DIR, site, ORPHANS_FILENAME.format(site=site))
+        review_fn = os.path.join(REPORTS_DIR, site, ORPHANS_REVIEW_FILENAME.format(site=site))
+        stale = [fn for fn in (orphans_fn, review_fn) if os.path.exists(fn)]
+        if incomplete_sites:
+            for fn in stale:
+                os.remove(fn)
+            print(f"'{site}': no se escriben imágenes huérfanas porque {', '.join(sorted(incomplete_sites))}"
+                  " no se recorrieron completos.")
+            continue
+        if confirmed:
+            if review_fn in stale:
+                os.remove(review_fn)
+            n = write_rows_csv(orphans_fn, ORPHAN_COLUMNS, photo_index.iter_orphans(site))
+            print(f"'{site}': {n} imágenes huérfanas guardadas en '{orphans_fn}'.")
+            continue
+        if orphans_fn in stale:
+            os.remove(orphans_fn)
+        n = write_rows_csv(review_fn, ORPHAN_REVIEW_COLUMNS, review_rows(photo_index.iter_orphans(site)))
+        print(f"'{site}': {n} posibles imágenes huérfanas en '{review_fn}' (sólo para revisar: un sitio no"
+              " auditado puede usarlas; con CONFIRM_ORPHANS=1 se escribe el listado para borrar).")
+
+
+# --- Ejecución paralela por (sitio, año) ---
+
+def resolve_years_for_site(session, site, years_to_process):
+    """Interpreta years_to_process para un sitio (soporta rango abierto '2021-'). Devuelve años descendentes."""
+    resolved_years = []
+    for part in years_to_process:
+        if part.endswith("-"):
+            # ejemplo '2021-' -> desde 2021 hacia atrás hasta el año mínimo del sitio
+            try:
+                start_y = int(part[:-1])
+            except ValueError:
+                continue
+            # obtener año mínimo del sitio
+            min_date = get_extreme_publish_date(session, site, ascending=True)
+            if not min_date:
+                # no hay datos, saltar
+                continue
+            min_y = int(parse_iso(min_date).year)
+            # años desde start_y hacia min_y
+            for y in range(start_y, min_y - 1, -1):
+                resolved_years.append(str(y))
+        else:
+            resolved_years.append(part)
+
+    # eliminar duplicados y ordenar descendente (start year -> older)
+    return sorted(set(resolved_years), reverse=True)
+
+
+def estimate_job_size(session, site, year):
+    """Cantidad de notas de (sitio, año), usando el cache de counts. None si el count falla."""
+    start_dt = datetime(int(year), 1, 1)
+    end_dt = datetime(int(year), 12, 31, 23, 59, 59)
+
+    def count(s_dt, e_dt):
+        return fetch_count_for_query(session, site, f"type:story AND publish_date:[{dt_to_iso(s_dt)} TO {dt_to_iso(e_dt)}]")
+
+    cache = shared_cache()
+    if cache:
+        count = cache.cached_count_fn(site, "story", count)
     try:
-        # Asegurar directorio destino
-        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        return count(start_dt, end_dt)
+    except requests.exceptions.RequestException as e:
+        print(f"No se pudo estimar el tamaño de {site} {year}: {e}")
+        return None
 
-        with open(filename, "w", newline="", encoding="utf-8") as csvfile:
-            # Las claves del primer diccionario se usarán como cabeceras
-            fieldnames = list(all_data[0].keys())
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
 
-            writer.writeheader()
-            writer.writerows(all_data)
+def seed_year_plan(site, year, pubs):
+    """
+    Con las fechas de todas las notas de (sitio, año) a mano, guarda en el cache el count del
+    año y su plan de ventanas (ver partition_planner.plan_from_epochs): la próxima corrida no
+    necesita counts para estimar el job ni para particionar el año si tiene que paginar por offset.
+    """
+    cache = shared_cache()
+    if not cache:
+        return
+    start_dt = datetime(int(year), 1, 1)
+    end_dt = datetime(int(year), 12, 31, 23, 59, 59)
+    cache.put_count(site, "story", start_dt, end_dt, len(pubs))
+    plan = plan_from_epochs(start_dt, end_dt, to_epoch_ms_array(pubs), MAX_RESULT_WINDOW)
+    if plan is not None:
+        cache.put_plan(site, "story", start_dt, end_dt, MAX_RESULT_WINDOW, plan)
+
+
+def audit_year_job(session, site, year):
+    """
+    Recupera las notas de (sitio, año) volcándolas a runs ordenados en disco, escribe su CSV
+    (o `.arcc`) con un merge externo apenas termina y devuelve la marca de agua del job, con
+    `complete` en False si algún pedido falló (el reporte quedó incompleto).
+    """
+    notas_fn = os.path.join(REPORTS_DIR, site, f"notas_publicadas_{site}_{year}.csv")
+    newest = None
+    failures = []
+    pubs = []
+    with notas_sorter() as sorter:
+        for sid, pub, url in iter_story_ids_for_year(session, site, int(year), show_progress=False, failures=failures):
+            sorter.add((sid, pub or "", url or ""))
+            pubs.append(pub or "")
+            if pub and (newest is None or pub > newest):
+                newest = pub
+        if not len(sorter):
+            print(f"No se encontraron notas para {site} en {year}.")
+            return {"publish_date": None, "complete": not failures}
+        metrics.add_items("notas", site, n=len(sorter))
+
+        # Guardar los IDs de las notas con su fecha de publicación y ordenados por fecha
+        write_notas_report(notas_fn, sorter.sorted_rows)
+
+        # Volcar lo recuperado al índice local (ver content_index.py)
+        index = shared_index()
+        if index:
+            index.upsert((sid, "story", site, pub or None, url or None, None) for sid, pub, url in sorter.sorted_rows())
+    if not failures:
+        seed_year_plan(site, year, pubs)
+    if failures:
+        print(f"⚠️ {site} {year}: {len(failures)} pedidos fallaron; el reporte quedó incompleto.")
+    return {"publish_date": newest, "complete": not failures}
+
+
+def run_audit_jobs(session, sites, years_to_process, max_workers=None):
+    """
+    Ejecuta todos los jobs (sitio, año) en un pool de threads bajo el limitador común del cliente.
+    Los jobs más grandes arrancan primero para que el último en terminar no sea uno enorme.
+    La marca de agua de un sitio sólo se guarda si todos sus jobs terminaron completos: si no,
+    la próxima corrida incremental salteraría lo que faltó.
+    """
+    max_workers = max_workers or AUDIT_WORKERS
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        years_by_site = dict(zip(sites, pool.map(lambda site: resolve_years_for_site(session, site, years_to_process), sites)))
+        jobs = [(site, year) for site in sites for year in years_by_site[site]]
+        sizes = list(pool.map(lambda job: estimate_job_size(session, *job), jobs))
+
+        # Los de tamaño desconocido (count fallido) van al final; los vacíos se omiten
+        ordered = sorted(zip(jobs, sizes), key=lambda js: -1 if js[1] is None else js[1], reverse=True)
+        for (site, year), size in ordered:
+            if size == 0:
+                print(f"No se encontraron notas para {site} en {year}.")
+        pending = [(job, size) for job, size in ordered if size != 0]
+        print(f"{len(pending)} jobs (sitio, año) con {sum(size or 0 for _, size in pending)} notas; {max_workers} en paralelo.")
+
+        futures = {pool.submit(audit_year_job, session, site, year): (site, year) for (site, year), _ in pending}
+        watermarks = {}
+        failed_sites = set()
+        for done, future in enumerate(as_completed(futures), 1):
+            site, year = futures[future]
+            try:
+                job_watermark = future.result()
+            except Exception as e:
+                print(f"El job {site} {year} falló: {e}")
+                failed_sites.add(site)
+                continue
+            if not job_watermark["complete"]:
+                failed_sites.add(site)
+            if job_watermark["publish_date"]:
+                watermarks[site] = max_watermark(watermarks.get(site), [(None, job_watermark["publish_date"])])
+            print(f"[{done}/{len(futures)}] {site} {year} terminado.")
+
+    # Guardar la marca de agua para que la próxima corrida pueda ser incremental. Se mezcla con
+    # la existente: auditar sólo un año viejo no debe hacerla retroceder ni perder last_updated.
+    for site, watermark in watermarks.items():
+        if site in failed_sites:
+            print(f"⚠️ '{site}' tuvo jobs fallidos o incompletos: no se actualiza su marca de agua.")
+            continue
+        site_dir = os.path.join(REPORTS_DIR, site)
+        save_watermark(site_dir, max_watermark(load_watermark(site_dir), [(None, watermark["publish_date"])]))
 
-        print(f"\n¡Éxito! Se guardaron {len(all_data)} registros en el archivo '{filename}'.")
-    except IOError as e:
-        print(f"Error al escribir en el archivo '{filename}': {e}")
 
 if __name__ == "__main__":
     # Volver a leer las variables de entorno (en caso de que el usuario haya creado/actualizado .env recientemente)
@@ -542,7 +973,7 @@ if __name__ == "__main__":
         ("ARC_ACCESS_TOKEN", ARC_ACCESS_TOKEN),
         ("ORG_ID", ORG_ID),
         ("WEBSITE_NAMES", WEBSITE_NAMES_STR),
-        ("YEARS_TO_AUDIT", YEARS_TO_AUDIT_STR),
+        ("YEARS_TO_AUDIT", YEARS_TO_AUDIT_STR or INCREMENTAL),
     ) if not v]
 
     if missing:
@@ -580,82 +1011,40 @@ if __name__ == "__main__":
             else:
                 years_to_process.append(part)
 
-    # resultados acumulados
-    all_results = []
-
-    print(f"Se procesarán {len(sites_to_process)} sitios para los años: {', '.join(years_to_process)}.")
+    if years_to_process:
+        print(f"Se procesarán {len(sites_to_process)} sitios para los años: {', '.join(years_to_process)}.")
+    else:
+        print(f"Se procesarán {len(sites_to_process)} sitios en modo incremental.")
 
-    with requests.Session() as session:
-        session.headers.update({
-            "Authorization": f"Bearer {ARC_ACCESS_TOKEN}",
-            "Content-Type": "application/json"
-        })
-        
-        # Bucle principal para iterar sobre cada sitio y cada año
+    # Cliente común: limitador, reintentos ante 429/5xx y pool de conexiones (ver arc_client.py).
+    # Es seguro entre threads: todos los jobs comparten el mismo presupuesto de req/s.
+    start_metrics_server()
+    with ArcClient(token=ARC_ACCESS_TOKEN, pool_size=AUDIT_WORKERS * 2) as session:
+        full_audit_sites = []
         for site in sites_to_process:
             # preparar carpeta por sitio
             site_dir = os.path.join(REPORTS_DIR, site)
             os.makedirs(site_dir, exist_ok=True)
 
-            # Interpretar years_to_process para este sitio (soporta rango abierto '2021-')
-            resolved_years = []
-            for part in years_to_process:
-                if part.endswith("-"):
-                    # ejemplo '2021-' -> desde 2021 hacia atrás hasta el año mínimo del sitio
-                    try:
-                        start_y = int(part[:-1])
-                    except ValueError:
-                        continue
-                    # obtener año mínimo del sitio
-                    min_date = get_extreme_publish_date(session, site, ascending=True)
-                    if not min_date:
-                        # no hay datos, saltar
-                        continue
-                    min_y = int(parse_iso(min_date).year)
-                    # años desde start_y hacia min_y
-                    for y in range(start_y, min_y - 1, -1):
-                        resolved_years.append(str(y))
-                else:
-                    resolved_years.append(part)
-
-            # eliminar duplicados y ordenar descendente (start year -> older)
-            resolved_years = sorted(set(resolved_years), reverse=True)
-
-            for year in resolved_years:
-                # Obtener solo los IDs de las notas para este sitio y año
-                story_tuples = fetch_story_ids_for_year(session, site, int(year))
-                if not story_tuples:
-                    print(f"No se encontraron notas para {site} en {year}.")
+            if INCREMENTAL:
+                watermark = load_watermark(site_dir) or watermark_from_reports(site_dir, site)
+                if watermark:
+                    audit_site_incremental(session, site, site_dir, watermark)
                     continue
-
-                # Guardar los IDs de las notas con su fecha de publicación y ordenados por fecha
-                notas_fn = os.path.join(site_dir, f"notas_publicadas_{site}_{year}.csv")
-                try:
-                    # ordenar por publish_date (ascendente). Si falta la fecha, la colocamos al final.
-                    def _parse_pub(t):
-                        # t puede ser (sid, pub) o (sid, pub, url)
-                        pub = t[1] if len(t) > 1 else None
-                        dt = parse_iso(pub)
-                        return dt or datetime.min
-
-                    sorted_tuples = sorted(story_tuples, key=_parse_pub)
-
-                    with open(notas_fn, "w", newline="", encoding="utf-8") as f:
-                        writer = csv.writer(f)
-                        # incluir columna url si está presente en las tuplas
-                        writer.writerow(["story_id", "publish_date", "url"])  # header
-                        for t in sorted_tuples:
-                            if len(t) >= 3:
-                                sid, pub, url = t[0], t[1], t[2]
-                            else:
-                                sid, pub = t[0], t[1]
-                                url = ""
-                            writer.writerow([sid, pub, url])
-                    print(f"Guardadas {len(sorted_tuples)} notas en '{notas_fn}' (ordenadas por fecha).")
-                except IOError as e:
-                    print(f"Error al escribir archivo '{notas_fn}': {e}")
-
-    if all_results:
-        save_data_to_csv(all_results, OUTPUT_FILENAME)
-    else:
-        print("\nNo se encontraron referencias a fotos en ninguno de los sitios y años especificados.")
\ No newline at end of file
+                print(f"'{site}' no tiene marca de agua en '{site_dir}': se hace la auditoría completa.")
+            full_audit_sites.append(site)
+
+        if full_audit_sites:
+            # En modo incremental sin YEARS_TO_AUDIT, un sitio sin marca de agua se audita
+            # completo: desde el año en curso hasta el primero del sitio
+            full_audit_years = years_to_process or [f"{datetime.utcnow().year}-"]
+            run_audit_jobs(session, full_audit_sites, full_audit_years)
+
+        if AUDIT_PHOTOS:
+            photo_index = PhotoUsageIndex()
+            incomplete_sites = [site for site in sites_to_process
+                                if not audit_photos_for_site(session, site, photo_index)]
+            write_photo_reports(photo_index, sites_to_process, incomplete_sites, CONFIRM_ORPHANS)
+            photo_index.close()
+
+    finish_run(concurrency=AUDIT_WORKERS)
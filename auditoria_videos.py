@@ -1,11 +1,19 @@
 import os
-import requests
-import time
-from datetime import datetime, timedelta
+import asyncio
+import aiohttp
+from datetime import datetime
 import sys
 import csv
 from dotenv import load_dotenv
 from tqdm import tqdm
+from arc_client import AsyncArcClient, content_api_base
+from arc_metrics import finish_run, metrics, start_metrics_server
+from partition_planner import plan_partitions_async, split_range, LEVELS
+from arc_scan import SCAN_PATH, SCAN_PAGE_SIZE, scan_enabled, scan_pages_async
+from count_cache import shared_cache
+from content_index import shared_index
+from arc_ids import IdTable
+from timestamps import dt_to_iso, parse_iso
 
 load_dotenv()
 
@@ -13,12 +21,25 @@ ARC_ACCESS_TOKEN = os.getenv("ARC_ACCESS_TOKEN")
 ORG_ID = os.getenv("ORG_ID")
 WEBSITE_NAMES_STR = os.getenv("WEBSITE_NAMES")
 
-API_BASE_URL = f"https://api.{ORG_ID}.arcpublishing.com/content/v4/search/published"
+API_BASE_URL = f"{content_api_base(ORG_ID)}/content/v4/search/published"
+SCAN_API_URL = f"{content_api_base(ORG_ID)}{SCAN_PATH}"
 PAGE_SIZE = 100
 MAX_RESULT_WINDOW = 10000
 OUTPUT_FILENAME = "todos_los_videos_para_eliminar.csv"
 
-def fetch_video_page(session, from_offset, website_name, query_string="type:video", size=PAGE_SIZE, extra_params=None):
+# CONFIGURACIÓN DE CONCURRENCIA
+# La velocidad (req/s) se configura en arc_client.py; acá sólo cuánto trabajo hay en vuelo.
+# Páginas simultáneas por ventana de fechas y conexiones totales abiertas.
+PAGES_IN_FLIGHT = 4
+MAX_CONNECTIONS = 30
+
+
+async def fetch_json(client, url, params, website_name):
+    """GET vía el cliente común (limitador, reintentos ante 429/5xx y Retry-After)."""
+    return await client.get_json(url, params=params, label=f"sitio {website_name}")
+
+
+async def fetch_video_page(client, from_offset, website_name, query_string="type:video", size=PAGE_SIZE, extra_params=None):
     """
     Realiza una única llamada a la Content API para una página de resultados de un sitio específico.
     """
@@ -34,35 +55,42 @@ def fetch_video_page(session, from_offset, website_name, query_string="type:vide
     if extra_params:
         params.update(extra_params)
 
-    try:
-        response = session.get(API_BASE_URL, params=params, timeout=30)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.HTTPError as http_err:
-        print(f"Error HTTP para el sitio {website_name}: {http_err} - {response.text}")
-        raise
-    except requests.exceptions.RequestException as err:
-        print(f"Error en la solicitud para el sitio {website_name}: {err}")
-        raise
-
-
-def parse_iso(s: str) -> datetime:
-    if not s:
-        return None
-    try:
-        if s.endswith("Z"):
-            return datetime.strptime(s, "%Y-%m-%dT%H:%M:%SZ")
-        return datetime.fromisoformat(s)
-    except Exception:
-        return datetime.strptime(s.split("+")[0], "%Y-%m-%dT%H:%M:%S")
+    return await fetch_json(client, API_BASE_URL, params, website_name)
 
 
-def dt_to_iso(dt: datetime) -> str:
-    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+async def scan_video_ids(client, website_name, query_string):
+    """Recorre todos los resultados de `query_string` con el cursor de /scan (sin límite de 10k)."""
+    params = {
+        "website": website_name,
+        "q": query_string,
+        "size": SCAN_PAGE_SIZE,
+        "_sourceInclude": "_id",
+    }
+
+    async def fetch(p):
+        return await fetch_json(client, SCAN_API_URL, p, website_name)
 
+    ids = []
+    async for page in scan_pages_async(fetch, params):
+        ids.extend(item.get("_id") for item in page if item.get("_id"))
+    return ids
 
-def midpoint_dt(start: datetime, end: datetime) -> datetime:
-    return start + (end - start) / 2
+
+async def scan_videos_by_date_range(client, website_name, start_dt: datetime, end_dt: datetime):
+    """
+    Recorre [start_dt, end_dt] con cursores de /scan, un cursor por año en paralelo.
+    Los cortes por año sólo reparten el trabajo: no requieren counts previos.
+    """
+    slices = split_range(start_dt, end_dt, LEVELS[0])
+    per_slice = await asyncio.gather(*(scan_video_ids(client, website_name, format_date_query(s, e)) for s, e in slices))
+    ids = [vid for slice_ids in per_slice for vid in slice_ids]
+    print(f"Scan de '{website_name}': {len(ids)} videos en {len(slices)} cursores.")
+    return ids_to_table(ids, website_name)
+
+
+def ids_to_table(ids, website_name):
+    """IDs de un sitio como IdTable compacta (ver arc_ids.py)."""
+    return IdTable.from_rows((vid, website_name) for vid in ids)
 
 
 def format_date_query(start_dt: datetime, end_dt: datetime) -> str:
@@ -71,15 +99,15 @@ def format_date_query(start_dt: datetime, end_dt: datetime) -> str:
     return f"type:video AND publish_date:[{start_s} TO {end_s}]"
 
 
-def fetch_count_for_query(session, website_name, query_string):
-    data = fetch_video_page(session, 0, website_name, query_string=query_string, size=1)
+async def fetch_count_for_query(client, website_name, query_string):
+    data = await fetch_video_page(client, 0, website_name, query_string=query_string, size=1)
     return data.get("count", 0)
 
 
-def get_extreme_publish_date(session, website_name, ascending=True):
+async def get_extreme_publish_date(client, website_name, ascending=True):
     sort_order = "publish_date:asc" if ascending else "publish_date:desc"
     try:
-        data = fetch_video_page(session, 0, website_name, query_string="type:video", size=1, extra_params={"sort": sort_order})
+        data = await fetch_video_page(client, 0, website_name, query_string="type:video", size=1, extra_params={"sort": sort_order})
         elems = data.get("content_elements", [])
         if not elems:
             return None
@@ -88,71 +116,111 @@ def get_extreme_publish_date(session, website_name, ascending=True):
         return None
 
 
-def collect_videos_by_date_range(session, website_name, start_dt: datetime, end_dt: datetime):
+async def fetch_remaining_pages(client, website_name, query_string, first_page, total, on_page=None):
+    """
+    Dada la primera página de una consulta y su total, recupera el resto de las páginas con
+    hasta PAGES_IN_FLIGHT peticiones simultáneas. Devuelve los IDs en el orden del API.
+    """
+    pages = [[item.get("_id") for item in first_page.get("content_elements", []) if item.get("_id")]]
+    if on_page:
+        on_page(len(pages[0]))
+    offsets = list(range(PAGE_SIZE, min(total, MAX_RESULT_WINDOW), PAGE_SIZE))
+    semaphore = asyncio.Semaphore(PAGES_IN_FLIGHT)
+
+    async def fetch_one(offset):
+        async with semaphore:
+            page = await fetch_video_page(client, offset, website_name, query_string=query_string, size=PAGE_SIZE)
+        page_ids = [item.get("_id") for item in page.get("content_elements", []) if item.get("_id")]
+        if on_page:
+            on_page(len(page_ids))
+        return page_ids
+
+    pages.extend(await asyncio.gather(*(fetch_one(offset) for offset in offsets)))
+    return [vid for page_ids in pages for vid in page_ids]
+
+
+async def plan_video_windows(client, website_name, start_dt: datetime, end_dt: datetime):
+    """
+    Plan de ventanas [(s, e, count), ...] bajo MAX_RESULT_WINDOW para los videos del rango. El
+    planificador cuenta buckets de calendario en paralelo; counts y planes se reutilizan del
+    cache persistente (count_cache).
+    """
+    cache = shared_cache()
+    plan = cache.get_plan(website_name, "video", start_dt, end_dt, MAX_RESULT_WINDOW) if cache else None
+    if plan is None:
+        async def count_window(s_dt, e_dt):
+            return await fetch_count_for_query(client, website_name, format_date_query(s_dt, e_dt))
+
+        if cache:
+            count_window = cache.cached_count_fn_async(website_name, "video", count_window)
+        plan = await plan_partitions_async(start_dt, end_dt, count_window, max_window=MAX_RESULT_WINDOW)
+        if cache:
+            cache.put_plan(website_name, "video", start_dt, end_dt, MAX_RESULT_WINDOW, plan)
+    return plan
+
+
+async def collect_videos_by_date_range(client, website_name, start_dt: datetime, end_dt: datetime):
     """
-    Recursively colecta videos en el rango [start_dt, end_dt] subdividiendo cuando una ventana supera MAX_RESULT_WINDOW.
-    Devuelve lista de tuplas (arc_id, website_name)
+    Colecta videos en el rango [start_dt, end_dt]: arma el plan de ventanas (plan_video_windows)
+    y recupera todas las ventanas en paralelo. Si el count real de una ventana ya supera
+    MAX_RESULT_WINDOW (el plan del cache quedó viejo), se invalidan sus counts y planes
+    cacheados y esa ventana se vuelve a partir con counts frescos.
+    Devuelve una IdTable con (arc_id, website_name).
     """
-    results = []
+    plan = await plan_video_windows(client, website_name, start_dt, end_dt)
+    print(f"Plan para '{website_name}': {len(plan)} ventanas, {sum(c for _, _, c in plan)} videos.")
 
-    def retrieve_window(s_dt: datetime, e_dt: datetime):
-        print(f"Consultando rango {dt_to_iso(s_dt)} .. {dt_to_iso(e_dt)} para sitio '{website_name}'...")
+    async def retrieve_window(s_dt: datetime, e_dt: datetime, count):
         q = format_date_query(s_dt, e_dt)
-        count = fetch_count_for_query(session, website_name, q)
-        print(f"  -> count={count} (límite {MAX_RESULT_WINDOW})")
-        if count == 0:
-            return []
-        if count > MAX_RESULT_WINDOW:
-            print(f"  -> El rango supera el límite; subdividiendo...")
-            mid = midpoint_dt(s_dt, e_dt)
-            left = retrieve_window(s_dt, mid)
-            right = retrieve_window(mid + timedelta(seconds=1), e_dt)
-            return left + right
-        items = []
-        offset = 0
-        while True:
-            page = fetch_video_page(session, offset, website_name, query_string=q, size=PAGE_SIZE)
-            page_items = [item.get("_id") for item in page.get("content_elements", []) if item.get("_id")]
-            if not page_items:
-                break
-            items.extend([(vid, website_name) for vid in page_items])
-            offset += len(page_items)
-            print(f"    > recuperados {offset}/{page.get('count', '?')} en ventana {dt_to_iso(s_dt)}..{dt_to_iso(e_dt)}")
-            if offset >= page.get("count", 0):
-                break
-            time.sleep(0.1)
-        return items
-
-    results = retrieve_window(start_dt, end_dt)
-    return results
-
-def get_videos_for_site(session, website_name):
+        first_page = await fetch_video_page(client, 0, website_name, query_string=q, size=PAGE_SIZE)
+        total = first_page.get("count", count)
+        if total > MAX_RESULT_WINDOW:
+            if e_dt <= s_dt:
+                raise RuntimeError(f"El segundo {dt_to_iso(s_dt)} tiene {total} videos (> {MAX_RESULT_WINDOW}): no se puede partir más.")
+            print(f"    > la ventana {dt_to_iso(s_dt)}..{dt_to_iso(e_dt)} ya tiene {total} videos (> {MAX_RESULT_WINDOW}, el plan tenía {count}); se vuelve a partir.")
+            cache = shared_cache()
+            if cache:
+                cache.invalidate(website_name, "video", s_dt, e_dt)
+            sub_plan = await plan_video_windows(client, website_name, s_dt, e_dt)
+            return await retrieve_windows(sub_plan)
+        ids = await fetch_remaining_pages(client, website_name, q, first_page, total)
+        print(f"    > recuperados {len(ids)}/{total} en ventana {dt_to_iso(s_dt)}..{dt_to_iso(e_dt)}")
+        return ids_to_table(ids, website_name)
+
+    async def retrieve_windows(windows):
+        videos = IdTable()
+        for table in await asyncio.gather(*(retrieve_window(s, e, c) for s, e, c in windows)):
+            videos.extend(table)
+        return videos
+
+    return await retrieve_windows(plan)
+
+
+async def get_videos_for_site(client, website_name):
     """
     Orquesta el proceso para recuperar todos los IDs de video para UN SOLO sitio.
-    Devuelve una lista de tuplas (id, website_name).
+    Devuelve una IdTable con (id, website_name).
     """
     print(f"\n--- Iniciando auditoría para el sitio: {website_name} ---")
-    
-    videos_for_this_site = []
-    from_offset = 0
-    total_hits = 0
 
     try:
-        initial_data = fetch_video_page(session, from_offset, website_name)
+        initial_data = await fetch_video_page(client, 0, website_name)
         total_hits = initial_data.get("count", 0)
 
         if total_hits == 0:
             print(f"No se encontraron videos para el sitio '{website_name}'.")
-            return []
+            return IdTable()
 
         if total_hits > MAX_RESULT_WINDOW:
             print(f"El sitio '{website_name}' tiene {total_hits} elementos (> {MAX_RESULT_WINDOW}). Usando particionado por fecha.")
             try:
-                min_date_str = get_extreme_publish_date(session, website_name, ascending=True)
-                max_date_str = get_extreme_publish_date(session, website_name, ascending=False)
+                min_date_str, max_date_str = await asyncio.gather(
+                    get_extreme_publish_date(client, website_name, ascending=True),
+                    get_extreme_publish_date(client, website_name, ascending=False),
+                )
                 if not (min_date_str and max_date_str):
                     print(f"No se pudieron obtener fechas extremas para '{website_name}', abortando particionado.")
-                    return []
+                    return IdTable()
 
                 min_dt = parse_iso(min_date_str)
                 max_dt = parse_iso(max_date_str)
@@ -161,39 +229,28 @@ def get_videos_for_site(session, website_name):
                 effective_end = min(max_dt, cutoff_dt) if cutoff_dt else max_dt
                 if min_dt > effective_end:
                     print(f"Todas las publicaciones de '{website_name}' son posteriores al corte {cutoff_str}. No hay nada que borrar.")
-                    return []
-
-                return collect_videos_by_date_range(session, website_name, min_dt, effective_end)
+                    return IdTable()
+
+                if scan_enabled():
+                    try:
+                        return await scan_videos_by_date_range(client, website_name, min_dt, effective_end)
+                    except aiohttp.ClientError as e:
+                        print(f"Scan no disponible para '{website_name}' ({e}); usando particionado por fecha.")
+                return await collect_videos_by_date_range(client, website_name, min_dt, effective_end)
             except Exception as e:
                 print(f"Error al particionar por fecha para el sitio '{website_name}': {e}")
-                return []
+                return IdTable()
 
         print(f"Se encontraron {total_hits} videos en total para '{website_name}'.")
 
-        video_ids_on_page = [item.get("_id") for item in initial_data.get("content_elements", []) if item.get("_id")]
-        videos_for_this_site.extend([(video_id, website_name) for video_id in video_ids_on_page])
-        from_offset += len(video_ids_on_page)
-
         with tqdm(total=total_hits, desc=f"Recuperando de '{website_name}'") as pbar:
-            pbar.update(len(video_ids_on_page))
-
-            while from_offset < total_hits:
-                page_data = fetch_video_page(session, from_offset, website_name)
-                video_ids_on_page = [item.get("_id") for item in page_data.get("content_elements", []) if item.get("_id")]
-
-                if not video_ids_on_page:
-                    break
-
-                videos_for_this_site.extend([(video_id, website_name) for video_id in video_ids_on_page])
-                pbar.update(len(video_ids_on_page))
-                from_offset += len(video_ids_on_page)
-                time.sleep(0.2)
+            ids = await fetch_remaining_pages(client, website_name, "type:video", initial_data, total_hits, on_page=pbar.update)
 
-    except requests.exceptions.RequestException:
+    except aiohttp.ClientError:
         print(f"\nLa auditoría falló para el sitio '{website_name}'. Continuando con el siguiente.")
-        return []
+        return IdTable()
 
-    return videos_for_this_site
+    return ids_to_table(ids, website_name)
 
 def save_ids_to_file(all_videos_data, filename):
     """
@@ -203,34 +260,52 @@ def save_ids_to_file(all_videos_data, filename):
         with open(filename, "w", newline="", encoding="utf-8") as csvfile:
             writer = csv.writer(csvfile)
             writer.writerow(["arc_id", "website_name"])
-            for video_data in all_videos_data:
-                writer.writerow(video_data)
+            writer.writerows(all_videos_data.rows("id", "site"))
         print(f"\n¡Éxito! Se guardaron {len(all_videos_data)} IDs de video en el archivo '{filename}'.")
     except IOError as e:
         print(f"Error al escribir en el archivo '{filename}': {e}")
 
+
+async def audit_sites(sites_to_process):
+    """Audita todos los sitios en paralelo bajo un único limitador. Conserva el orden de los sitios."""
+    async with AsyncArcClient(pool_size=MAX_CONNECTIONS) as client:
+        per_site = await asyncio.gather(*(get_videos_for_site(client, site) for site in sites_to_process))
+    # Las páginas por offset pueden repetir IDs si el índice cambia durante la corrida
+    for site, videos in zip(sites_to_process, per_site):
+        removed = videos.dedupe()
+        if removed:
+            print(f"'{site}': se descartaron {removed} IDs de video repetidos.")
+        metrics.add_items("videos", site, n=len(videos))
+    # Volcar lo recuperado al índice local (ver content_index.py)
+    index = shared_index()
+    if index:
+        for videos in per_site:
+            index.upsert((vid, "video", site, None, None, None) for vid, site in videos.rows("id", "site"))
+    print(f"429 recibidos: {client.limiter.throttle_count} | velocidad final del limitador: {client.limiter.rate:.2f} req/s")
+    all_videos = IdTable()
+    for videos in per_site:
+        all_videos.extend(videos)
+    return all_videos
+
+
 if __name__ == "__main__":
     if not (ARC_ACCESS_TOKEN and ORG_ID and WEBSITE_NAMES_STR):
         print("Error: Asegúrate de que las variables ARC_ACCESS_TOKEN, ORG_ID y WEBSITE_NAMES estén configuradas en tu archivo.env.")
         sys.exit(1)
     else:
         sites_to_process = [s.strip() for s in WEBSITE_NAMES_STR.split(",") if s.strip()] if WEBSITE_NAMES_STR else []
-        all_videos_data = []
 
         print(f"Se procesarán {len(sites_to_process)} sitios.")
 
-        with requests.Session() as session:
-            session.headers.update({
-                "Authorization": f"Bearer {ARC_ACCESS_TOKEN}",
-                "Content-Type": "application/json"
-            })
-            
-            for site in sites_to_process:
-                videos_from_site = get_videos_for_site(session, site)
-                if videos_from_site:
-                    all_videos_data.extend(videos_from_site)
+        # Fix crítico para Windows: evita errores "Event loop is closed"
+        if sys.platform == 'win32':
+            asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+        start_metrics_server()
+        all_videos_data = asyncio.run(audit_sites(sites_to_process))
 
         if all_videos_data:
             save_ids_to_file(all_videos_data, OUTPUT_FILENAME)
         else:
-            print("\nNo se encontraron videos en ninguno de los sitios especificados.")
\ No newline at end of file
+            print("\nNo se encontraron videos en ninguno de los sitios especificados.")
+        finish_run()
@@ -0,0 +1,260 @@
+"""
+Benchmark de throughput de los scripts contra mock_arc_server.py (nunca contra producción).
+
+Para cada escenario levanta el mock en un subproceso, corre la carga en otro subproceso
+(así el pico de RSS es sólo el del script medido) y reporta:
+
+- req/s sostenidos: peticiones que recibió el servidor / tiempo total.
+- ops/s: operaciones lógicas (llamadas a `request()` del cliente, con sus reintentos adentro).
+- p50 / p99: latencia por operación lógica vista por el cliente, incluidos esperas y reintentos.
+- overhead de reintentos: peticiones de más por operación ((servidor - lógicas) / lógicas).
+- 429 / 5xx recibidos y pico de RSS del proceso de la carga.
+
+Cargas: `delete` (pipeline_notas.py), `videos` (auditoria_videos.py), `notas`
+(auditoria_notas.py, jobs por año). Escenarios: `clean`, `latency`, `throttle`, `storm`.
+
+Uso:
+  python bench_arc.py                                  # todas las cargas, escenario clean
+  python bench_arc.py --workloads delete --scenarios clean,throttle --rate 200 --out bench.json
+  python bench_arc.py --baseline bench.json            # compara contra una corrida anterior
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+WORKLOADS = ("delete", "videos", "notas")
+# Argumentos de mock_arc_server.py para cada escenario
+SCENARIOS = {
+    "clean": [],
+    "latency": ["--latency", "lognormal:25:0.6", "--delete-latency", "lognormal:60:0.8"],
+    "throttle": ["--latency", "uniform:5:20", "--rate-limit", "150", "--throttle-bursts", "15:0.5", "--retry-after", "1"],
+    "storm": ["--latency", "uniform:5:20", "--error-storms", "5:0.5:503", "--error-rate", "0.01"],
+}
+SITE = "bench"
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _http(url, method="GET"):
+    req = urllib.request.Request(url, method=method, data=b"" if method == "POST" else None)
+    with urllib.request.urlopen(req, timeout=30) as response:
+        return json.loads(response.read())
+
+
+@contextlib.contextmanager
+def mock_server(args):
+    """Levanta mock_arc_server.py en un subproceso y espera a que responda."""
+    port = _free_port()
+    proc = subprocess.Popen([sys.executable, os.path.join(HERE, "mock_arc_server.py"), "--port", str(port), *args],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + 120
+        while True:
+            try:
+                _http(f"{base}/__mock/stats")
+                break
+            except OSError:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"El mock terminó al arrancar: {proc.stderr.read().decode()[-2000:]}")
+                if time.time() > deadline:
+                    raise RuntimeError("El mock no respondió a tiempo")
+                time.sleep(0.2)
+        yield base
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+# --- Lado de la carga (subproceso) ---
+
+def _percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def _instrument(latencies):
+    """Mide cada `request()` de ArcClient y AsyncArcClient (una operación lógica, con reintentos)."""
+    import arc_client
+
+    sync_request = arc_client.ArcClient.request
+    async_request = arc_client.AsyncArcClient.request
+
+    def timed_sync(self, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return sync_request(self, *args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - t0)
+
+    async def timed_async(self, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return await async_request(self, *args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - t0)
+
+    arc_client.ArcClient.request = timed_sync
+    arc_client.AsyncArcClient.request = timed_async
+
+
+def run_workload(name, base, workdir, size, concurrency):
+    """Corre una carga en este proceso (con la config ya en el entorno) y devuelve sus métricas crudas."""
+    latencies = []
+    _instrument(latencies)
+    quiet = io.StringIO()
+    t0 = time.perf_counter()
+    if name == "delete":
+        import pipeline_notas
+        ids = _http(f"{base}/__mock/ids?type=story&site={SITE}&limit={size}")["ids"]
+        ids_file = os.path.join(workdir, "ids.txt")
+        with open(ids_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(ids) + "\n")
+        sys.argv = ["pipeline_notas.py", "--ids-file", ids_file, "--journal", os.path.join(workdir, "journal.log"),
+                    "--concurrency", str(concurrency)]
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(quiet):
+            asyncio.run(pipeline_notas.main())
+        ops = len(ids)
+    elif name == "videos":
+        import auditoria_videos
+        with contextlib.redirect_stdout(quiet), contextlib.redirect_stderr(quiet):
+            videos = asyncio.run(auditoria_videos.audit_sites([SITE]))
+        ops = len(videos)
+    elif name == "notas":
+        import auditoria_notas
+        from arc_client import ArcClient
+        auditoria_notas.REPORTS_DIR = os.path.join(workdir, "reports")
+        os.makedirs(os.path.join(auditoria_notas.REPORTS_DIR, SITE), exist_ok=True)
+        with contextlib.redirect_stdout(quiet), contextlib.redirect_stderr(quiet), ArcClient(verbose=False) as session:
+            auditoria_notas.run_audit_jobs(session, [SITE], [str(y) for y in range(2016, 2024)])
+        ops = sum(max(0, sum(1 for _ in open(os.path.join(auditoria_notas.REPORTS_DIR, SITE, fn), encoding="utf-8")) - 1)
+                  for fn in os.listdir(os.path.join(auditoria_notas.REPORTS_DIR, SITE)) if fn.endswith(".csv"))
+    else:
+        raise ValueError(f"Carga desconocida: {name}")
+    elapsed = time.perf_counter() - t0
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+    return {
+        "items": ops,
+        "elapsed_s": elapsed,
+        "logical_requests": len(latencies),
+        "p50_ms": (_percentile(latencies, 50) or 0) * 1000,
+        "p99_ms": (_percentile(latencies, 99) or 0) * 1000,
+        "peak_rss_mb": rss_mb,
+    }
+
+
+# --- Orquestación ---
+
+def bench(workload, scenario, args):
+    with mock_server(["--sites", SITE, "--stories", str(args.stories), "--videos", str(args.videos),
+                      *SCENARIOS[scenario]]) as base, tempfile.TemporaryDirectory(prefix="arc_bench_") as workdir:
+        _http(f"{base}/__mock/reset", method="POST")
+        env = dict(os.environ, ARC_API_BASE_URL=base, ARC_ACCESS_TOKEN="bench", ORG_ID="bench",
+                   MAX_REQUESTS_PER_SECOND=str(args.rate), RATE_LIMIT_BURST=str(args.burst),
+                   COUNT_CACHE_PATH="", CONTENT_INDEX_PATH="", ARC_RATE_BUDGET_FILE="", ARC_QUOTA_BROKER="", PYTHONPATH=HERE)
+        cmd = [sys.executable, os.path.abspath(__file__), "--_run", workload, "--_base", base, "--_workdir", workdir,
+               "--delete-count", str(args.delete_count), "--concurrency", str(args.concurrency)]
+        proc = subprocess.run(cmd, env=env, cwd=workdir, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"La carga {workload} falló:\n{proc.stderr[-3000:]}")
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        counts = _http(f"{base}/__mock/stats")["counts"]
+    served = counts.get("requests", 0)
+    logical = result["logical_requests"] or 1
+    result.update({
+        "workload": workload,
+        "scenario": scenario,
+        "server_requests": served,
+        "req_per_s": served / result["elapsed_s"] if result["elapsed_s"] else 0,
+        "ops_per_s": result["logical_requests"] / result["elapsed_s"] if result["elapsed_s"] else 0,
+        "retry_overhead": (served - result["logical_requests"]) / logical,
+        "throttled_429": counts.get("429", 0),
+        "server_5xx": sum(n for status, n in counts.items() if status.startswith("5")),
+    })
+    return result
+
+
+def print_table(results, baseline=None):
+    base = {(r["workload"], r["scenario"]): r for r in baseline or []}
+    print(f"{'carga':8} {'escenario':9} {'ítems':>7} {'seg':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}"
+          f" {'reint.':>7} {'429':>6} {'5xx':>6} {'RSS MB':>7}")
+    for r in results:
+        print(f"{r['workload']:8} {r['scenario']:9} {r['items']:>7} {r['elapsed_s']:>7.1f} {r['req_per_s']:>8.1f}"
+              f" {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['retry_overhead']:>7.1%} {r['throttled_429']:>6}"
+              f" {r['server_5xx']:>6} {r['peak_rss_mb']:>7.1f}")
+        prev = base.get((r["workload"], r["scenario"]))
+        if prev:
+            def delta(key):
+                return f"{(r[key] - prev[key]) / prev[key]:+.0%}" if prev[key] else "n/a"
+            print(f"{'':18} vs baseline: req/s {delta('req_per_s')} | p50 {delta('p50_ms')} | p99 {delta('p99_ms')}"
+                  f" | RSS {delta('peak_rss_mb')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de los scripts de Arc contra mock_arc_server.py")
+    parser.add_argument("--workloads", default=",".join(WORKLOADS), help=f"Separadas por coma (default: {','.join(WORKLOADS)})")
+    parser.add_argument("--scenarios", default="clean", help=f"Separados por coma, de: {', '.join(SCENARIOS)}")
+    parser.add_argument("--rate", type=float, default=200, help="MAX_REQUESTS_PER_SECOND del cliente (default: 200)")
+    parser.add_argument("--burst", type=float, default=50, help="RATE_LIMIT_BURST del cliente (default: 50)")
+    parser.add_argument("--concurrency", type=int, default=20, help="Workers de pipeline_notas (default: 20)")
+    parser.add_argument("--delete-count", type=int, default=3000, help="IDs a borrar en la carga delete")
+    parser.add_argument("--stories", type=int, default=30000, help="Notas del sitio sintético")
+    parser.add_argument("--videos", type=int, default=15000, help="Videos del sitio sintético")
+    parser.add_argument("--out", help="Guardar los resultados en JSON")
+    parser.add_argument("--baseline", help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--_run", help=argparse.SUPPRESS)
+    parser.add_argument("--_base", help=argparse.SUPPRESS)
+    parser.add_argument("--_workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._run:
+        result = run_workload(args._run, args._base, args._workdir, args.delete_count, args.concurrency)
+        print(json.dumps(result))
+        return
+
+    workloads = [w.strip() for w in args.workloads.split(",") if w.strip()]
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    for name in workloads + scenarios:
+        if name not in WORKLOADS and name not in SCENARIOS:
+            parser.error(f"Carga o escenario desconocido: {name}")
+
+    results = []
+    for scenario in scenarios:
+        for workload in workloads:
+            print(f"-> {workload} / {scenario}...", flush=True)
+            results.append(bench(workload, scenario, args))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print()
+    print_table(results, baseline)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResultados guardados en '{args.out}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Índice local (SQLite) de contenido de Arc: stories, videos e imágenes con sitio, fechas y URL.
+
+Las auditorías lo van llenando con lo que ya recuperan, y `sync` lo mantiene al día pidiendo
+a la API sólo lo modificado desde la última marca de agua (last_updated_date). Así los
+listados de IDs, fechas o URLs se resuelven con una consulta local en lugar de recorrer el
+sitio entero por la API.
+
+Nota: la búsqueda de publicados no informa borrados; los IDs que se borran con
+pipeline_notas.py hay que quitarlos con `ContentIndex.remove`.
+
+Uso:
+  python content_index.py sync --sites nuevamujer,fayerwayer --types story,video
+  python content_index.py query --site fayerwayer --type video --before 2024-12-31T23:59:59Z --out borrar.csv
+  python content_index.py stats
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+import threading
+
+DEFAULT_INDEX_PATH = os.getenv("CONTENT_INDEX_PATH", "arc_content_index.sqlite")
+UPSERT_BATCH = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS content (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    site TEXT NOT NULL,
+    publish_date TEXT,
+    url TEXT,
+    last_updated TEXT
+);
+CREATE INDEX IF NOT EXISTS content_site_type_date ON content (site, type, publish_date);
+CREATE TABLE IF NOT EXISTS sync_state (
+    site TEXT NOT NULL,
+    type TEXT NOT NULL,
+    watermark TEXT NOT NULL,
+    PRIMARY KEY (site, type)
+);
+"""
+
+# Si llega un valor nulo no se pisa el que ya estaba guardado.
+_UPSERT = """
+INSERT INTO content (id, type, site, publish_date, url, last_updated) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(id) DO UPDATE SET
+    type = excluded.type,
+    site = excluded.site,
+    publish_date = COALESCE(excluded.publish_date, content.publish_date),
+    url = COALESCE(excluded.url, content.url),
+    last_updated = COALESCE(excluded.last_updated, content.last_updated)
+"""
+
+
+class ContentIndex:
+    """Índice de contenido. Seguro para usar desde varios threads."""
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+
+    def upsert(self, rows):
+        """Inserta/actualiza filas (id, type, site, publish_date, url, last_updated). Devuelve cuántas."""
+        total = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= UPSERT_BATCH:
+                total += self._write(batch)
+                batch = []
+        if batch:
+            total += self._write(batch)
+        return total
+
+    def _write(self, batch):
+        with self.lock:
+            self.conn.executemany(_UPSERT, batch)
+            self.conn.commit()
+        return len(batch)
+
+    def remove(self, ids):
+        with self.lock:
+            self.conn.executemany("DELETE FROM content WHERE id = ?", ((i,) for i in ids))
+            self.conn.commit()
+
+    def get(self, content_id):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT id, type, site, publish_date, url, last_updated FROM content WHERE id = ?", (content_id,)
+            ).fetchone()
+
+    def query(self, site=None, content_type=None, after=None, before=None):
+        """Filas (id, type, site, publish_date, url) filtradas; fechas ISO inclusivas."""
+        clauses, params = [], []
+        for column, op, value in (("site", "=", site), ("type", "=", content_type),
+                                  ("publish_date", ">=", after), ("publish_date", "<=", before)):
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self.lock:
+            return self.conn.execute(
+                f"SELECT id, type, site, publish_date, url FROM content {where} ORDER BY site, publish_date, id", params
+            ).fetchall()
+
+    def stats(self):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT site, type, COUNT(*), MIN(publish_date), MAX(publish_date) FROM content GROUP BY site, type ORDER BY site, type"
+            ).fetchall()
+
+    def get_watermark(self, site, content_type):
+        with self.lock:
+            row = self.conn.execute("SELECT watermark FROM sync_state WHERE site = ? AND type = ?", (site, content_type)).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, site, content_type, watermark):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?)", (site, content_type, watermark))
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_shared_indexes = {}
+_shared_lock = threading.Lock()
+
+
+def shared_index(path=DEFAULT_INDEX_PATH):
+    """Instancia compartida del índice en `path`; None si está deshabilitado (CONTENT_INDEX_PATH vacío)."""
+    if not path:
+        return None
+    with _shared_lock:
+        if path not in _shared_indexes:
+            _shared_indexes[path] = ContentIndex(path)
+        return _shared_indexes[path]
+
+
+def sync_site(client, index, scan_url, site, content_type, url_fn=None):
+    """
+    Trae del API sólo el contenido de `site`/`content_type` modificado desde la marca de agua
+    guardada (todo, la primera vez) y lo vuelca en el índice. Devuelve cuántos documentos trajo.
+    """
+    from arc_scan import SCAN_PAGE_SIZE, scan_pages
+
+    watermark = index.get_watermark(site, content_type)
+    q = f"type:{content_type}"
+    if watermark:
+        q += f" AND last_updated_date:[{watermark} TO *]"
+    params = {
+        "website": site,
+        "q": q,
+        "size": SCAN_PAGE_SIZE,
+        "_sourceInclude": "_id,type,publish_date,last_updated_date,canonical_url,website_url,display_url,url,websites",
+    }
+    newest = watermark
+    fetched = 0
+    for page in scan_pages(lambda p: client.get_json(scan_url, params=p, timeout=60), params):
+        rows = []
+        for ans in page:
+            if not ans.get("_id"):
+                continue
+            updated = ans.get("last_updated_date")
+            if updated and (newest is None or updated > newest):
+                newest = updated
+            url = url_fn(ans) if url_fn else (ans.get("canonical_url") or ans.get("website_url"))
+            rows.append((ans["_id"], ans.get("type") or content_type, site, ans.get("publish_date"), url, updated))
+        fetched += index.upsert(rows)
+    if newest and newest != watermark:
+        index.set_watermark(site, content_type, newest)
+    return fetched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Índice local de contenido de Arc XP")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help=f"Archivo SQLite del índice (default: {DEFAULT_INDEX_PATH})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_sync = sub.add_parser("sync", help="Sincronización incremental desde la Content API")
+    p_sync.add_argument("--sites", default=os.getenv("WEBSITE_NAMES"), help="Sitios separados por coma (default: WEBSITE_NAMES)")
+    p_sync.add_argument("--types", default="story,video", help="Tipos separados por coma (default: story,video)")
+
+    p_query = sub.add_parser("query", help="Listar contenido del índice")
+    p_query.add_argument("--site")
+    p_query.add_argument("--type", dest="content_type")
+    p_query.add_argument("--after", help="publish_date mínima (ISO)")
+    p_query.add_argument("--before", help="publish_date máxima (ISO)")
+    p_query.add_argument("--out", help="CSV de salida con columnas arc_id,website_name,type (listo para pipeline_notas.py)")
+
+    sub.add_parser("stats", help="Resumen por sitio y tipo")
+    args = parser.parse_args()
+
+    index = ContentIndex(args.index)
+
+    if args.command == "sync":
+        from dotenv import load_dotenv
+        load_dotenv()
+        from arc_client import ArcClient, content_api_base
+        from arc_scan import SCAN_PATH
+        from auditoria_notas import extract_story_url
+
+        sites = [s.strip() for s in (args.sites or "").split(",") if s.strip()]
+        if not sites:
+            print("Error: indicá --sites o WEBSITE_NAMES en el .env")
+            sys.exit(1)
+        scan_url = f"{content_api_base()}{SCAN_PATH}"
+        with ArcClient() as client:
+            for site in sites:
+                for content_type in [t.strip() for t in args.types.split(",") if t.strip()]:
+                    n = sync_site(client, index, scan_url, site, content_type, url_fn=extract_story_url)
+                    print(f"{site}/{content_type}: {n} documentos nuevos o modificados (marca de agua {index.get_watermark(site, content_type)})")
+
+    elif args.command == "query":
+        rows = index.query(args.site, args.content_type, args.after, args.before)
+        if args.out:
+            with open(args.out, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["arc_id", "website_name", "type"])
+                writer.writerows((r[0], r[2], r[1]) for r in rows)
+            print(f"Se guardaron {len(rows)} IDs en '{args.out}'.")
+        else:
+            writer = csv.writer(sys.stdout)
+            writer.writerow(["id", "type", "site", "publish_date", "url"])
+            writer.writerows(rows)
+
+    else:
+        for site, content_type, count, min_date, max_date in index.stats():
+            print(f"{site:20} {content_type:8} {count:>9}  {min_date or '-'} .. {max_date or '-'}")
+
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Cache persistente (SQLite) de counts de ventanas de fechas y de planes de particionado.
+
+Los counts de períodos cerrados (años anteriores al actual) casi nunca cambian, así que se
+guardan con un TTL largo; los del año en curso con uno corto. La clave es
+(sitio, tipo de contenido, inicio, fin) con fechas ISO.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from timestamps import dt_to_iso, parse_iso
+
+DEFAULT_CACHE_PATH = os.getenv("COUNT_CACHE_PATH", ".arc_count_cache.sqlite")
+# TTL en segundos: 30 días para períodos cerrados, 1 hora para el año en curso.
+CLOSED_PERIOD_TTL = int(os.getenv("COUNT_CACHE_CLOSED_TTL", str(30 * 24 * 3600)))
+CURRENT_PERIOD_TTL = int(os.getenv("COUNT_CACHE_CURRENT_TTL", "3600"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS counts (
+    site TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    start_iso TEXT NOT NULL,
+    end_iso TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (site, content_type, start_iso, end_iso)
+);
+CREATE TABLE IF NOT EXISTS plans (
+    site TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    start_iso TEXT NOT NULL,
+    end_iso TEXT NOT NULL,
+    max_window INTEGER NOT NULL,
+    plan_json TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (site, content_type, start_iso, end_iso, max_window)
+);
+"""
+
+
+def _iso(dt):
+    return dt_to_iso(dt) if isinstance(dt, datetime) else str(dt)
+
+
+def ttl_for_window(end_dt, now=None):
+    """TTL según si la ventana termina antes del año en curso (cerrada) o no."""
+    now = now or datetime.utcnow()
+    if isinstance(end_dt, str):
+        end_year = int(end_dt[:4])
+    else:
+        end_year = end_dt.year
+    return CLOSED_PERIOD_TTL if end_year < now.year else CURRENT_PERIOD_TTL
+
+
+class CountCache:
+    """Cache de counts y planes. Seguro para usar desde varios threads (un lock por conexión)."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(_SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def get_count(self, site, content_type, start_dt, end_dt):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT count, expires_at FROM counts WHERE site=? AND content_type=? AND start_iso=? AND end_iso=?",
+                (site, content_type, _iso(start_dt), _iso(end_dt)),
+            ).fetchone()
+        if row and row[1] > time.time():
+            self.hits += 1
+            return row[0]
+        self.misses += 1
+        return None
+
+    def put_count(self, site, content_type, start_dt, end_dt, count):
+        expires_at = time.time() + ttl_for_window(end_dt)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO counts VALUES (?, ?, ?, ?, ?, ?)",
+                (site, content_type, _iso(start_dt), _iso(end_dt), int(count), expires_at),
+            )
+            self.conn.commit()
+
+    def get_plan(self, site, content_type, start_dt, end_dt, max_window):
+        """Devuelve el plan [(s, e, count), ...] con datetimes, o None si no hay uno vigente."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT plan_json, expires_at FROM plans WHERE site=? AND content_type=? AND start_iso=? AND end_iso=? AND max_window=?",
+                (site, content_type, _iso(start_dt), _iso(end_dt), max_window),
+            ).fetchone()
+        if not row or row[1] <= time.time():
+            return None
+        return [(parse_iso(s), parse_iso(e), c) for s, e, c in json.loads(row[0])]
+
+    def put_plan(self, site, content_type, start_dt, end_dt, max_window, plan):
+        plan_json = json.dumps([(_iso(s), _iso(e), c) for s, e, c in plan])
+        expires_at = time.time() + ttl_for_window(end_dt)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO plans VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (site, content_type, _iso(start_dt), _iso(end_dt), max_window, plan_json, expires_at),
+            )
+            self.conn.commit()
+
+    def invalidate(self, site, content_type, start_dt, end_dt):
+        """
+        Olvida los counts de las ventanas dentro de [start_dt, end_dt] y los planes que se solapan
+        con ese rango. Para cuando la API muestra que un plan cacheado quedó viejo (una ventana
+        ya supera el límite): el próximo plan se arma con counts frescos.
+        """
+        start_iso, end_iso = _iso(start_dt), _iso(end_dt)
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM counts WHERE site=? AND content_type=? AND start_iso>=? AND end_iso<=?",
+                (site, content_type, start_iso, end_iso),
+            )
+            self.conn.execute(
+                "DELETE FROM plans WHERE site=? AND content_type=? AND start_iso<=? AND end_iso>=?",
+                (site, content_type, end_iso, start_iso),
+            )
+            self.conn.commit()
+
+    def cached_count_fn(self, site, content_type, count_fn):
+        """Envuelve un `count_fn(s, e)` bloqueante para consultar/guardar en el cache."""
+        def wrapped(s_dt, e_dt):
+            cached = self.get_count(site, content_type, s_dt, e_dt)
+            if cached is not None:
+                return cached
+            count = count_fn(s_dt, e_dt)
+            self.put_count(site, content_type, s_dt, e_dt, count)
+            return count
+        return wrapped
+
+    def cached_count_fn_async(self, site, content_type, count_fn):
+        """Igual que `cached_count_fn` para un `count_fn(s, e)` corrutina."""
+        async def wrapped(s_dt, e_dt):
+            cached = self.get_count(site, content_type, s_dt, e_dt)
+            if cached is not None:
+                return cached
+            count = await count_fn(s_dt, e_dt)
+            self.put_count(site, content_type, s_dt, e_dt, count)
+            return count
+        return wrapped
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_shared_caches = {}
+_shared_lock = threading.Lock()
+
+
+def shared_cache(path=DEFAULT_CACHE_PATH):
+    """
+    Devuelve la instancia compartida del cache en `path` (se abre la primera vez que se pide).
+    Devuelve None si el cache está deshabilitado (COUNT_CACHE_PATH vacío).
+    """
+    if not path:
+        return None
+    with _shared_lock:
+        if path not in _shared_caches:
+            _shared_caches[path] = CountCache(path)
+        return _shared_caches[path]
@@ -0,0 +1,478 @@
+"""
+Cola de trabajo durable (SQLite) para repartir un borrado grande entre varios procesos de
+pipeline_notas.py, en una o varias máquinas.
+
+La entrada se carga una vez (`pipeline_notas.py --queue cola.sqlite --enqueue --csv-dir ...`)
+en lotes de BATCH_SIZE IDs agrupados por shard (`familia:sitio`, p. ej. `video:fayerwayer`).
+Cada worker (`pipeline_notas.py --queue cola.sqlite`) toma lotes con un lease:
+
+- El lease vence a los `lease_seconds`; el worker lo renueva mientras trabaja y guarda
+  cada pocos segundos (PROGRESS_INTERVAL de pipeline_notas.py) cuántos IDs del lote ya
+  procesó, junto con los OK y los fallidos de esos IDs (los fallidos se acumulan en el lote
+  para `retry-failed`). Si el proceso muere, el lote vuelve a estar disponible al vencer el
+  lease y quien lo tome sigue desde el último avance guardado.
+- Cada lease lleva un token creciente: un worker que perdió su lease (quedó colgado más
+  que el lease) no puede renovarlo ni cerrarlo, y deja de procesar ese lote.
+- No hay garantía de un solo DELETE por ID: tras un corte se vuelven a mandar los IDs
+  procesados después del último avance guardado (unos segundos de trabajo, más los que
+  terminaron fuera de orden). El segundo DELETE da 404, que cuenta como borrado. Cada lease
+  dice cuántas veces se tomó el lote (`attempts`): en uno retomado, el 404 de un ID cuyo
+  tipo se dedujo del formato también se da por borrado (lo mandó el lease anterior).
+- Un worker prefiere los shards de --shards (o, sin preferencia, los que tienen menos
+  workers encima) y cuando se vacían toma lotes pendientes de los demás shards: los
+  workers ociosos ayudan con los shards lentos en vez de terminar.
+
+Entre máquinas no conviene compartir el archivo SQLite por red (los locks y el WAL no son
+confiables en NFS/SMB): en una máquina se corre `python delete_queue.py serve cola.sqlite`
+y los workers usan `--queue http://host:8790`. Por defecto sólo escucha en 127.0.0.1; para
+escuchar en otra interfaz hace falta DELETE_QUEUE_TOKEN, que los workers mandan en el header
+X-Queue-Token (la cola decide qué se borra: no puede quedar abierta en la red).
+
+Uso:
+  python pipeline_notas.py --queue cola.sqlite --enqueue --csv-dir reports_borrar
+  python pipeline_notas.py --queue cola.sqlite --shards video:fayerwayer      # en cada proceso
+  python delete_queue.py status cola.sqlite
+  python delete_queue.py serve cola.sqlite --port 8790
+  DELETE_QUEUE_TOKEN=... python delete_queue.py serve cola.sqlite --host 0.0.0.0
+  python delete_queue.py retry-failed cola.sqlite
+"""
+import argparse
+import hmac
+import ipaddress
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_QUEUE_PATH = os.getenv("DELETE_QUEUE_PATH", "borrado_cola.sqlite")
+DEFAULT_QUEUE_PORT = 8790
+DEFAULT_QUEUE_HOST = "127.0.0.1"
+TOKEN_HEADER = "X-Queue-Token"
+BATCH_SIZE = 500
+DEFAULT_LEASE_SECONDS = 120.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY,
+    shard TEXT NOT NULL,
+    items TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    token INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    ok INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    failed_items TEXT
+);
+CREATE INDEX IF NOT EXISTS batches_state_shard ON batches (state, shard, id);
+CREATE TABLE IF NOT EXISTS queued_ids (id TEXT PRIMARY KEY);
+"""
+
+# Un lote tomado: `items` son (id, site, tipo, deducido) y `progress` cuántos ya se procesaron
+Lease = namedtuple("Lease", "batch_id token shard items progress attempts")
+
+
+def queue_token():
+    return os.getenv("DELETE_QUEUE_TOKEN", "")
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _encode_items(items):
+    return "\n".join(f"{arc_id}\t{site or ''}\t{asset_type}\t{'1' if guessed else ''}"
+                     for arc_id, site, asset_type, guessed in items)
+
+
+def _decode_items(text):
+    items = []
+    for line in (text or "").split("\n"):
+        if line:
+            arc_id, site, asset_type, guessed = line.split("\t")
+            items.append((arc_id, site or None, asset_type, bool(guessed)))
+    return items
+
+
+class DeleteQueue:
+    """Cola en un archivo SQLite. Seguro entre threads y entre procesos de la misma máquina."""
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        # Autocommit: las transacciones se abren a mano con BEGIN IMMEDIATE (lock de escritura
+        # desde el principio, así dos workers no pueden tomar el mismo lote)
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def _transaction(self, fn, *args):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(*args)
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            return result
+
+    # --- Carga ---
+
+    def enqueue(self, items, shard_of, batch_size=BATCH_SIZE, stats=None):
+        """
+        Agrega (id, site, tipo, deducido) en lotes por shard (`shard_of(item)`). Los IDs que ya estaban en
+        la cola (de esta carga o de una anterior) se omiten y se cuentan en stats['already_queued'].
+        Devuelve cuántos IDs se encolaron.
+        """
+        if stats is None:
+            stats = {}
+        stats.setdefault('already_queued', 0)
+        stats.setdefault('batches', 0)
+        pending = {}
+        total = 0
+
+        def flush(shard, batch):
+            self.conn.execute("INSERT INTO batches (shard, items, size) VALUES (?, ?, ?)",
+                              (shard, _encode_items(batch), len(batch)))
+            stats['batches'] += 1
+
+        def load():
+            nonlocal total
+            for n, item in enumerate(items, 1):
+                if not self.conn.execute("INSERT OR IGNORE INTO queued_ids VALUES (?)", (item[0],)).rowcount:
+                    stats['already_queued'] += 1
+                    continue
+                shard = shard_of(item)
+                batch = pending.setdefault(shard, [])
+                batch.append(item)
+                total += 1
+                if len(batch) >= batch_size:
+                    flush(shard, pending.pop(shard))
+                # Commit parcial cada tanto: los workers pueden empezar mientras se carga
+                if n % (batch_size * 20) == 0:
+                    self.conn.execute("COMMIT")
+                    self.conn.execute("BEGIN IMMEDIATE")
+            for shard, batch in pending.items():
+                flush(shard, batch)
+
+        self._transaction(load)
+        return total
+
+    # --- Leases ---
+
+    def _shard_load(self, now):
+        """{shard: (disponibles, leases activos)} de los shards con trabajo sin terminar."""
+        rows = self.conn.execute(
+            "SELECT shard, SUM(state = 'pending' OR lease_until < ?), SUM(state = 'leased' AND lease_until >= ?)"
+            " FROM batches WHERE state != 'done' GROUP BY shard", (now, now)).fetchall()
+        return {shard: (available or 0, active or 0) for shard, available, active in rows}
+
+    def lease(self, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS, shards=None):
+        """
+        Toma un lote (pendiente o con el lease vencido) o devuelve None si no hay ninguno
+        disponible. Prefiere los `shards` indicados y, dentro de ellos (o sin preferencia), el
+        shard con menos leases activos; si los preferidos no tienen lotes, roba de otro shard.
+        """
+        def take():
+            now = time.time()
+            load = {shard: counts for shard, counts in self._shard_load(now).items() if counts[0]}
+            if not load:
+                return None
+            preferred = [s for s in load if s in shards] if shards else list(load)
+            candidates = preferred or list(load)
+            shard = min(candidates, key=lambda s: (load[s][1], -load[s][0], s))
+            row = self.conn.execute(
+                "SELECT id, token, items, progress, attempts FROM batches WHERE shard = ?"
+                " AND (state = 'pending' OR (state = 'leased' AND lease_until < ?)) ORDER BY id LIMIT 1",
+                (shard, now)).fetchone()
+            batch_id, token, items, progress, attempts = row
+            self.conn.execute(
+                "UPDATE batches SET state = 'leased', owner = ?, token = ?, lease_until = ?, attempts = attempts + 1"
+                " WHERE id = ?", (worker_id, token + 1, now + lease_seconds, batch_id))
+            return Lease(batch_id, token + 1, shard, _decode_items(items), progress, attempts + 1)
+
+        return self._transaction(take)
+
+    def _save_progress(self, batch_id, token, start, progress, ok, failed_items):
+        """
+        Guarda el avance y suma los resultados de los IDs [start, progress) del lote, sólo si
+        el avance guardado es `start`: si no, esos resultados ya se guardaron (una respuesta
+        anterior se perdió) y no se suman dos veces. Devuelve el avance guardado, o None si el
+        lease ya no es de este worker. Se llama dentro de una transacción.
+        """
+        row = self.conn.execute("SELECT progress, failed_items FROM batches WHERE id = ? AND token = ? AND state = 'leased'",
+                                (batch_id, token)).fetchone()
+        if row is None:
+            return None
+        stored, text = row
+        if stored != start or progress <= start:
+            return stored
+        failed_items = list(failed_items)
+        text = "\n".join(filter(None, (text, _encode_items(failed_items)))) or None
+        self.conn.execute("UPDATE batches SET progress = ?, ok = ok + ?, failed = failed + ?, failed_items = ? WHERE id = ?",
+                          (progress, ok, len(failed_items), text, batch_id))
+        return progress
+
+    def heartbeat(self, batch_id, token, start, progress, ok=0, failed_items=(), lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Renueva el lease y guarda el avance con los resultados de [start, progress) (ver
+        `_save_progress`). Devuelve el avance guardado, o None si el lease ya no es de este worker.
+        """
+        def renew():
+            stored = self._save_progress(batch_id, token, start, progress, ok, failed_items)
+            if stored is not None:
+                self.conn.execute("UPDATE batches SET lease_until = ? WHERE id = ?", (time.time() + lease_seconds, batch_id))
+            return stored
+
+        return self._transaction(renew)
+
+    def complete(self, batch_id, token):
+        """
+        Cierra el lote. Los resultados se guardan antes con `heartbeat` hasta el final del lote:
+        sólo se cierra si el avance guardado lo cubre. False si el lease ya no es de este worker.
+        """
+        def close():
+            return self.conn.execute(
+                "UPDATE batches SET state = 'done', owner = NULL, lease_until = NULL"
+                " WHERE id = ? AND token = ? AND state = 'leased' AND progress >= size", (batch_id, token)).rowcount == 1
+
+        return self._transaction(close)
+
+    def release(self, batch_id, token, start, progress, ok=0, failed_items=()):
+        """
+        Devuelve un lote sin terminar a la cola (al cortar un worker), guardando el avance y los
+        resultados de [start, progress) como `heartbeat`. Devuelve el avance guardado o None.
+        """
+        def give_back():
+            stored = self._save_progress(batch_id, token, start, progress, ok, failed_items)
+            if stored is not None:
+                self.conn.execute("UPDATE batches SET state = 'pending', owner = NULL, lease_until = NULL WHERE id = ?",
+                                  (batch_id,))
+            return stored
+
+        return self._transaction(give_back)
+
+    # --- Estado ---
+
+    def remaining(self):
+        """Lotes sin terminar (pendientes o tomados)."""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM batches WHERE state != 'done'").fetchone()[0]
+
+    def status(self):
+        """Por shard: lotes pendientes, tomados y terminados, IDs totales, procesados, OK y fallidos."""
+        now = time.time()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT shard, SUM(state = 'pending' OR (state = 'leased' AND lease_until < ?)),"
+                " SUM(state = 'leased' AND lease_until >= ?), SUM(state = 'done'), SUM(size), SUM(progress),"
+                " SUM(ok), SUM(failed), COUNT(DISTINCT CASE WHEN state = 'leased' AND lease_until >= ? THEN owner END)"
+                " FROM batches GROUP BY shard ORDER BY shard", (now, now, now)).fetchall()
+        return [dict(zip(("shard", "pending", "leased", "done", "ids", "processed", "ok", "failed", "workers"),
+                         (row[0],) + tuple(v or 0 for v in row[1:]))) for row in rows]
+
+    def retry_failed(self, shard_of=None, batch_size=BATCH_SIZE):
+        """Vuelve a encolar, en lotes nuevos, los IDs que fallaron en lotes terminados."""
+        def requeue():
+            rows = self.conn.execute(
+                "SELECT id, shard, failed_items FROM batches WHERE state = 'done' AND failed > 0").fetchall()
+            total = 0
+            for batch_id, shard, text in rows:
+                items = _decode_items(text)
+                for start in range(0, len(items), batch_size):
+                    chunk = items[start:start + batch_size]
+                    self.conn.execute("INSERT INTO batches (shard, items, size) VALUES (?, ?, ?)",
+                                      (shard_of(chunk[0]) if shard_of else shard, _encode_items(chunk), len(chunk)))
+                self.conn.execute("UPDATE batches SET failed = 0, failed_items = NULL WHERE id = ?", (batch_id,))
+                total += len(items)
+            return total
+
+        return self._transaction(requeue)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+# --- Acceso remoto ---
+
+class RemoteQueue:
+    """Misma interfaz de leases que DeleteQueue, contra `delete_queue.py serve` por HTTP."""
+
+    def __init__(self, url, timeout=30, token=None):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.token = queue_token() if token is None else token
+
+    def _call(self, op, **params):
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers[TOKEN_HEADER] = self.token
+        req = urllib.request.Request(f"{self.url}/{op}", data=json.dumps(params).encode("utf-8"),
+                                     headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                return json.loads(response.read())["result"]
+        except urllib.error.HTTPError as e:
+            try:
+                detail = json.loads(e.read()).get("error")
+            except ValueError:
+                detail = None
+            raise ConnectionError(f"cola {self.url}/{op}: HTTP {e.code} {detail or e.reason}") from None
+
+    def lease(self, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS, shards=None):
+        result = self._call("lease", worker_id=worker_id, lease_seconds=lease_seconds, shards=shards)
+        if result is None:
+            return None
+        return Lease(result["batch_id"], result["token"], result["shard"],
+                     [tuple(item) for item in result["items"]], result["progress"], result["attempts"])
+
+    def heartbeat(self, batch_id, token, start, progress, ok=0, failed_items=(), lease_seconds=DEFAULT_LEASE_SECONDS):
+        return self._call("heartbeat", batch_id=batch_id, token=token, start=start, progress=progress, ok=ok,
+                          failed_items=list(failed_items), lease_seconds=lease_seconds)
+
+    def complete(self, batch_id, token):
+        return self._call("complete", batch_id=batch_id, token=token)
+
+    def release(self, batch_id, token, start, progress, ok=0, failed_items=()):
+        return self._call("release", batch_id=batch_id, token=token, start=start, progress=progress, ok=ok,
+                          failed_items=list(failed_items))
+
+    def remaining(self):
+        return self._call("remaining")
+
+    def status(self):
+        return self._call("status")
+
+    def close(self):
+        pass
+
+
+def open_queue(spec):
+    """`http://host:puerto` -> RemoteQueue; cualquier otra cosa es la ruta de un DeleteQueue."""
+    if spec.startswith(("http://", "https://")):
+        return RemoteQueue(spec)
+    return DeleteQueue(spec)
+
+
+def _is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def serve(queue, host=DEFAULT_QUEUE_HOST, port=DEFAULT_QUEUE_PORT, token=None):
+    """
+    Expone las operaciones de leases de `queue` por HTTP (POST /<operación> con JSON). Con
+    `token` (default: DELETE_QUEUE_TOKEN) cada pedido tiene que traerlo en TOKEN_HEADER; fuera
+    de loopback es obligatorio.
+    """
+    token = queue_token() if token is None else token
+    if not token and not _is_loopback(host):
+        raise ValueError(f"para escuchar en {host} hace falta DELETE_QUEUE_TOKEN")
+    ops = {
+        "lease": lambda p: (lambda lease: lease._asdict() if lease else None)(
+            queue.lease(p["worker_id"], p.get("lease_seconds", DEFAULT_LEASE_SECONDS), p.get("shards"))),
+        "heartbeat": lambda p: queue.heartbeat(p["batch_id"], p["token"], p["start"], p["progress"], p.get("ok", 0),
+                                               [tuple(i) for i in p.get("failed_items", ())],
+                                               p.get("lease_seconds", DEFAULT_LEASE_SECONDS)),
+        "complete": lambda p: queue.complete(p["batch_id"], p["token"]),
+        "release": lambda p: queue.release(p["batch_id"], p["token"], p["start"], p["progress"], p.get("ok", 0),
+                                           [tuple(i) for i in p.get("failed_items", ())]),
+        "remaining": lambda p: queue.remaining(),
+        "status": lambda p: queue.status(),
+    }
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if token and not hmac.compare_digest(self.headers.get(TOKEN_HEADER, ""), token):
+                self.send_error(401)
+                return
+            op = ops.get(self.path.strip("/"))
+            if op is None:
+                self.send_error(404)
+                return
+            try:
+                params = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                self._reply(200, {"result": op(params)})
+            except (KeyError, TypeError, ValueError) as e:
+                self._reply(400, {"error": f"{type(e).__name__}: {e}"})
+            except sqlite3.Error as e:
+                # p. ej. "database is locked": el worker lo ve como error y reintenta
+                self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"Cola '{getattr(queue, 'path', '')}' en http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def print_status(rows):
+    print(f"{'shard':32} {'pend.':>6} {'tomados':>7} {'listos':>6} {'IDs':>9} {'proces.':>9} {'OK':>9} {'fallidos':>8} {'workers':>7}")
+    for r in rows:
+        print(f"{r['shard']:32} {r['pending']:>6} {r['leased']:>7} {r['done']:>6} {r['ids']:>9} {r['processed']:>9}"
+              f" {r['ok']:>9} {r['failed']:>8} {r['workers']:>7}")
+    if rows:
+        ids = sum(r['ids'] for r in rows)
+        processed = sum(r['processed'] for r in rows)
+        print(f"Total: {processed}/{ids} IDs procesados ({processed / ids:.1%})" if ids else "Cola vacía.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cola durable de borrado compartida entre workers de pipeline_notas.py")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_status = sub.add_parser("status", help="Avance por shard")
+    p_status.add_argument("queue", nargs="?", default=DEFAULT_QUEUE_PATH, help="Archivo SQLite o URL de `serve`")
+    p_serve = sub.add_parser("serve", help="Servir la cola por HTTP para workers de otras máquinas")
+    p_serve.add_argument("queue", nargs="?", default=DEFAULT_QUEUE_PATH)
+    p_serve.add_argument("--host", default=DEFAULT_QUEUE_HOST,
+                         help=f"Interfaz (default: {DEFAULT_QUEUE_HOST}); fuera de loopback exige DELETE_QUEUE_TOKEN")
+    p_serve.add_argument("--port", type=int, default=DEFAULT_QUEUE_PORT)
+    p_retry = sub.add_parser("retry-failed", help="Volver a encolar los IDs que fallaron")
+    p_retry.add_argument("queue", nargs="?", default=DEFAULT_QUEUE_PATH)
+    args = parser.parse_args()
+
+    if args.command == "status":
+        queue = open_queue(args.queue)
+        print_status(queue.status())
+    elif args.command == "serve":
+        if not queue_token() and not _is_loopback(args.host):
+            parser.error(f"--host {args.host}: definí DELETE_QUEUE_TOKEN (los workers lo mandan en {TOKEN_HEADER})")
+        serve(DeleteQueue(args.queue), args.host, args.port)
+    elif args.command == "retry-failed":
+        queue = DeleteQueue(args.queue)
+        print(f"{queue.retry_failed()} IDs fallidos vueltos a encolar.")
+        queue.close()
+
+
+if __name__ == "__main__":
+    main()
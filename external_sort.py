@@ -0,0 +1,114 @@
+"""
+Ordenamiento externo para escribir reportes grandes ordenados sin tenerlos en memoria.
+
+Las filas se acumulan hasta RUN_ROWS; cada tanda se ordena y se vuelca a un archivo temporal
+(un "run"). Al final los runs se mezclan con un merge de k vías directamente hacia el CSV de
+salida. La memoria máxima depende del tamaño del run, no del total de filas.
+
+Las fechas se ordenan por su epoch en ms (`iso_sort_key`), el mismo orden que exige la
+columna de fechas de report_archive.py; la forma fija `...:SSZ` se convierte sin parsear.
+"""
+import csv
+import heapq
+import os
+import shutil
+import tempfile
+
+from timestamps import to_epoch_ms
+
+RUN_ROWS = int(os.getenv("REPORT_SORT_RUN_ROWS", "50000"))
+
+
+def iso_sort_key(value):
+    """
+    Clave de orden para una fecha ISO: su epoch en ms (ver timestamps.to_epoch_ms), así las que
+    traen milisegundos u offset quedan en su lugar en UTC. Las vacías o ilegibles (NO_DATE)
+    ordenan primero, igual que en la columna de fechas de un `.arcc`.
+    """
+    return to_epoch_ms(value)
+
+
+class ExternalSorter:
+    """
+    Ordena filas (tuplas de strings) por `key(row)`, volcando a disco cada `run_rows` filas.
+    El orden es estable. `sorted_rows()` se puede recorrer varias veces hasta `close()`.
+    Usar como `with ExternalSorter(key) as sorter:` para borrar los temporales al terminar.
+    """
+
+    def __init__(self, key, run_rows=RUN_ROWS, tmp_dir=None):
+        self.key = key
+        self.run_rows = run_rows
+        self.tmp_dir = tmp_dir
+        self._workdir = None
+        self._runs = []
+        self._buffer = []
+        self._count = 0
+
+    def add(self, row):
+        self._buffer.append(row)
+        self._count += 1
+        if len(self._buffer) >= self.run_rows:
+            self._spill()
+
+    def extend(self, rows):
+        for row in rows:
+            self.add(row)
+
+    def __len__(self):
+        return self._count
+
+    def _spill(self):
+        if self._workdir is None:
+            self._workdir = tempfile.mkdtemp(prefix="arc_sort_", dir=self.tmp_dir)
+        self._buffer.sort(key=self.key)
+        path = os.path.join(self._workdir, f"run_{len(self._runs):05d}.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(self._buffer)
+        self._runs.append(path)
+        self._buffer = []
+
+    @staticmethod
+    def _read_run(path):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.reader(f):
+                yield tuple(row)
+
+    def sorted_rows(self):
+        """Genera todas las filas ordenadas (merge de k vías entre los runs y lo que quedó en memoria)."""
+        self._buffer.sort(key=self.key)
+        if not self._runs:
+            return iter(self._buffer)
+        # Los runs van en orden de llegada y el buffer al final: heapq.merge desempata por
+        # posición, así que el resultado es estable.
+        sources = [self._read_run(path) for path in self._runs] + [iter(self._buffer)]
+        return heapq.merge(*sources, key=self.key)
+
+    def close(self):
+        if self._workdir:
+            shutil.rmtree(self._workdir, ignore_errors=True)
+            self._workdir = None
+        self._runs = []
+        self._buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_sorted_csv(path, header, rows):
+    """
+    Escribe `rows` en `path` de forma atómica (temporal + rename) y devuelve cuántas filas
+    escribió. Si el proceso se corta no queda un reporte a medias.
+    """
+    tmp = path + ".tmp"
+    written = 0
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            written += 1
+    os.replace(tmp, path)
+    return written
@@ -28,6 +28,7 @@ import os
 import sys
 from urllib.parse import urljoin
 from dotenv import load_dotenv
+from arc_client import ArcClient
 
 try:
     # preferred for nicer TLS/etc
@@ -65,9 +66,11 @@ def download_pages(base_url, token, endpoint='/pagebuilder/api/pages?limit=1000'
     headers = {'Authorization': f'Bearer {token}', 'Accept': 'application/json'}
     print(f'Downloading pages from: {url}')
     if requests:
-        r = requests.get(url, headers=headers)
-        r.raise_for_status()
-        return r.text
+        # shared client: retries on 429/5xx, Retry-After and the common rate limit
+        with ArcClient(token=token, headers={'Accept': 'application/json'}) as client:
+            r = client.get(url)
+            r.raise_for_status()
+            return r.text
     else:
         # fallback to urllib
         import urllib.request
@@ -0,0 +1,162 @@
+"""
+Listas de IDs de Arc: los cargadores de archivos que usan pipeline_notas.py y verify_sample.py
+(CSVs, también .csv.gz, directorios de CSVs y TXT con un ID por línea) y la búsqueda de IDs
+por lotes (`q=_id:("A" OR "B" ...)`) de la verificación y de la confirmación de borrados.
+
+No lee el entorno al importarse: la URL de la Content API se arma en cada búsqueda (ver
+arc_client.content_api_base), así los scripts la importan sin depender uno del otro.
+"""
+import csv
+import gzip
+import os
+
+from arc_client import content_api_base
+from photo_usage import REVIEW_ONLY_COLUMN
+
+# Columnas reconocidas por el cargador de IDs (en orden de preferencia).
+# auditoria_videos.py genera `arc_id,website_name`; auditoria_notas.py genera `story_id,...`.
+# photo_usage.py genera `photo_id,website_name,url` (imágenes huérfanas confirmadas); los
+# listados sólo para revisar traen además REVIEW_ONLY_COLUMN y no se cargan.
+DEFAULT_ID_COLUMNS = ["story_id", "arc_id", "_id", "id", "photo_id"]
+DEFAULT_SITE_COLUMNS = ["site", "website_name", "website"]
+# Columna con el tipo de cada fila (content_index.py genera `id,type,site,...`). Sin ella, el
+# nombre de la columna del ID da el tipo, después --asset-type y por último el formato del ID.
+DEFAULT_TYPE_COLUMNS = ["type", "asset_type", "content_type"]
+ID_COLUMN_TYPES = {"story_id": "story", "video_id": "video", "photo_id": "image", "image_id": "image",
+                   "gallery_id": "gallery"}
+
+# IDs por petición en las búsquedas por lotes: la URL queda en ~4 KB con 100 UUIDs
+BATCH_SIZE = 100
+
+
+# --- Carga de listas ---
+
+def open_text(path):
+    """Abre un archivo de texto, descomprimiendo al vuelo si termina en .gz."""
+    if path.lower().endswith('.gz'):
+        return gzip.open(path, 'rt', newline='', encoding='utf-8')
+    return open(path, newline='', encoding='utf-8')
+
+
+def pick_column(fieldnames, candidates):
+    """Devuelve el primer nombre de `candidates` presente en el header (sin distinguir mayúsculas)."""
+    by_lower = {name.strip().lower(): name for name in fieldnames if name}
+    for cand in candidates:
+        if cand.lower() in by_lower:
+            return by_lower[cand.lower()]
+    return None
+
+
+def iter_items_from_csv(csv_path, id_columns=DEFAULT_ID_COLUMNS, site_columns=DEFAULT_SITE_COLUMNS,
+                        type_columns=DEFAULT_TYPE_COLUMNS):
+    """
+    Genera tuplas (id, site, tipo) de un CSV (o .csv.gz) sin cargarlo completo en memoria.
+    Si la primera fila contiene una de `id_columns` se usa como header; si no, se toma
+    la primera columna como ID. El tipo sale de `type_columns` o del nombre de la columna del
+    ID (ver ID_COLUMN_TYPES), tal cual viene; None si no hay cómo saberlo. Un archivo con
+    REVIEW_ONLY_COLUMN en el header (huérfanas sin confirmar de photo_usage.py) se omite.
+    """
+    try:
+        with open_text(csv_path) as f:
+            reader = csv.reader(f)
+            first = next(reader, None)
+            if first is None:
+                return
+            if pick_column(first, [REVIEW_ONLY_COLUMN]):
+                print(f"⚠️ {csv_path} es un listado sólo para revisar ({REVIEW_ONLY_COLUMN}): no se borra nada de él.")
+                return
+            id_col = pick_column(first, id_columns)
+            if id_col is None:
+                # Sin header reconocible: primera columna = ID
+                if first and first[0].strip():
+                    yield first[0].strip(), None, None
+                for r in reader:
+                    if r and r[0].strip():
+                        yield r[0].strip(), None, None
+                return
+
+            id_idx = first.index(id_col)
+            site_col = pick_column(first, site_columns)
+            site_idx = first.index(site_col) if site_col else None
+            type_col = pick_column(first, type_columns) if type_columns else None
+            type_idx = first.index(type_col) if type_col else None
+            column_type = ID_COLUMN_TYPES.get(id_col.strip().lower())
+            for r in reader:
+                if len(r) <= id_idx:
+                    continue
+                sid = r[id_idx].strip()
+                if not sid:
+                    continue
+                site = r[site_idx].strip() or None if site_idx is not None and len(r) > site_idx else None
+                asset_type = r[type_idx].strip() or None if type_idx is not None and len(r) > type_idx else None
+                yield sid, site, asset_type or column_type
+    except (OSError, csv.Error, UnicodeDecodeError) as e:
+        print(f"Error leyendo {csv_path}: {e}")
+
+
+def iter_rows_from_csv(csv_path, id_columns=DEFAULT_ID_COLUMNS, site_columns=DEFAULT_SITE_COLUMNS):
+    """Genera tuplas (story_id, site) de un CSV (o .csv.gz); ver `iter_items_from_csv`."""
+    for sid, site, _ in iter_items_from_csv(csv_path, id_columns, site_columns, type_columns=None):
+        yield sid, site
+
+
+def find_input_files(csv_dir):
+    """Lista ordenada de CSVs (también .csv.gz) bajo un directorio."""
+    csv_files = []
+    for root, _, files in os.walk(csv_dir):
+        for fname in files:
+            if fname.lower().endswith(('.csv', '.csv.gz')):
+                csv_files.append(os.path.join(root, fname))
+    # Ordenar la lista completa de rutas para asegurar un orden predecible
+    csv_files.sort()
+    return csv_files
+
+
+def iter_ids_from_txt(path):
+    try:
+        with open_text(path) as f:
+            for line in f:
+                sid = line.strip()
+                if sid:
+                    yield sid, None
+    except FileNotFoundError:
+        print(f"No se encontró archivo de IDs: {path}")
+
+
+
+# --- Búsqueda por lotes ---
+
+def search_url():
+    return f"{content_api_base()}/content/v4/search/published"
+
+
+def id_query(ids):
+    """`_id:("A" OR "B")`: las comillas evitan que los guiones de los UUID se lean como operadores."""
+    return '_id:(' + ' OR '.join(f'"{i}"' for i in ids) + ')'
+
+
+def fetch_batch(session, website, ids, source_include=('_id',)):
+    """
+    Busca hasta BATCH_SIZE IDs de un sitio en una sola petición. Devuelve {id: documento} con
+    los que existen (publicados); los que faltan no están en el dict.
+    """
+    params = {
+        'website': website,
+        'q': id_query(ids),
+        'size': len(ids),
+        '_sourceInclude': ','.join(source_include),
+    }
+    data = session.get_json(search_url(), params=params)
+    return {el['_id']: el for el in data.get('content_elements', []) if el.get('_id')}
+
+
+async def fetch_batch_async(client, website, ids, source_include=('_id',)):
+    """Versión de `fetch_batch` para AsyncArcClient (la usa la confirmación de pipeline_notas.py)."""
+    params = {
+        'website': website,
+        'q': id_query(ids),
+        'size': len(ids),
+        '_sourceInclude': ','.join(source_include),
+    }
+    data = await client.get_json(search_url(), params=params, label=f"confirmación {website}")
+    return {el['_id']: el for el in data.get('content_elements', []) if el.get('_id')}
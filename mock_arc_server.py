@@ -0,0 +1,483 @@
+"""
+Servidor local que imita las APIs de Arc XP que usan los scripts, para probar y medir sin
+tocar producción:
+
+- Content API: `/content/v4/search/published` (con el límite de 10.000 resultados de
+  from + size) y `/content/v4/scan` (cursor `scrollId`).
+- Borrado por tipo: `DELETE /draft/v1/story/{id}` (Draft API), `/goldfish/video/v2/{id}`
+  (videos), `/photo/api/v2/photos/{id}` y `/photo/api/v2/galleries/{id}` (Photo Center): 200
+  si existe con ese tipo, 404 si no. Lo borrado sigue apareciendo en las búsquedas durante
+  `--index-lag` segundos, y con `--ghost-deletes` una fracción de los borrados responde 200
+  sin borrar nada.
+
+El contenido es sintético y determinístico (misma semilla = mismos IDs): notas con promo,
+cuerpo y galerías, videos, imágenes y galerías por sitio. La consulta `q` entiende lo que
+arman los scripts: `type:`, `_id:`, rangos `campo:[A TO B]`, AND, OR y paréntesis.
+
+Fallas configurables: latencia (fija, uniforme o lognormal), límite de velocidad del lado
+del servidor (una cuota por familia: content, draft, video, photo, y opcionalmente una
+para toda la organización), ráfagas periódicas de 429 con `Retry-After`, tormentas periódicas de 5xx y una
+tasa de errores al azar. `/__mock/stats` devuelve los contadores y `POST /__mock/reset` los
+reinicia; `/__mock/ids?type=story&limit=N` lista IDs para armar entradas de prueba.
+
+Uso:
+  python mock_arc_server.py --port 8770 --stories 30000 --latency lognormal:20:0.5 --throttle-bursts 30:2
+  ARC_API_BASE_URL=http://127.0.0.1:8770 python auditoria_videos.py
+"""
+import argparse
+import asyncio
+import random
+import re
+import time
+import uuid
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+
+from aiohttp import web
+
+MAX_RESULT_WINDOW = 10000
+SCROLL_CACHE = 1000
+QUERY_CACHE = 256
+_B32 = "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"
+_ISO = "%Y-%m-%dT%H:%M:%SZ"
+
+
+# --- Contenido sintético ---
+
+def _arc_id(rng):
+    return "".join(rng.choice(_B32) for _ in range(26))
+
+
+def _iso(start, seconds):
+    return (start + timedelta(seconds=seconds)).strftime(_ISO)
+
+
+def build_corpus(sites, stories=30000, videos=5000, images=2000, galleries=500, start_year=2016, end_year=2023, seed=1):
+    """
+    Documentos ANS sintéticos por sitio. Cada sitio recibe la cantidad indicada de cada tipo;
+    las notas referencian imágenes del sitio (promo, cuerpo y galerías) y dejan una parte
+    del inventario sin usar, como en un sitio real.
+    """
+    rng = random.Random(seed)
+    start = datetime(start_year, 1, 1)
+    span = int((datetime(end_year + 1, 1, 1) - start).total_seconds()) - 1
+    docs = []
+    for site in sites:
+        def base(doc_id, doc_type):
+            published = rng.randint(0, span)
+            return {
+                "_id": doc_id,
+                "type": doc_type,
+                "canonical_website": site,
+                "publish_date": _iso(start, published),
+                "last_updated_date": _iso(start, min(span, published + rng.randint(0, 86400 * 30))),
+            }
+
+        site_images = []
+        for _ in range(images):
+            doc = base(_arc_id(rng), "image")
+            doc["url"] = f"https://static.{site}.mock/photo/{doc['_id']}.jpg"
+            site_images.append(doc)
+        # Una cuarta parte de las imágenes no la usa ninguna nota (huérfanas)
+        used = [img["_id"] for img in site_images[: max(1, images * 3 // 4)]] or ["NONE"]
+        site_galleries = []
+        for _ in range(galleries):
+            doc = base(_arc_id(rng), "gallery")
+            doc["content_elements"] = [{"type": "image", "_id": rng.choice(used)} for _ in range(rng.randint(2, 6))]
+            site_galleries.append(doc)
+        gallery_ids = [g["_id"] for g in site_galleries] or [None]
+        for n in range(stories):
+            doc = base(_arc_id(rng), "story")
+            section = rng.choice(("actualidad", "deportes", "espectaculos", "tecnologia", "lifestyle"))
+            path = f"/{section}/{doc['publish_date'][:10].replace('-', '/')}/nota-{n}/"
+            doc["canonical_url"] = path
+            doc["websites"] = {site: {"website_url": path}}
+            doc["headlines"] = {"basic": f"Nota sintética {n}"}
+            doc["promo_items"] = {"basic": {"type": "image", "_id": rng.choice(used)}}
+            body = [{"type": "text", "content": "Lorem ipsum " * rng.randint(5, 40)}]
+            body += [{"type": "image", "_id": rng.choice(used)} for _ in range(rng.randint(0, 3))]
+            gallery = rng.choice(gallery_ids)
+            if gallery and rng.random() < 0.3:
+                body.append({"type": "gallery", "_id": gallery, "content_elements": [
+                    {"type": "image", "_id": rng.choice(used)} for _ in range(rng.randint(1, 4))]})
+            doc["content_elements"] = body
+            docs.append(doc)
+        for _ in range(videos):
+            doc = base(str(uuid.UUID(int=rng.getrandbits(128), version=4)), "video")
+            doc["headlines"] = {"basic": "Video sintético"}
+            docs.append(doc)
+        docs.extend(site_images)
+        docs.extend(site_galleries)
+    docs.sort(key=lambda d: d["publish_date"])
+    return docs
+
+
+# --- Consultas ---
+
+_TOKEN_RE = re.compile(r"\s*(\(|\)|AND\b|OR\b|[\w.]+:\[[^\]]*\]|[\w.]+:\([^)]*\)|[\w.]+:[^\s()]+)")
+
+
+def parse_query(q):
+    """Compila `q` a un predicado sobre documentos. Términos sin AND/OR explícito se unen con AND."""
+    tokens = []
+    pos = 0
+    q = (q or "").strip()
+    while pos < len(q):
+        m = _TOKEN_RE.match(q, pos)
+        if not m:
+            raise ValueError(f"No se pudo interpretar la consulta cerca de: {q[pos:pos + 30]!r}")
+        tokens.append(m.group(1))
+        pos = m.end()
+        while pos < len(q) and q[pos].isspace():
+            pos += 1
+
+    def parse_or(i):
+        left, i = parse_and(i)
+        preds = [left]
+        while i < len(tokens) and tokens[i] == "OR":
+            right, i = parse_and(i + 1)
+            preds.append(right)
+        return (preds[0] if len(preds) == 1 else lambda d: any(p(d) for p in preds)), i
+
+    def parse_and(i):
+        left, i = parse_term(i)
+        preds = [left]
+        while i < len(tokens) and tokens[i] not in ("OR", ")"):
+            if tokens[i] == "AND":
+                i += 1
+            right, i = parse_term(i)
+            preds.append(right)
+        return (preds[0] if len(preds) == 1 else lambda d: all(p(d) for p in preds)), i
+
+    def parse_term(i):
+        if i >= len(tokens):
+            raise ValueError("Consulta incompleta")
+        token = tokens[i]
+        if token == "(":
+            pred, i = parse_or(i + 1)
+            if i >= len(tokens) or tokens[i] != ")":
+                raise ValueError("Falta ')' en la consulta")
+            return pred, i + 1
+        field, value = token.split(":", 1)
+        if value.startswith("["):
+            lo, hi = (v.strip() for v in value[1:-1].split(" TO "))
+            lo = None if lo == "*" else lo
+            hi = None if hi == "*" else hi
+            return (lambda d: _in_range(_get(d, field), lo, hi)), i + 1
+        if value.startswith("("):
+            values = {v.strip().strip('"') for v in value[1:-1].split(" OR ") if v.strip()}
+            return (lambda d: _get(d, field) in values), i + 1
+        value = value.strip('"')
+        return (lambda d: _get(d, field) == value), i + 1
+
+    if not tokens:
+        return lambda d: True
+    pred, i = parse_or(0)
+    if i != len(tokens):
+        raise ValueError(f"Sobra texto en la consulta: {' '.join(tokens[i:])}")
+    return pred
+
+
+def _get(doc, field):
+    value = doc
+    for part in field.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _in_range(value, lo, hi):
+    # Las fechas del corpus tienen todas la forma fija: se comparan como texto
+    if value is None:
+        return False
+    return (lo is None or value >= lo) and (hi is None or value <= hi)
+
+
+def project(doc, include):
+    """Aplica `_sourceInclude` (rutas con puntos) a un documento."""
+    if not include:
+        return doc
+    tree = {}
+    for path in include.split(","):
+        node = tree
+        for part in path.strip().split("."):
+            if part:
+                node = node.setdefault(part, {})
+
+    def apply(value, node):
+        if not node:
+            return value
+        if isinstance(value, list):
+            return [apply(v, node) for v in value]
+        if isinstance(value, dict):
+            return {k: apply(value[k], sub) for k, sub in node.items() if k in value}
+        return value
+
+    return apply(doc, tree)
+
+
+# --- Fallas ---
+
+def parse_latency(spec):
+    """`20` (ms fijos), `uniform:5:50` o `lognormal:<mediana ms>:<sigma>` -> función que devuelve segundos."""
+    spec = (spec or "0").strip()
+    parts = spec.split(":")
+    if parts[0] == "uniform":
+        lo, hi = float(parts[1]), float(parts[2])
+        return lambda rng: rng.uniform(lo, hi) / 1000
+    if parts[0] == "lognormal":
+        median, sigma = float(parts[1]), float(parts[2])
+        return lambda rng: rng.lognormvariate(0, sigma) * median / 1000
+    fixed = float(parts[0]) / 1000
+    return lambda rng: fixed
+
+
+def _parse_window(spec, default_status=None):
+    """`cada:duración[:status]` en segundos -> (cada, duración, status) o None."""
+    if not spec:
+        return None
+    parts = spec.split(":")
+    return float(parts[0]), float(parts[1]), int(parts[2]) if len(parts) > 2 else default_status
+
+
+class FaultInjector:
+    def __init__(self, latency="0", delete_latency=None, rate_limit=0, throttle_bursts=None, retry_after=1,
+                 error_storms=None, error_rate=0.0, seed=1, org_rate_limit=0):
+        self.rng = random.Random(seed)
+        self.latency = parse_latency(latency)
+        self.delete_latency = parse_latency(delete_latency) if delete_latency else self.latency
+        self.rate_limit = rate_limit
+        self.org_rate_limit = org_rate_limit
+        self.buckets = {}  # familia (u "org") -> (tokens, último refill)
+        self.throttle_bursts = _parse_window(throttle_bursts)
+        self.retry_after = retry_after
+        self.error_storms = _parse_window(error_storms, 503)
+        self.error_rate = error_rate
+        self.started = time.monotonic()
+
+    def _in_window(self, window):
+        every, duration, _ = window
+        return every > 0 and (time.monotonic() - self.started) % every >= every - duration
+
+    def _take(self, key, limit):
+        now = time.monotonic()
+        tokens, last = self.buckets.get(key, (float(limit), now))
+        tokens = min(limit, tokens + (now - last) * limit)
+        if tokens < 1:
+            self.buckets[key] = (tokens, now)
+            return False
+        self.buckets[key] = (tokens - 1, now)
+        return True
+
+    def fault(self, family="content"):
+        """Devuelve (status, headers) si la petición debe fallar, o None. Cada familia tiene su cuota."""
+        if self.throttle_bursts and self._in_window(self.throttle_bursts):
+            return 429, {"Retry-After": str(self.retry_after)}
+        for key, limit in ((family, self.rate_limit), ("org", self.org_rate_limit)):
+            if limit and not self._take(key, limit):
+                return 429, {"Retry-After": str(self.retry_after)}
+        if self.error_storms and self._in_window(self.error_storms):
+            return self.error_storms[2], {}
+        if self.error_rate and self.rng.random() < self.error_rate:
+            return self.rng.choice((500, 502, 503)), {}
+        return None
+
+
+# --- Servidor ---
+
+class MockArc:
+    def __init__(self, docs, faults, index_lag=0.0, ghost_deletes=0.0):
+        self.faults = faults
+        self.docs = docs
+        self.by_id = {d["_id"]: d for d in docs}
+        self.index_lag = index_lag
+        self.ghost_deletes = ghost_deletes
+        self.deleted = {}  # id -> momento del borrado
+        self.stats = Counter()
+        self.by_route = Counter()
+        self.scrolls = OrderedDict()
+        self.queries = OrderedDict()
+
+    def _matches(self, website, q, sort):
+        key = (website, q, sort)
+        cached = self.queries.get(key)
+        if cached is not None:
+            self.queries.move_to_end(key)
+            return [d for d in cached if self._visible(d)]
+        pred = parse_query(q)
+        result = [d for d in self.docs if (not website or d["canonical_website"] == website) and pred(d)]
+        if sort:
+            field, _, order = sort.partition(":")
+            result.sort(key=lambda d: _get(d, field) or "", reverse=order == "desc")
+        self.queries[key] = result
+        if len(self.queries) > QUERY_CACHE:
+            self.queries.popitem(last=False)
+        return [d for d in result if self._visible(d)]
+
+    def _visible(self, doc):
+        deleted_at = self.deleted.get(doc["_id"])
+        return deleted_at is None or time.monotonic() - deleted_at < self.index_lag
+
+    async def _delay(self, latency):
+        seconds = latency(self.faults.rng)
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    def _count(self, route, status):
+        self.stats["requests"] += 1
+        self.stats[str(status)] += 1
+        self.by_route[f"{route} {status}"] += 1
+
+    def _fail(self, route, family="content"):
+        fault = self.faults.fault(family)
+        if fault is None:
+            return None
+        status, headers = fault
+        self._count(route, status)
+        return web.json_response({"error": f"mock {status}"}, status=status, headers=headers)
+
+    async def search(self, request):
+        await self._delay(self.faults.latency)
+        failed = self._fail("search")
+        if failed:
+            return failed
+        query = request.query
+        frm, size = int(query.get("from", 0)), int(query.get("size", 10))
+        if frm + size > MAX_RESULT_WINDOW:
+            self._count("search", 400)
+            return web.json_response({"error": f"Result window is too large, from + size must be less than or equal to: [{MAX_RESULT_WINDOW}]"}, status=400)
+        try:
+            docs = self._matches(query.get("website"), query.get("q", ""), query.get("sort"))
+        except ValueError as e:
+            self._count("search", 400)
+            return web.json_response({"error": str(e)}, status=400)
+        page = [project(d, query.get("_sourceInclude")) for d in docs[frm:frm + size]]
+        body = {"type": "results", "count": len(docs), "content_elements": page}
+        if frm + size < len(docs):
+            body["next"] = frm + size
+        self._count("search", 200)
+        return web.json_response(body)
+
+    async def scan(self, request):
+        await self._delay(self.faults.latency)
+        failed = self._fail("scan")
+        if failed:
+            return failed
+        query = request.query
+        size = int(query.get("size", 100))
+        scroll_id = query.get("scrollId")
+        if scroll_id:
+            state = self.scrolls.pop(scroll_id, None)
+            if state is None:
+                self._count("scan", 400)
+                return web.json_response({"error": "scrollId vencido o desconocido"}, status=400)
+            docs, pos = state
+        else:
+            try:
+                docs = self._matches(query.get("website"), query.get("q", ""), None)
+            except ValueError as e:
+                self._count("scan", 400)
+                return web.json_response({"error": str(e)}, status=400)
+            pos = 0
+        page = [project(d, query.get("_sourceInclude")) for d in docs[pos:pos + size]]
+        body = {"type": "results", "count": len(docs), "content_elements": page}
+        if pos + size < len(docs):
+            next_id = uuid.uuid4().hex
+            self.scrolls[next_id] = (docs, pos + size)
+            if len(self.scrolls) > SCROLL_CACHE:
+                self.scrolls.popitem(last=False)
+            body["next"] = next_id
+        self._count("scan", 200)
+        return web.json_response(body)
+
+    def _delete_handler(self, doc_type, family):
+        route = "delete" if doc_type == "story" else f"delete_{doc_type}"
+
+        async def handler(request):
+            await self._delay(self.faults.delete_latency)
+            failed = self._fail(route, family)
+            if failed:
+                return failed
+            doc_id = request.match_info["id"]
+            doc = self.by_id.get(doc_id)
+            if doc is None or doc["type"] != doc_type or doc_id in self.deleted:
+                self._count(route, 404)
+                return web.json_response({"error": "not found"}, status=404)
+            if not (self.ghost_deletes and self.faults.rng.random() < self.ghost_deletes):
+                self.deleted[doc_id] = time.monotonic()
+            self._count(route, 200)
+            return web.json_response({"id": doc_id})
+
+        return handler
+
+    async def get_stats(self, request):
+        return web.json_response({"counts": dict(self.stats), "by_route": dict(self.by_route), "deleted": len(self.deleted)})
+
+    async def reset(self, request):
+        self.stats.clear()
+        self.by_route.clear()
+        # Las ventanas de 429/5xx se cuentan desde el reset, así cada corrida ve las mismas
+        self.faults.started = time.monotonic()
+        if request.query.get("restore"):
+            self.deleted.clear()
+        return web.json_response({"ok": True})
+
+    async def list_ids(self, request):
+        doc_type = request.query.get("type", "story")
+        site = request.query.get("site")
+        limit = int(request.query.get("limit", 1000))
+        ids = [d["_id"] for d in self.docs
+               if d["type"] == doc_type and (not site or d["canonical_website"] == site) and d["_id"] not in self.deleted]
+        return web.json_response({"ids": ids[:limit]})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/content/v4/search/published", self.search)
+        app.router.add_get("/content/v4/scan", self.scan)
+        app.router.add_delete("/draft/v1/story/{id}", self._delete_handler("story", "draft"))
+        app.router.add_delete("/goldfish/video/v2/{id}", self._delete_handler("video", "video"))
+        app.router.add_delete("/photo/api/v2/photos/{id}", self._delete_handler("image", "photo"))
+        app.router.add_delete("/photo/api/v2/galleries/{id}", self._delete_handler("gallery", "photo"))
+        app.router.add_get("/__mock/stats", self.get_stats)
+        app.router.add_post("/__mock/reset", self.reset)
+        app.router.add_get("/__mock/ids", self.list_ids)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita la Content API y la Draft API de Arc XP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8770)
+    parser.add_argument("--sites", default="mock", help="Sitios separados por coma (default: mock)")
+    parser.add_argument("--stories", type=int, default=30000, help="Notas por sitio")
+    parser.add_argument("--videos", type=int, default=5000, help="Videos por sitio")
+    parser.add_argument("--images", type=int, default=2000, help="Imágenes por sitio")
+    parser.add_argument("--galleries", type=int, default=500, help="Galerías por sitio")
+    parser.add_argument("--years", default="2016-2023", help="Rango de publish_date (default: 2016-2023)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency", default="0", help="ms fijos, uniform:MIN:MAX o lognormal:MEDIANA:SIGMA")
+    parser.add_argument("--delete-latency", help="Latencia propia de los DELETE (default: la de --latency)")
+    parser.add_argument("--rate-limit", type=float, default=0, help="req/s que acepta cada familia de APIs antes de responder 429 (0 = sin límite)")
+    parser.add_argument("--org-rate-limit", type=float, default=0,
+                        help="req/s que acepta entre todas las familias antes de responder 429 (0 = sin límite)")
+    parser.add_argument("--throttle-bursts", help="CADA:DURACIÓN en segundos: ventanas periódicas en que todo es 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Valor de Retry-After en los 429 (segundos)")
+    parser.add_argument("--error-storms", help="CADA:DURACIÓN[:STATUS]: ventanas periódicas de 5xx (default 503)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de peticiones que fallan con 5xx al azar")
+    parser.add_argument("--index-lag", type=float, default=0.0, help="Segundos que lo borrado sigue visible en las búsquedas")
+    parser.add_argument("--ghost-deletes", type=float, default=0.0, help="Fracción de DELETE que responden 200 sin borrar")
+    args = parser.parse_args()
+
+    start_year, _, end_year = args.years.partition("-")
+    t0 = time.time()
+    docs = build_corpus([s.strip() for s in args.sites.split(",") if s.strip()], args.stories, args.videos, args.images,
+                        args.galleries, int(start_year), int(end_year or start_year), args.seed)
+    faults = FaultInjector(args.latency, args.delete_latency, args.rate_limit, args.throttle_bursts, args.retry_after,
+                           args.error_storms, args.error_rate, args.seed, args.org_rate_limit)
+    print(f"Mock Arc: {len(docs)} documentos generados en {time.time() - t0:.1f}s. Escuchando en http://{args.host}:{args.port}", flush=True)
+    web.run_app(MockArc(docs, faults, args.index_lag, args.ghost_deletes).app(), host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
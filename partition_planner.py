@@ -0,0 +1,167 @@
+"""
+Planificador de particiones por fecha para esquivar el límite de 10.000 resultados
+(from + size) de la Content API.
+
+En lugar de bisecar recursivamente un rango con un count bloqueante por ventana, el plan
+se arma por niveles: años -> meses -> días -> horas (y bisección sólo si una hora sigue
+excediendo el límite). Todos los counts de un mismo nivel se piden juntos, así que el
+caller puede resolverlos en paralelo (threads o asyncio). Al final los buckets contiguos
+se fusionan en ventanas de tamaño parecido, cada una por debajo de MAX_RESULT_WINDOW.
+
+El algoritmo (`_plan_steps`) no hace I/O: es un generador que emite listas de ventanas a
+contar y recibe sus counts. `plan_partitions` y `plan_partitions_async` lo conducen.
+Cuando ya se tienen las fechas de todo el rango (un año recién descargado),
+`plan_from_epochs` arma el mismo tipo de plan contándolas por hora, sin pedir counts.
+"""
+import asyncio
+import math
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from timestamps import bucket_counts, dt_to_iso, to_epoch_ms
+
+MAX_RESULT_WINDOW = 10000
+ONE_SECOND = timedelta(seconds=1)
+# Counts simultáneos al planificar con threads (el limitador de cada script manda igual).
+DEFAULT_PROBE_WORKERS = 8
+
+
+def _next_year(dt):
+    return datetime(dt.year + 1, 1, 1)
+
+
+def _next_month(dt):
+    if dt.month == 12:
+        return datetime(dt.year + 1, 1, 1)
+    return datetime(dt.year, dt.month + 1, 1)
+
+
+def _next_day(dt):
+    return datetime(dt.year, dt.month, dt.day) + timedelta(days=1)
+
+
+def _next_hour(dt):
+    return datetime(dt.year, dt.month, dt.day, dt.hour) + timedelta(hours=1)
+
+
+# Niveles de granularidad, de más grueso a más fino.
+LEVELS = (_next_year, _next_month, _next_day, _next_hour)
+
+
+def split_range(start_dt, end_dt, next_boundary):
+    """Parte [start_dt, end_dt] (inclusivo, resolución de 1 segundo) en buckets de calendario."""
+    buckets = []
+    s = start_dt
+    while s <= end_dt:
+        e = min(end_dt, next_boundary(s) - ONE_SECOND)
+        buckets.append((s, e))
+        s = e + ONE_SECOND
+    return buckets
+
+
+def bisect_range(start_dt, end_dt):
+    mid = start_dt + (end_dt - start_dt) / 2
+    mid = mid.replace(microsecond=0)
+    return [(start_dt, mid), (mid + ONE_SECOND, end_dt)]
+
+
+def balance_windows(buckets, max_window=MAX_RESULT_WINDOW):
+    """
+    Fusiona buckets contiguos [(s, e, count), ...] en ventanas de tamaño parecido.
+    Ninguna ventana supera `max_window` (salvo un bucket indivisible que ya lo superaba).
+    Los buckets vacíos se absorben en sus vecinos; las ventanas sin resultados se descartan.
+    """
+    total = sum(c for _, _, c in buckets)
+    if total == 0:
+        return []
+    # Cantidad mínima de ventanas posible y tamaño objetivo para repartir la carga pareja
+    target = math.ceil(total / math.ceil(total / max_window))
+
+    windows = []
+    cur_s, cur_e, cur_c = None, None, 0
+    for s, e, c in buckets:
+        if cur_s is not None and (cur_c + c > max_window or cur_c >= target):
+            windows.append((cur_s, cur_e, cur_c))
+            cur_s, cur_c = None, 0
+        if cur_s is None:
+            cur_s = s
+        cur_e = e
+        cur_c += c
+    if cur_s is not None:
+        windows.append((cur_s, cur_e, cur_c))
+    return [w for w in windows if w[2] > 0]
+
+
+def plan_from_epochs(start_dt, end_dt, epochs, max_window=MAX_RESULT_WINDOW):
+    """
+    Arma el plan [(s, e, count), ...] de [start_dt, end_dt] a partir de las fechas (epochs en
+    ms, ver timestamps.to_epoch_ms_array) de todos sus resultados, agrupadas por hora con
+    timestamps.bucket_counts. Las ventanas se estiran para cubrir el rango completo.
+    Devuelve None si alguna hora supera `max_window`: ahí hace falta bisecar con counts.
+    """
+    lo = to_epoch_ms(dt_to_iso(start_dt))
+    hi = to_epoch_ms(dt_to_iso(end_dt)) + 999
+    buckets = []
+    for key, count in bucket_counts((ms for ms in epochs if lo <= ms <= hi), "hour").items():
+        if count > max_window:
+            return None
+        s = datetime(int(key[0:4]), int(key[5:7]), int(key[8:10]), int(key[11:13]))
+        buckets.append((max(s, start_dt), min(_next_hour(s) - ONE_SECOND, end_dt), count))
+    windows = balance_windows(buckets, max_window)
+    plan = []
+    for i, (s, e, c) in enumerate(windows):
+        s = plan[-1][1] + ONE_SECOND if plan else start_dt
+        plan.append((s, end_dt if i == len(windows) - 1 else e, c))
+    return plan
+
+
+def _plan_steps(start_dt, end_dt, max_window):
+    """Generador sin I/O: emite listas de (s, e) a contar, recibe la lista de counts."""
+    pending = split_range(start_dt, end_dt, LEVELS[0])
+    level = 0
+    done = []
+    while pending:
+        counts = yield pending
+        oversized = []
+        for (s, e), c in zip(pending, counts):
+            if c > max_window and e > s:
+                oversized.append((s, e))
+            else:
+                done.append((s, e, c))
+        level += 1
+        pending = []
+        for s, e in oversized:
+            if level < len(LEVELS):
+                pending.extend(split_range(s, e, LEVELS[level]))
+            else:
+                pending.extend(bisect_range(s, e))
+    done.sort(key=lambda w: w[0])
+    return balance_windows(done, max_window)
+
+
+def plan_partitions(start_dt, end_dt, count_fn, max_window=MAX_RESULT_WINDOW, max_workers=DEFAULT_PROBE_WORKERS):
+    """
+    Arma el plan de ventanas [(s, e, count), ...] para [start_dt, end_dt].
+    `count_fn(s, e)` es una función bloqueante; los counts de cada nivel corren en un pool de threads.
+    """
+    steps = _plan_steps(start_dt, end_dt, max_window)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        try:
+            windows = next(steps)
+            while True:
+                counts = list(pool.map(lambda w: count_fn(*w), windows))
+                windows = steps.send(counts)
+        except StopIteration as stop:
+            return stop.value
+
+
+async def plan_partitions_async(start_dt, end_dt, count_fn, max_window=MAX_RESULT_WINDOW):
+    """Igual que `plan_partitions` pero `count_fn(s, e)` es una corrutina; cada nivel se cuenta con gather."""
+    steps = _plan_steps(start_dt, end_dt, max_window)
+    try:
+        windows = next(steps)
+        while True:
+            counts = await asyncio.gather(*(count_fn(s, e) for s, e in windows))
+            windows = steps.send(list(counts))
+    except StopIteration as stop:
+        return stop.value
@@ -0,0 +1,217 @@
+"""
+Índice inverso de uso de fotos (SQLite): qué notas, galerías y videos usan cada imagen y dónde
+(promos, cuerpo, galería), más el inventario de imágenes de cada sitio para detectar las huérfanas.
+
+Las notas se recorren una sola vez y cada página se vuelca al índice apenas llega, así que la
+memoria no depende del tamaño del sitio. Las huérfanas salen de un anti-join contra la clave
+primaria de `refs` (una búsqueda en el B-tree por imagen), sin cargar ningún set en memoria.
+Una imagen se considera usada si la referencia cualquier documento indexado, de cualquier sitio.
+
+Un sitio que no se indexó puede usar imágenes de otro, así que el listado de huérfanas es, por
+defecto, sólo para revisar: lleva la columna REVIEW_ONLY_COLUMN y pipeline_notas.py se niega a
+borrar desde un archivo que la tenga. `--confirm-orphans` (CONFIRM_ORPHANS=1 en
+auditoria_notas.py) declara que se indexaron todos los sitios y escribe el listado borrable.
+
+Uso:
+  python photo_usage.py orphans --site fayerwayer --out huerfanas_revision.csv
+  python photo_usage.py orphans --site fayerwayer --out huerfanas.csv --confirm-orphans
+  python photo_usage.py usage --photo ABCDEFGHIJKLMNOPQRSTUVWXYZ
+  python photo_usage.py stats
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+import threading
+
+DEFAULT_PHOTO_INDEX_PATH = os.getenv("PHOTO_INDEX_PATH", "arc_photo_usage.sqlite")
+INSERT_BATCH = 1000
+
+# Tablas WITHOUT ROWID: la clave primaria es la tabla misma, sin un índice aparte.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS refs (
+    photo_id TEXT NOT NULL,
+    story_id TEXT NOT NULL,
+    location TEXT NOT NULL,
+    site TEXT NOT NULL,
+    publish_date TEXT,
+    PRIMARY KEY (photo_id, story_id, location)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS refs_site ON refs (site);
+CREATE TABLE IF NOT EXISTS images (
+    photo_id TEXT PRIMARY KEY,
+    site TEXT NOT NULL,
+    url TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS images_site ON images (site);
+"""
+
+USAGE_COLUMNS = ["photo_id", "story_id", "website_name", "publish_date", "location"]
+ORPHAN_COLUMNS = ["photo_id", "website_name", "url"]
+# Marca de los listados sólo para revisar (ver id_lists.iter_items_from_csv)
+REVIEW_ONLY_COLUMN = "review_only"
+ORPHAN_REVIEW_COLUMNS = ORPHAN_COLUMNS + [REVIEW_ONLY_COLUMN]
+
+
+class PhotoUsageIndex:
+    """Índice de referencias a fotos. Seguro para usar desde varios threads."""
+
+    def __init__(self, path=DEFAULT_PHOTO_INDEX_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+
+    def _insert(self, sql, rows):
+        total = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= INSERT_BATCH:
+                total += self._write(sql, batch)
+                batch = []
+        if batch:
+            total += self._write(sql, batch)
+        return total
+
+    def _write(self, sql, batch):
+        with self.lock:
+            self.conn.executemany(sql, batch)
+            self.conn.commit()
+        return len(batch)
+
+    def reset_site(self, site):
+        """Borra referencias e inventario de `site` antes de volver a auditarlo."""
+        with self.lock:
+            self.conn.execute("DELETE FROM refs WHERE site = ?", (site,))
+            self.conn.execute("DELETE FROM images WHERE site = ?", (site,))
+            self.conn.commit()
+
+    def add_refs(self, site, photo_refs):
+        """Agrega referencias con la forma de `parse_ans_for_photos`. Las repetidas se ignoran."""
+        rows = ((r["photo_id"], r["story_id"], r["location"], site, r.get("publish_date"))
+                for r in photo_refs if r.get("photo_id") and r.get("story_id"))
+        return self._insert("INSERT OR IGNORE INTO refs VALUES (?, ?, ?, ?, ?)", rows)
+
+    def add_images(self, images):
+        """Agrega el inventario con la forma de `iter_site_images` (photo_id, url, website_name)."""
+        rows = ((i["photo_id"], i["website_name"], i.get("url")) for i in images if i.get("photo_id"))
+        return self._insert("INSERT OR REPLACE INTO images VALUES (?, ?, ?)", rows)
+
+    def usage(self, photo_id):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT photo_id, story_id, site, publish_date, location FROM refs WHERE photo_id = ? ORDER BY publish_date",
+                (photo_id,),
+            ).fetchall()
+
+    def _iter_query(self, sql, params=()):
+        # Cursor aparte: se recorre por partes sin materializar el resultado.
+        with self.lock:
+            cursor = self.conn.execute(sql, params)
+        while True:
+            with self.lock:
+                rows = cursor.fetchmany(INSERT_BATCH)
+            if not rows:
+                return
+            yield from rows
+
+    def iter_usage(self, site=None):
+        """Filas (photo_id, story_id, site, publish_date, location) ordenadas por foto."""
+        where, params = ("WHERE site = ?", (site,)) if site else ("", ())
+        return self._iter_query(
+            f"SELECT photo_id, story_id, site, publish_date, location FROM refs {where} ORDER BY photo_id, story_id", params
+        )
+
+    def iter_orphans(self, site=None):
+        """Filas (photo_id, site, url) de imágenes del inventario que ningún documento indexado referencia."""
+        where, params = ("AND i.site = ?", (site,)) if site else ("", ())
+        return self._iter_query(
+            "SELECT i.photo_id, i.site, i.url FROM images i "
+            f"WHERE NOT EXISTS (SELECT 1 FROM refs r WHERE r.photo_id = i.photo_id) {where} "
+            "ORDER BY i.photo_id",
+            params,
+        )
+
+    def stats(self):
+        """Por sitio: (site, referencias, fotos distintas referenciadas, imágenes en inventario)."""
+        with self.lock:
+            refs = {site: (n, d) for site, n, d in self.conn.execute(
+                "SELECT site, COUNT(*), COUNT(DISTINCT photo_id) FROM refs GROUP BY site")}
+            images = dict(self.conn.execute("SELECT site, COUNT(*) FROM images GROUP BY site"))
+        return [(site, *refs.get(site, (0, 0)), images.get(site, 0)) for site in sorted(set(refs) | set(images))]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def review_rows(rows):
+    """Agrega la marca de REVIEW_ONLY_COLUMN a cada fila de `iter_orphans`."""
+    for row in rows:
+        yield (*row, "1")
+
+
+def write_rows_csv(path, header, rows):
+    """Escribe `rows` (iterable) en un CSV sin materializarlas. Devuelve cuántas filas escribió."""
+    dirname = os.path.dirname(path)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    written = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            written += 1
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Índice de uso de fotos de Arc XP")
+    parser.add_argument("--index", default=DEFAULT_PHOTO_INDEX_PATH, help=f"Archivo SQLite del índice (default: {DEFAULT_PHOTO_INDEX_PATH})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_orphans = sub.add_parser("orphans", help="Imágenes del inventario sin ninguna nota que las use")
+    p_orphans.add_argument("--site")
+    p_orphans.add_argument("--out", help="CSV de salida (default: stdout)")
+    p_orphans.add_argument("--confirm-orphans", action="store_true",
+                           help="Se indexaron todos los sitios: escribir un listado que pipeline_notas.py puede borrar")
+
+    p_usage = sub.add_parser("usage", help="Notas que usan una foto")
+    p_usage.add_argument("--photo", required=True)
+
+    sub.add_parser("stats", help="Resumen por sitio")
+    args = parser.parse_args()
+
+    index = PhotoUsageIndex(args.index)
+
+    if args.command == "orphans":
+        columns, rows = ORPHAN_COLUMNS, index.iter_orphans(args.site)
+        if not args.confirm_orphans:
+            columns, rows = ORPHAN_REVIEW_COLUMNS, review_rows(rows)
+        if args.out:
+            n = write_rows_csv(args.out, columns, rows)
+            kind = "" if args.confirm_orphans else " (sólo para revisar)"
+            print(f"Se guardaron {n} imágenes huérfanas en '{args.out}'{kind}.")
+        else:
+            writer = csv.writer(sys.stdout)
+            writer.writerow(columns)
+            writer.writerows(rows)
+
+    elif args.command == "usage":
+        writer = csv.writer(sys.stdout)
+        writer.writerow(USAGE_COLUMNS)
+        writer.writerows(index.usage(args.photo))
+
+    else:
+        for site, n_refs, n_photos, n_images in index.stats():
+            print(f"{site:20} {n_refs:>9} referencias  {n_photos:>9} fotos usadas  {n_images:>9} imágenes")
+
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
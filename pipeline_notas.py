@@ -1,11 +1,21 @@
 import os
 import sys
 import csv
+import re
 import argparse
 import asyncio
+import contextlib
+import itertools
 import time
+from collections import deque
 import aiohttp
 from dotenv import load_dotenv
+from arc_client import AsyncArcClient, content_api_base
+from arc_metrics import METRICS_PORT, METRICS_SUMMARY_PATH, finish_run, metrics, start_metrics_server
+from arc_ids import IdSet
+from delete_queue import DEFAULT_LEASE_SECONDS, DeleteQueue, default_worker_id, open_queue
+from id_lists import (BATCH_SIZE, DEFAULT_ID_COLUMNS, DEFAULT_SITE_COLUMNS, fetch_batch_async, find_input_files,
+                      iter_ids_from_txt, iter_items_from_csv)
 
 # Cargar variables de entorno
 load_dotenv()
@@ -13,165 +23,665 @@ load_dotenv()
 # --- Configuración ---
 ARC_ACCESS_TOKEN = os.getenv("ARC_ACCESS_TOKEN")
 ORG_ID = os.getenv("ORG_ID")
-DRAFT_API_BASE_URL = f"https://api.{ORG_ID}.arcpublishing.com/draft/v1"
+API_BASE_URL = content_api_base(ORG_ID)
+
+# Ruteo del borrado por tipo de asset: tipo -> (familia de endpoints, path). Cada familia
+# tiene su propio cliente (limitador, cuota y pool de conexiones) y sus propios workers, así
+# un borrado mixto mantiene ocupadas todas las cuotas a la vez.
+DELETE_ROUTES = {
+    "story": ("draft", "/draft/v1/story/{id}"),
+    "video": ("video", "/goldfish/video/v2/{id}"),
+    "image": ("photo", "/photo/api/v2/photos/{id}"),
+    "gallery": ("photo", "/photo/api/v2/galleries/{id}"),
+}
+DELETE_FAMILIES = tuple(dict.fromkeys(family for family, _ in DELETE_ROUTES.values()))
+ASSET_TYPE_ALIASES = {"stories": "story", "videos": "video", "photo": "image", "photos": "image",
+                      "images": "image", "galleries": "gallery"}
 
 # CONFIGURACIÓN DE VELOCIDAD
-# Límite real: 900 req/min = 15 req/s.
-# Límite de 900 req/min.
-MAX_REQUESTS_PER_SECOND = 18.0
-
-# Validar credenciales
-if not (ARC_ACCESS_TOKEN and ORG_ID):
-    print("Error: Faltan variables de entorno (ARC_ACCESS_TOKEN, ORG_ID) en el archivo .env")
-    sys.exit(1)
-
-# --- Clase RateLimiter Asíncrono ---
-class AsyncRateLimiter:
-    """Controla que no se exceda el número de peticiones por segundo de forma precisa."""
-    def __init__(self, requests_per_second):
-        self.delay = 1.0 / requests_per_second
-        self.lock = asyncio.Lock()
-        self.last_request_time = 0
-
-    async def wait(self):
-        async with self.lock:
-            now = time.monotonic()
-            elapsed = now - self.last_request_time
-            wait_time = self.delay - elapsed
-            
-            if wait_time > 0:
-                await asyncio.sleep(wait_time)
-            
-            self.last_request_time = time.monotonic()
+# La velocidad (MAX_REQUESTS_PER_SECOND, RATE_LIMIT_BURST) se configura en arc_client.py,
+# también por familia (MAX_REQUESTS_PER_SECOND_VIDEO, ..._PHOTO, ..._DRAFT); cada limitador
+# la ajusta solo (AIMD) según los 429 que recibe.
+# Workers concurrentes por familia de endpoints.
+DEFAULT_CONCURRENCY = 20
+# IDs leídos por adelantado por familia: si una cuota va más lenta que otra, las demás
+# siguen recibiendo trabajo hasta que se llena su buffer (la memoria sigue acotada).
+FAMILY_BUFFER = 20000
+# Con --csv-dir se leen hasta MAX_OPEN_INPUTS archivos a la vez alternando bloques de
+# INTERLEAVE_ROWS filas, para que listas de tipos distintos lleguen juntas a sus familias.
+MAX_OPEN_INPUTS = 16
+INTERLEAVE_ROWS = 500
+
+# IDs de Arc: 26 caracteres base32 (stories, imágenes) o UUID (videos).
+UUID_RE = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+ARC_ID_RE = re.compile(r"^(?:[A-Z2-7]{26}|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})$")
+
+# Journal de checkpoint: se hace fsync cada N registros o cada T segundos (lo que ocurra primero).
+DEFAULT_JOURNAL_FILE = "borrado_journal.log"
+JOURNAL_FSYNC_EVERY = 200
+JOURNAL_FSYNC_INTERVAL = 2.0
+
+# Confirmación post-borrado: se espera CONFIRM_DELAY segundos (lag de indexación) y se
+# consultan los IDs borrados en lotes de hasta 100 en search/published. Un lote incompleto
+# sale igual si su ID más viejo ya esperó CONFIRM_MAX_WAIT segundos de más.
+DEFAULT_CONFIRM_DELAY = 30.0
+CONFIRM_MAX_WAIT = 5.0
+CONFIRM_TICK = 0.5
+DEFAULT_RETRY_FILE = "borrado_sobrevivientes.csv"
+
+# Modo cola (--queue, ver delete_queue.py): lotes tomados a la vez por proceso y cada cuánto
+# se vuelve a mirar la cola cuando no hay lotes libres pero otros workers todavía tienen.
+MAX_LEASED_BATCHES = 6
+QUEUE_POLL = 5.0
+# Si la cola no responde (corte de red, "database is locked"...) se reintenta con espera
+# creciente hasta QUEUE_MAX_BACKOFF segundos en lugar de cortar el worker.
+QUEUE_MAX_BACKOFF = 60.0
+# Cada cuánto se guarda en la cola el avance de los lotes (además de renovar el lease cada
+# lease/3): tras un corte sólo se repiten los IDs procesados en esos últimos segundos.
+PROGRESS_INTERVAL = 2.0
 
 # --- Funciones de Red ---
 
-async def delete_story_async(session, story_id, site, limiter):
+async def delete_asset_async(client, asset_id, site, asset_type="story", guessed=False, resent=False):
     """
-    Intenta borrar la nota manejando reintentos y 429s automáticamente.
+    Intenta borrar el asset por la API de su tipo (ver DELETE_ROUTES); `client` debe ser el
+    de la familia correspondiente. Los reintentos ante 429/5xx/errores de conexión y el
+    respeto de Retry-After los maneja el cliente común (arc_client).
+
+    Un 404 cuenta como éxito (ya no existe) salvo que el tipo se haya deducido del formato del
+    ID (`guessed`): ahí puede ser una imagen o galería mandada a la API de notas. Con `resent`
+    (el ID es de un lote retomado de la cola y puede haberlo borrado el lease anterior) el 404
+    cuenta como éxito aunque el tipo sea deducido.
     """
-    url = f"{DRAFT_API_BASE_URL}/story/{story_id}"
-    headers = {
-        "Authorization": f"Bearer {ARC_ACCESS_TOKEN}",
-        "Content-Type": "application/json",
-        "Arc-Priority": "ingestion"
-    }
+    url = API_BASE_URL + DELETE_ROUTES[asset_type][1].format(id=asset_id)
+    # Arc-Priority sólo lo entiende la Draft API
+    headers = {"Arc-Priority": "ingestion"} if asset_type == "story" else None
+
+    try:
+        response = await client.request("DELETE", url, headers=headers, label=asset_id)
+    except aiohttp.ClientError as e:
+        print(f"💀 [{asset_id}] Falló tras {client.max_retries} intentos: {e}")
+        return False
+
+    if response.status == 404 and guessed and resent:
+        print(f"✅ [{asset_id}] 404 como {asset_type} en un lote retomado: se da por borrado en el lease anterior.")
+        return True
 
-    retries = 0
-    max_retries = 5
-    backoff = 1.0
+    if response.status == 404 and guessed:
+        print(f"❌ [{asset_id}] 404 como {asset_type}, tipo deducido del formato del ID: puede ser de otro tipo."
+              " Indicá la columna type o --asset-type.")
+        return False
 
-    while retries < max_retries:
-        # Esperamos nuestro turno según el limitador
-        await limiter.wait()
+    # Caso Éxito o No Existe (404 se considera éxito al borrar)
+    if response.status in (200, 204, 404):
+        print(f"✅ [{asset_id}] Borrado {asset_type} ({site or 'N/A'}) status={response.status}")
+        return True
 
+    if response.status == 429 or response.status >= 500:
+        print(f"💀 [{asset_id}] Falló tras {client.max_retries} intentos (status={response.status}).")
+        return False
+
+    # Error desconocido cliente (400, 401, 403)
+    print(f"❌ [{asset_id}] Error cliente {response.status}. No se reintenta.")
+    return False
+
+# --- Journal de Checkpoint ---
+
+class DeleteJournal:
+    """
+    Journal append-only con el resultado de cada ID procesado por `delete_asset_async`.
+
+    Cada línea es `<estado>\t<story_id>\t<site>` con estado `OK`, `FAIL` o `ALIVE` (el borrado
+    respondió bien pero la confirmación la siguió encontrando publicada). Las escrituras se
+    agrupan y se hace fsync por lotes, así el costo por ID es mínimo y ante un corte sólo se
+    pierden (y se repiten) los últimos registros sin sincronizar.
+    """
+    def __init__(self, path, fsync_every=JOURNAL_FSYNC_EVERY, fsync_interval=JOURNAL_FSYNC_INTERVAL):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.pending = 0
+        self.last_sync = time.monotonic()
+        self.f = open(path, 'a', encoding='utf-8')
+        # Si el proceso anterior murió a mitad de línea, cerrarla para no pegarle el próximo registro
+        if self.f.tell() > 0:
+            with open(path, 'rb') as fb:
+                fb.seek(-1, os.SEEK_END)
+                if fb.read(1) != b'\n':
+                    self.f.write('\n')
+
+    def record(self, story_id, site, ok):
+        self.record_state('OK' if ok else 'FAIL', story_id, site)
+
+    def record_state(self, state, story_id, site):
+        self.f.write(f"{state}\t{story_id}\t{site or ''}\n")
+        self.pending += 1
+        if self.pending >= self.fsync_every or time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        if self.pending:
+            self.f.flush()
+            os.fsync(self.f.fileno())
+            self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if not self.f.closed:
+            self.sync()
+            self.f.close()
+
+    @staticmethod
+    def _iter_records(path):
         try:
-            async with session.delete(url, headers=headers) as response:
-                
-                # Caso Éxito o No Existe (404 se considera éxito al borrar)
-                if response.status == 204 or response.status == 200 or response.status == 404:
-                    # Leemos respuesta para liberar conexión
-                    await response.read() 
-                    print(f"✅ [{story_id}] Borrada ({site or 'N/A'}) status={response.status}")
-                    return True
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    # Una línea incompleta es una escritura cortada por el crash: se ignora
+                    parts = line.rstrip('\n').split('\t')
+                    if len(parts) == 3:
+                        yield parts
+        except FileNotFoundError:
+            pass
 
-                # Caso Rate Limit (429)
-                if response.status == 429:
-                    retry_after = response.headers.get("Retry-After")
-                    sleep_time = float(retry_after) if retry_after else backoff
-                    print(f"⚠️ [{story_id}] 429 Rate Limit. Esperando {sleep_time:.2f}s...")
-                    await asyncio.sleep(sleep_time)
-                    backoff *= 1.5 # Backoff exponencial
-                    retries += 1
-                    continue
+    @staticmethod
+    def load_completed(path):
+        """
+        Devuelve el set compacto de IDs borrados con éxito según el journal (vacío si no existe).
+        Un ID cuyo último registro es ALIVE no cuenta como borrado, así --resume lo reintenta.
+        """
+        # Los sobrevivientes son pocos: un set común alcanza para seguir su último estado
+        alive = set()
+        for state, story_id, _ in DeleteJournal._iter_records(path):
+            if state == 'ALIVE':
+                alive.add(story_id)
+            elif state == 'OK':
+                alive.discard(story_id)
+        completed = IdSet()
+        for state, story_id, _ in DeleteJournal._iter_records(path):
+            if state == 'OK' and story_id not in alive:
+                completed.add(story_id)
+        return completed
+
+# --- Confirmación post-borrado ---
+
+class DeleteConfirmer:
+    """
+    Confirma que lo borrado ya no aparece en search/published, en paralelo con los workers.
 
-                # Otros errores de servidor (5xx)
-                if response.status >= 500:
-                    print(f"🔥 [{story_id}] Error servidor {response.status}. Reintentando...")
+    Cada ID borrado espera `delay` segundos (lag de indexación) y después se consulta en
+    lotes de hasta BATCH_SIZE IDs por sitio con `_id:(... OR ...)`: una petición extra cada
+    100 borrados. Los que siguen publicados (o cuyo lote no se pudo consultar) van al archivo
+    de reintento `arc_id,site,type` y al journal como ALIVE. Los IDs sin sitio no se pueden
+    consultar (la búsqueda exige `website`) y sólo se cuentan.
+    """
+    def __init__(self, client, delay=DEFAULT_CONFIRM_DELAY, retry_path=DEFAULT_RETRY_FILE, journal=None):
+        self.client = client
+        self.delay = delay
+        self.retry_path = retry_path
+        self.journal = journal
+        self.queues = {}
+        self.closing = False
+        self.stats = {'queued': 0, 'confirmed': 0, 'survivors': 0, 'unchecked': 0, 'no_site': 0, 'requests': 0}
+        self.retry_f = None
+        self.retry = None
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+        return self
+
+    def add(self, story_id, site, asset_type="story"):
+        if not site:
+            self.stats['no_site'] += 1
+            return
+        self.queues.setdefault(site, deque()).append((time.monotonic(), story_id, asset_type))
+        self.stats['queued'] += 1
+
+    def _ready_batches(self):
+        now = time.monotonic()
+        for site, queue in self.queues.items():
+            while queue:
+                # Cuántos IDs de la cola ya cumplieron el lag (la cola está ordenada por tiempo)
+                ready = 0
+                for queued_at, _, _ in queue:
+                    if now - queued_at < self.delay or ready >= BATCH_SIZE:
+                        break
+                    ready += 1
+                if not ready:
+                    break
+                oldest_wait = now - queue[0][0] - self.delay
+                if ready < BATCH_SIZE and not self.closing and oldest_wait < CONFIRM_MAX_WAIT:
+                    break
+                yield site, [queue.popleft()[1:] for _ in range(ready)]
+
+    async def _check(self, site, items):
+        """`items` son (id, tipo) de un mismo sitio."""
+        self.stats['requests'] += 1
+        ids = [story_id for story_id, _ in items]
+        try:
+            found = await fetch_batch_async(self.client, site, ids)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            print(f"⚠️ No se pudo confirmar un lote de {len(ids)} IDs de '{site}': {e}")
+            self.stats['unchecked'] += len(ids)
+            self._write_retry(site, items)
+            return
+        survivors = [item for item in items if item[0] in found]
+        self.stats['confirmed'] += len(ids) - len(survivors)
+        self.stats['survivors'] += len(survivors)
+        metrics.add_items('confirm', site, 'confirmed', len(ids) - len(survivors))
+        if survivors:
+            metrics.add_items('confirm', site, 'survivor', len(survivors))
+            print(f"⚠️ {len(survivors)} IDs de '{site}' siguen publicados tras el borrado.")
+            self._write_retry(site, survivors)
+            if self.journal:
+                for story_id, _ in survivors:
+                    self.journal.record_state('ALIVE', story_id, site)
+
+    def _write_retry(self, site, items):
+        if self.retry is None:
+            new_file = not os.path.exists(self.retry_path)
+            self.retry_f = open(self.retry_path, 'a', newline='', encoding='utf-8')
+            self.retry = csv.writer(self.retry_f)
+            if new_file:
+                self.retry.writerow(['arc_id', 'site', 'type'])
+        self.retry.writerows((story_id, site, asset_type) for story_id, asset_type in items)
+        self.retry_f.flush()
+
+    def _pending(self):
+        return any(self.queues.values())
+
+    async def _run(self):
+        while True:
+            for site, ids in list(self._ready_batches()):
+                await self._check(site, ids)
+            if self.closing and not self._pending():
+                return
+            await asyncio.sleep(CONFIRM_TICK)
+
+    async def close(self):
+        """Espera a que se confirme lo que queda (cumpliendo el lag) y cierra el archivo de reintento."""
+        self.closing = True
+        if self._pending():
+            remaining = max(0.0, self.delay - (time.monotonic() - max(q[-1][0] for q in self.queues.values() if q)))
+            print(f"⏳ Confirmando los últimos borrados (hasta {remaining:.0f}s de espera por el lag de indexación)...")
+        if self.task:
+            await self.task
+        if self.retry_f:
+            self.retry_f.close()
+
+# --- Cola compartida entre procesos ---
+
+class QueueFeeder:
+    """
+    Alimenta las colas de las familias con lotes tomados de una cola durable (DeleteQueue o
+    RemoteQueue): renueva sus leases mientras se procesan, guarda el avance y los cierra
+    cuando terminan todos sus IDs.
+
+    El avance de un lote es el prefijo de IDs ya procesados (los workers terminan fuera de
+    orden) y se guarda cada PROGRESS_INTERVAL segundos junto con los OK y los fallidos de ese
+    prefijo, así quien retome el lote tras un corte sigue desde ahí sin perder los fallidos
+    (van a `retry-failed`). Lo que se procesó después del último guardado (y lo terminado
+    fuera de orden más allá del prefijo) se vuelve a mandar: no hay garantía de un solo
+    DELETE por ID.
+    Si un lease se pierde (otro worker tomó el lote porque éste no lo renovó a tiempo) los IDs
+    que quedan de ese lote se descartan acá en lugar de borrarse dos veces. Los IDs de un lote
+    retomado (`resent`) pueden haberse mandado ya: su 404 no es un fallo (ver delete_asset_async).
+    """
+    def __init__(self, queue, worker_id=None, lease_seconds=DEFAULT_LEASE_SECONDS, shards=None,
+                 max_batches=MAX_LEASED_BATCHES):
+        self.queue = queue
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.shards = shards
+        self.max_batches = max_batches
+        self.batches = {}   # batch_id -> estado del lote
+        self.owner = {}     # id -> (batch_id, posición en el lote)
+        self.room = asyncio.Event()
+        self.stats = {'batches': 0, 'stolen': 0, 'lost': 0, 'skipped': 0}
+        self.heartbeat_task = None
+
+    async def produce(self, queues, num_workers):
+        """Productor del modo cola: reemplaza a `produce_ids`."""
+        self.heartbeat_task = asyncio.create_task(self._heartbeat())
+        waiting = False
+        backoff = QUEUE_POLL
+        try:
+            while True:
+                if len(self.batches) >= self.max_batches:
+                    self.room.clear()
+                    await self.room.wait()
+                    continue
+                try:
+                    lease = await asyncio.to_thread(self.queue.lease, self.worker_id, self.lease_seconds, self.shards)
+                    remaining = None
+                    if lease is None and not self.batches:
+                        remaining = await asyncio.to_thread(self.queue.remaining)
+                except Exception as e:
+                    # Los lotes ya tomados siguen procesándose; sólo se demora pedir más
+                    print(f"⚠️ No se pudo consultar la cola ({e}); se reintenta en {backoff:.0f}s.")
                     await asyncio.sleep(backoff)
-                    backoff *= 2
-                    retries += 1
+                    backoff = min(backoff * 2, QUEUE_MAX_BACKOFF)
                     continue
+                backoff = QUEUE_POLL
+                if lease is None:
+                    if remaining == 0:
+                        break
+                    if not self.batches and not waiting:
+                        print("⏳ Sin lotes libres: esperando lotes de otros workers (por si alguno se corta)...")
+                        waiting = True
+                    await asyncio.sleep(QUEUE_POLL)
+                    continue
+                waiting = False
+                await self._start(lease, queues)
+        finally:
+            self.heartbeat_task.cancel()
+        for queue in queues.values():
+            for _ in range(num_workers):
+                await queue.put(None)
 
-                # Error desconocido cliente (400, 401, 403)
-                print(f"❌ [{story_id}] Error cliente {response.status}. No se reintenta.")
-                return False
+    async def _start(self, lease, queues):
+        self.stats['batches'] += 1
+        if self.shards and lease.shard not in self.shards:
+            self.stats['stolen'] += 1
+        items = lease.items[lease.progress:]
+        print(f"📦 Lote {lease.batch_id} ({lease.shard}): {len(items)} IDs"
+              f"{f' (retomado desde {lease.progress})' if lease.progress else ''}")
+        if not items:
+            try:
+                await asyncio.to_thread(self.queue.complete, lease.batch_id, lease.token)
+            except Exception as e:
+                # Sin cerrar, vuelve a la cola al vencer el lease y se cierra en la próxima toma
+                print(f"⚠️ No se pudo cerrar el lote {lease.batch_id}: {e}")
+            return
+        self.batches[lease.batch_id] = {
+            'lease': lease, 'remaining': len(items), 'done': set(), 'prefix': lease.progress,
+            'results': {}, 'lost': False, 'saved': lease.progress, 'renewed': time.monotonic(),
+            'saving': asyncio.Lock(), 'resent': lease.attempts > 1,
+        }
+        for pos, item in enumerate(items, lease.progress):
+            self.owner[item[0]] = (lease.batch_id, pos)
+        for item in items:
+            await queues[DELETE_ROUTES[item[2]][0]].put(item)
 
-        except aiohttp.ClientError as e:
-            print(f"❌ [{story_id}] Error de conexión: {e}")
-            await asyncio.sleep(backoff)
-            retries += 1
+    def claim(self, arc_id):
+        """False si el ID es de un lote cuyo lease se perdió (no hay que procesarlo)."""
+        batch_id, _ = self.owner[arc_id]
+        if self.batches[batch_id]['lost']:
+            self.stats['skipped'] += 1
+            self._forget(arc_id)
+            return False
+        return True
 
-    print(f"💀 [{story_id}] Falló tras {max_retries} intentos.")
-    return False
+    def resent(self, arc_id):
+        """True si el ID es de un lote que ya estuvo tomado antes (el DELETE puede repetirse)."""
+        batch_id, _ = self.owner[arc_id]
+        return self.batches[batch_id]['resent']
 
-# --- Carga de Datos ---
+    def _forget(self, arc_id):
+        batch_id, pos = self.owner.pop(arc_id)
+        batch = self.batches[batch_id]
+        batch['remaining'] -= 1
+        batch['done'].add(pos)
+        while batch['prefix'] in batch['done']:
+            batch['done'].discard(batch['prefix'])
+            batch['prefix'] += 1
+        if batch['remaining'] == 0:
+            del self.batches[batch_id]
+            self.room.set()
+            return batch
+        return None
 
-def load_rows_from_csv(csv_path):
-    """Lee CSVs intentando detectar si tienen header o no."""
-    rows = []
-    try:
-        with open(csv_path, newline='', encoding='utf-8') as f:
-            # Leemos un pedazo para detectar formato
-            sample = f.read(1024)
-            f.seek(0)
+    async def done(self, item, ok):
+        batch_id, pos = self.owner[item[0]]
+        self.batches[batch_id]['results'][pos] = (item, ok)
+        finished = self._forget(item[0])
+        if finished and not finished['lost']:
+            lease = finished['lease']
             try:
-                has_header = csv.Sniffer().has_header(sample)
-            except csv.Error:
-                has_header = False # Si falla el sniffer, asumimos sin header
-            
-            f.seek(0)
-            
-            if has_header:
-                reader = csv.DictReader(f)
-                for r in reader:
-                    # Busca columnas comunes de ID
-                    sid = r.get('story_id') or r.get('_id') or r.get('id')
-                    if sid: rows.append({'story_id': sid, 'site': r.get('site')})
-            else:
-                reader = csv.reader(f)
-                for r in reader:
-                    if r and len(r) > 0: 
-                        rows.append({'story_id': r[0].strip(), 'site': None})
-    except Exception as e:
-        print(f"Error leyendo {csv_path}: {e}")
-    return rows
-
-def load_ids(args):
-    """Carga los IDs desde archivo TXT, CSV único o directorio de CSVs."""
-    story_ids = []
-    
+                # Primero los resultados que faltan guardar, después el cierre
+                closed = await self._save(finished) and await asyncio.to_thread(
+                    self.queue.complete, lease.batch_id, lease.token)
+            except Exception as e:
+                # Sin cerrar, el lote vuelve a la cola al vencer el lease (desde el último avance guardado)
+                print(f"⚠️ No se pudo cerrar el lote {lease.batch_id}: {e}")
+                return
+            if not closed:
+                self._lost(finished)
+
+    def _unsaved(self, batch):
+        """(avance, OK, fallidos) de los IDs entre el último avance guardado y el prefijo actual."""
+        prefix = batch['prefix']
+        results = [batch['results'][pos] for pos in range(batch['saved'], prefix)]
+        return prefix, sum(ok for _, ok in results), [item for item, ok in results if not ok]
+
+    def _saved(self, batch, stored):
+        """
+        Registra el avance que quedó guardado. Puede ser menor que el pedido si la cola ya tenía
+        otro (una respuesta anterior se perdió): los resultados hasta ahí ya están en la cola.
+        """
+        for pos in range(batch['saved'], stored):
+            batch['results'].pop(pos, None)
+        batch['saved'] = max(batch['saved'], stored)
+
+    async def _save(self, batch):
+        """Guarda avance y resultados hasta el prefijo (renovando el lease). False si se perdió el lease."""
+        lease = batch['lease']
+        async with batch['saving']:
+            while True:
+                start = batch['saved']
+                prefix, ok, failed = self._unsaved(batch)
+                stored = await asyncio.to_thread(self.queue.heartbeat, lease.batch_id, lease.token, start, prefix,
+                                                 ok, failed, self.lease_seconds)
+                if stored is None:
+                    self._lost(batch)
+                    return False
+                self._saved(batch, stored)
+                batch['renewed'] = time.monotonic()
+                if batch['saved'] >= prefix:
+                    return True
+
+    def _lost(self, batch):
+        if not batch['lost']:
+            batch['lost'] = True
+            self.stats['lost'] += 1
+            print(f"⚠️ Se perdió el lease del lote {batch['lease'].batch_id}: lo retoma otro worker.")
+
+    async def _heartbeat(self):
+        renew_every = self.lease_seconds / 3
+        while True:
+            await asyncio.sleep(min(renew_every, PROGRESS_INTERVAL))
+            for batch in list(self.batches.values()):
+                # Sólo si hay avance nuevo que guardar o toca renovar el lease
+                if batch['lost'] or (batch['prefix'] == batch['saved']
+                                     and time.monotonic() - batch['renewed'] < renew_every):
+                    continue
+                try:
+                    await self._save(batch)
+                except Exception as e:
+                    # Un corte de la cola no debe matar la corrida: se reintenta en la próxima vuelta
+                    print(f"⚠️ No se pudo renovar el lease del lote {batch['lease'].batch_id}: {e}")
+
+    def release_all(self):
+        """Devuelve a la cola, con su avance y sus resultados, los lotes sin terminar (al cortar el proceso)."""
+        for batch in list(self.batches.values()):
+            if not batch['lost']:
+                lease = batch['lease']
+                try:
+                    self.queue.release(lease.batch_id, lease.token, batch['saved'], *self._unsaved(batch))
+                except Exception as e:
+                    print(f"⚠️ No se pudo devolver el lote {lease.batch_id}: {e}")
+        self.batches.clear()
+
+
+def queue_shard(item):
+    """Shard de la cola para un (id, site, tipo, deducido): `familia:sitio`."""
+    return f"{DELETE_ROUTES[item[2]][0]}:{item[1] or '-'}"
+
+# --- Carga de Datos ---
+
+def interleave(iterables, max_open=MAX_OPEN_INPUTS, chunk=INTERLEAVE_ROWS):
+    """
+    Alterna bloques de `chunk` elementos de hasta `max_open` iterables a la vez (los demás
+    esperan su turno), en un orden fijo. Sirve para que archivos de tipos distintos se lean
+    en paralelo sin abrir todos juntos.
+    """
+    pending = iter(iterables)
+    active = deque(itertools.islice(pending, max_open))
+    while active:
+        it = active.popleft()
+        block = list(itertools.islice(it, chunk))
+        yield from block
+        if len(block) == chunk:
+            active.append(it)
+        else:
+            active.extend(itertools.islice(pending, 1))
+
+
+def iter_raw_ids(args):
+    """Genera (id, site, tipo) de la entrada de la línea de comandos (tipo None si no se sabe)."""
+    id_columns = args.id_columns or DEFAULT_ID_COLUMNS
+    site_columns = args.site_columns or DEFAULT_SITE_COLUMNS
     if args.csv:
-        rows = load_rows_from_csv(args.csv)
-        story_ids.extend([(r['story_id'], r.get('site')) for r in rows])
-        
+        yield from iter_items_from_csv(args.csv, id_columns, site_columns)
     elif args.csv_dir:
-        csv_files = []
-        for root, _, files in os.walk(args.csv_dir):
-            for fname in sorted(files): # Ordenar archivos dentro de cada directorio
-                if fname.lower().endswith('.csv'):
-                    path = os.path.join(root, fname)
-                    csv_files.append(path)
-        
-        # Ordenar la lista completa de rutas para asegurar un orden predecible
-        csv_files.sort()
+        def read(path):
+            print(f"Leyendo IDs de {os.path.basename(path)}")
+            yield from iter_items_from_csv(path, id_columns, site_columns)
 
-        for path in csv_files:
-            rows = load_rows_from_csv(path)
-            story_ids.extend([(r['story_id'], r.get('site')) for r in rows])
-            print(f"Cargados {len(rows)} IDs de {os.path.basename(path)}")
+        yield from interleave(read(path) for path in find_input_files(args.csv_dir))
     else:
         # Fallback a archivo txt
-        try:
-            with open(args.ids_file, 'r', encoding='utf-8') as f:
-                story_ids = [(line.strip(), None) for line in f if line.strip()]
-        except FileNotFoundError:
-            print(f"No se encontró archivo de IDs: {args.ids_file}")
-            
+        for sid, site in iter_ids_from_txt(args.ids_file):
+            yield sid, site, None
+
+
+def normalize_asset_type(value):
+    """'Photo', 'videos'... -> tipo de DELETE_ROUTES, o None si no se reconoce."""
+    value = (value or '').strip().lower()
+    value = ASSET_TYPE_ALIASES.get(value, value)
+    return value if value in DELETE_ROUTES else None
+
+
+def resolve_asset_type(arc_id, row_type, default_type=None):
+    """
+    (tipo, deducido) con el que se borra un ID: el tipo de la fila si lo trae, si no
+    `default_type` (--asset-type) y si no el formato del ID (UUID = video, el resto = nota).
+    `deducido` es True cuando se supuso nota por el formato: un ID base32 también puede ser una
+    imagen o una galería. El tipo es None si la fila trae uno que no se sabe borrar.
+    """
+    if row_type:
+        return normalize_asset_type(row_type), False
+    if default_type:
+        return default_type, False
+    if UUID_RE.match(arc_id):
+        return "video", False
+    return "story", True
+
+
+def load_ids(args, completed=None, stats=None):
+    """
+    Genera (id, site, tipo, deducido) desde archivo TXT, CSV único o directorio de CSVs, de
+    forma perezosa: los workers empiezan a borrar apenas se lee la primera fila.
+
+    - Descarta IDs con formato inválido (ver ARC_ID_RE) salvo con --no-validate.
+    - Descarta las filas cuyo tipo no se sabe borrar (ver DELETE_ROUTES).
+    - Elimina duplicados en toda la entrada (incluido todo --csv-dir).
+    - Si se pasa `completed` (IDs ya borrados según el journal) esos IDs se omiten.
+    Los contadores de descartes (y de tipos deducidos) quedan en `stats` si se pasa un dict.
+    """
+    if stats is None:
+        stats = {}
+    for key in ('invalid', 'unknown_type', 'duplicates', 'resumed', 'guessed'):
+        stats.setdefault(key, 0)
+    seen = IdSet()
+    validate = not getattr(args, 'no_validate', False)
+    default_type = getattr(args, 'asset_type', None)
+
+    def generate():
+        for sid, site, row_type in iter_raw_ids(args):
+            if validate and not ARC_ID_RE.match(sid):
+                stats['invalid'] += 1
+                continue
+            asset_type, guessed = resolve_asset_type(sid, row_type, default_type)
+            if asset_type is None:
+                stats['unknown_type'] += 1
+                continue
+            if sid in seen:
+                stats['duplicates'] += 1
+                continue
+            seen.add(sid)
+            if completed and sid in completed:
+                stats['resumed'] += 1
+                continue
+            stats['guessed'] += guessed
+            yield sid, site, asset_type, guessed
+
     if args.limit:
-        story_ids = story_ids[:args.limit]
-        
-    return story_ids
+        return itertools.islice(generate(), args.limit)
+    return generate()
+
+# --- Pool de Workers ---
+
+async def produce_ids(queues, items, num_workers):
+    """
+    Reparte los IDs en la cola acotada de la familia de cada tipo y al final envía una señal
+    de fin por worker a cada cola. Una cola llena frena la lectura, no a las otras familias.
+    """
+    for n, item in enumerate(items, 1):
+        await queues[DELETE_ROUTES[item[2]][0]].put(item)
+        # put() no cede el loop si la cola tiene lugar: ceder cada tanto para que los workers arranquen
+        if n % 100 == 0:
+            await asyncio.sleep(0)
+    for queue in queues.values():
+        for _ in range(num_workers):
+            await queue.put(None)
+
+
+async def delete_worker(client, queue, stats, journal=None, confirmer=None, clients=None, feeder=None):
+    """Consume IDs de la cola de su familia hasta recibir la señal de fin (None)."""
+    while True:
+        item = await queue.get()
+        if item is None:
+            break
+        story_id, site, asset_type, guessed = item
+        if feeder and not feeder.claim(story_id):
+            continue
+        resent = bool(feeder) and feeder.resent(story_id)
+        try:
+            ok = await delete_asset_async(client, story_id, site, asset_type, guessed, resent)
+        except Exception as e:
+            # Un error inesperado no debe matar al worker (la cola quedaría sin consumidor)
+            print(f"❌ [{story_id}] Error inesperado: {e}")
+            ok = False
+        if journal:
+            journal.record(story_id, site, ok)
+        if ok and confirmer:
+            confirmer.add(story_id, site, asset_type)
+        if feeder:
+            await feeder.done(item, ok)
+        stats['completed'] += 1
+        stats['ok' if ok else 'failed'] += 1
+        by_type = stats['by_type'].setdefault(asset_type, {'ok': 0, 'failed': 0})
+        by_type['ok' if ok else 'failed'] += 1
+        metrics.add_items('delete', site, 'ok' if ok else 'failed')
+        if stats['completed'] % 50 == 0:
+            print_progress(stats, clients or {client.family: client})
+
+
+def print_progress(stats, clients):
+    completed = stats['completed']
+    elapsed = time.time() - stats['start_time']
+    rate = completed / elapsed if elapsed > 0 else 0
+    # Sólo las familias que ya recibieron trabajo
+    families = {DELETE_ROUTES[t][0] for t in stats.get('by_type', {})} or set(clients)
+    limits = ", ".join(f"{f} {clients[f].limiter.rate:.2f}" for f in DELETE_FAMILIES if f in families and f in clients)
+    total = stats.get('total')
+    if total:
+        remaining = total - completed
+        eta = remaining / rate if rate > 0 else 0
+        print(f"--> Progreso: {completed}/{total} | {rate:.2f} req/s (límite {limits}) | ETA: {eta/60:.1f} min")
+    else:
+        print(f"--> Progreso: {completed} | {rate:.2f} req/s (límite {limits})")
 
 # --- Main Asíncrono ---
 
@@ -181,55 +691,155 @@ async def main():
     parser.add_argument('--csv', help='Archivo CSV individual')
     parser.add_argument('--csv-dir', help='Directorio de CSVs')
     parser.add_argument('--limit', type=int, help='Límite de notas a procesar')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f'Workers concurrentes por familia de endpoints (default: {DEFAULT_CONCURRENCY}). '
+                             'Independiente del límite de velocidad.')
+    parser.add_argument('--journal', default=DEFAULT_JOURNAL_FILE,
+                        help=f'Archivo journal de checkpoint (default: {DEFAULT_JOURNAL_FILE})')
+    parser.add_argument('--resume', action='store_true',
+                        help='Omitir los IDs que el journal registra como ya borrados')
+    parser.add_argument('--id-column', dest='id_columns', type=lambda v: [c.strip() for c in v.split(',') if c.strip()],
+                        help=f'Columnas candidatas para el ID, separadas por coma (default: {",".join(DEFAULT_ID_COLUMNS)})')
+    parser.add_argument('--site-column', dest='site_columns', type=lambda v: [c.strip() for c in v.split(',') if c.strip()],
+                        help=f'Columnas candidatas para el sitio, separadas por coma (default: {",".join(DEFAULT_SITE_COLUMNS)})')
+    parser.add_argument('--no-validate', action='store_true',
+                        help='No descartar IDs que no tengan formato de ID de Arc')
+    parser.add_argument('--asset-type', type=normalize_asset_type, choices=list(DELETE_ROUTES),
+                        help='Tipo de las filas que no traen columna de tipo (default: UUID = video, el resto = story)')
+    parser.add_argument('--confirm', action='store_true',
+                        help='Confirmar en lotes que lo borrado ya no aparece publicado (1 petición cada 100 IDs)')
+    parser.add_argument('--confirm-delay', type=float, default=DEFAULT_CONFIRM_DELAY,
+                        help=f'Segundos de espera antes de confirmar un ID (lag de indexación, default: {DEFAULT_CONFIRM_DELAY:.0f})')
+    parser.add_argument('--retry-file', default=DEFAULT_RETRY_FILE,
+                        help=f'CSV donde quedan los IDs que sobrevivieron al borrado (default: {DEFAULT_RETRY_FILE})')
+    parser.add_argument('--queue', help='Cola durable compartida entre procesos (archivo SQLite o URL de '
+                             '`delete_queue.py serve`): sin --enqueue, toma lotes de ahí en lugar de leer la entrada')
+    parser.add_argument('--enqueue', action='store_true', help='Cargar la entrada en --queue y salir')
+    parser.add_argument('--shards', type=lambda v: [c.strip() for c in v.split(',') if c.strip()],
+                        help='Shards preferidos en modo cola (p. ej. video:fayerwayer,draft:mwn); al vaciarse toma de los demás')
+    parser.add_argument('--lease', type=float, default=DEFAULT_LEASE_SECONDS,
+                        help=f'Segundos de lease de cada lote en modo cola (default: {DEFAULT_LEASE_SECONDS:.0f})')
+    parser.add_argument('--worker-id', help='Nombre de este worker en la cola (default: host:pid)')
+    parser.add_argument('--metrics-port', type=int, default=int(METRICS_PORT or 0),
+                        help='Exponer métricas Prometheus en http://127.0.0.1:PUERTO/metrics (default: ARC_METRICS_PORT)')
+    parser.add_argument('--metrics-summary', default=METRICS_SUMMARY_PATH,
+                        help='Archivo JSON con el resumen de métricas al terminar (default: ARC_METRICS_SUMMARY)')
     args = parser.parse_args()
 
+    # Validar credenciales (acá y no al importar: bench_arc.py importa este módulo)
+    if not (ARC_ACCESS_TOKEN and ORG_ID):
+        print("Error: Faltan variables de entorno (ARC_ACCESS_TOKEN, ORG_ID) en el archivo .env")
+        sys.exit(1)
+
+    num_workers = max(1, args.concurrency)
+    if args.confirm and args.csv and os.path.abspath(args.csv) == os.path.abspath(args.retry_file):
+        parser.error('--retry-file no puede ser el mismo archivo que --csv (se lee mientras se escribe)')
+    if args.enqueue and not args.queue:
+        parser.error('--enqueue requiere --queue')
+    if args.enqueue and args.queue.startswith(('http://', 'https://')):
+        parser.error('--enqueue necesita el archivo de la cola, no la URL de `delete_queue.py serve`')
+
     # 1. Cargar IDs
     print("--- Iniciando Script de Borrado Optimizado ---")
-    items = load_ids(args)
-    
-    # Filtrar duplicados si es necesario (opcional)
-    # items = list(set(items)) 
-
-    if not items:
-        print("No hay notas para procesar. Verifica tus archivos.")
+    completed = None
+    if args.resume:
+        t0 = time.time()
+        completed = DeleteJournal.load_completed(args.journal)
+        print(f"Journal '{args.journal}': {len(completed)} IDs completados (leído en {time.time() - t0:.2f}s).")
+    load_stats = {}
+    for key in ('invalid', 'unknown_type', 'duplicates', 'resumed', 'guessed'):
+        load_stats[key] = 0
+    feeder = None
+    if args.enqueue:
+        queue = DeleteQueue(args.queue)
+        t0 = time.time()
+        queue_stats = {}
+        added = queue.enqueue(load_ids(args, completed=completed, stats=load_stats), queue_shard, stats=queue_stats)
+        print(f"Encolados {added} IDs en {queue_stats['batches']} lotes en {time.time() - t0:.1f}s"
+              f" ({queue_stats['already_queued']} ya estaban en la cola).")
+        print(f"🧹 IDs descartados: {load_stats['invalid']} inválidos | {load_stats['unknown_type']} de tipo desconocido"
+              f" | {load_stats['duplicates']} duplicados | {load_stats['resumed']} ya borrados (journal)")
+        queue.close()
         return
+    if args.queue:
+        # Modo cola: la entrada ya está cargada, los IDs llegan en lotes con lease
+        feeder = QueueFeeder(open_queue(args.queue), args.worker_id, args.lease, args.shards)
+        print(f"Worker '{feeder.worker_id}' tomando lotes de '{args.queue}'")
+    else:
+        items = load_ids(args, completed=completed, stats=load_stats)
 
-    print(f"Total a procesar: {len(items)} notas.")
-    print(f"Velocidad configurada: {MAX_REQUESTS_PER_SECOND} req/s")
+        # La carga es perezosa: sólo verificamos que haya al menos un ID antes de arrancar
+        first = next(items, None)
+        if first is None:
+            print("No hay notas para procesar. Verifica tus archivos.")
+            return
+        items = itertools.chain([first], items)
 
-    # 2. Configurar Rate Limiter y Sesión
-    limiter = AsyncRateLimiter(MAX_REQUESTS_PER_SECOND)
-    
-    # TCPConnector limita conexiones totales para no saturar tu máquina local
-    connector = aiohttp.TCPConnector(limit=50) 
+    journal = DeleteJournal(args.journal)
+    start_metrics_server(args.metrics_port)
 
-    async with aiohttp.ClientSession(connector=connector) as session:
-        tasks = []
-        start_time = time.time()
-        
-        # Crear tareas
-        for story_id, site in items:
-            task = delete_story_async(session, story_id, site, limiter)
-            tasks.append(task)
-        
-        # Ejecutar y mostrar progreso
-        completed = 0
-        total = len(tasks)
-        
-        # as_completed nos permite iterar a medida que terminan
-        for future in asyncio.as_completed(tasks):
-            await future
-            completed += 1
-            if completed % 50 == 0:
-                elapsed = time.time() - start_time
-                rate = completed / elapsed
-                remaining = total - completed
-                eta = remaining / rate if rate > 0 else 0
-                print(f"--> Progreso: {completed}/{total} | {rate:.2f} req/s | ETA: {eta/60:.1f} min")
-
-        total_time = time.time() - start_time
-        print(f"\n✅ Finalizado en {total_time:.2f}s.")
-        print(f"📊 Velocidad promedio final: {len(items)/total_time:.2f} req/s")
+    # 2. Un cliente por familia de endpoints: limitador, cuota, reintentos y pool de conexiones
+    # propios (una conexión por worker es suficiente). La confirmación usa la Content API.
+    async with contextlib.AsyncExitStack() as stack:
+        clients = {family: await stack.enter_async_context(
+                       AsyncArcClient(pool_size=num_workers, family=family, priority="bulk"))
+                   for family in DELETE_FAMILIES}
+        for family, client in clients.items():
+            print(f"Velocidad configurada ({family}): {client.limiter.max_rate} req/s | Workers: {num_workers}")
+
+        # El total no se conoce de antemano (la entrada se lee en streaming)
+        stats = {'completed': 0, 'ok': 0, 'failed': 0, 'by_type': {}, 'total': None, 'start_time': time.time()}
+
+        # 3. Productor/consumidores: una cola acotada por familia mantiene la memoria plana
+        # sin importar el tamaño de la entrada, y una familia lenta no frena a las otras
+        queues = {family: asyncio.Queue(maxsize=FAMILY_BUFFER) for family in DELETE_FAMILIES}
+        confirmer = None
+        if args.confirm:
+            search_client = await stack.enter_async_context(AsyncArcClient(pool_size=4, priority="bulk"))
+            confirmer = DeleteConfirmer(search_client, args.confirm_delay, args.retry_file, journal).start()
+        workers = [asyncio.create_task(delete_worker(clients[family], queues[family], stats, journal, confirmer,
+                                                     clients, feeder))
+                   for family in DELETE_FAMILIES for _ in range(num_workers)]
+        try:
+            if feeder:
+                await feeder.produce(queues, num_workers)
+            else:
+                await produce_ids(queues, items, num_workers)
+            await asyncio.gather(*workers)
+            if confirmer:
+                await confirmer.close()
+        finally:
+            # Incluso si se interrumpe, dejar en disco lo ya procesado (y devolver los lotes sin terminar)
+            journal.close()
+            if feeder:
+                feeder.release_all()
+
+        total_time = time.time() - stats['start_time']
+        print(f"\n✅ Finalizado en {total_time:.2f}s. OK: {stats['ok']} | Fallidas: {stats['failed']}")
+        for asset_type, counts in sorted(stats['by_type'].items()):
+            print(f"   {asset_type}: {counts['ok']} OK | {counts['failed']} fallidos")
+        print(f"🧹 IDs descartados: {load_stats['invalid']} inválidos | {load_stats['unknown_type']} de tipo desconocido"
+              f" | {load_stats['duplicates']} duplicados | {load_stats['resumed']} ya borrados (journal)")
+        if load_stats['guessed']:
+            print(f"❔ {load_stats['guessed']} IDs sin tipo en la entrada se borraron como story (su 404 cuenta como fallo)")
+        print(f"📊 Velocidad promedio final: {stats['completed']/total_time:.2f} req/s")
+        used = {DELETE_ROUTES[t][0] for t in stats['by_type']}
+        for family, client in clients.items():
+            if family in used:
+                print(f"🚦 {family}: 429 recibidos: {client.limiter.throttle_count} | velocidad final del limitador:"
+                      f" {client.limiter.rate:.2f} req/s")
+        if feeder:
+            f = feeder.stats
+            print(f"📦 Cola: {f['batches']} lotes tomados ({f['stolen']} de otros shards) | {f['lost']} leases perdidos"
+                  f" | {f['skipped']} IDs cedidos a otro worker")
+        if confirmer:
+            c = confirmer.stats
+            print(f"🔎 Confirmación: {c['confirmed']} confirmadas | {c['survivors']} siguen publicadas | "
+                  f"{c['unchecked']} sin confirmar | {c['no_site']} sin sitio ({c['requests']} peticiones)")
+            if c['survivors'] or c['unchecked']:
+                print(f"   Reintentar con: python pipeline_notas.py --csv {args.retry_file}")
+        # Hay un pool de num_workers por familia: la concurrencia total es la suma
+        finish_run(args.metrics_summary, concurrency=num_workers * len(DELETE_FAMILIES))
 
 if __name__ == "__main__":
     # Fix crítico para Windows: evita errores "Event loop is closed"
@@ -0,0 +1,500 @@
+"""
+Broker local de cuota: un solo proceso reparte los tokens de velocidad de la organización
+entre todos los scripts que corren a la vez (auditorías, verificaciones y borrados), con
+prioridades, para que juntos no pasen el límite ni se pisen con 429.
+
+- Por defecto hay un solo token bucket para toda la organización, con la velocidad de
+  MAX_REQUESTS_PER_SECOND y RATE_LIMIT_BURST del entorno del broker. Con --per-family cada
+  familia de endpoints (content, draft, video, photo) tiene el suyo, con
+  MAX_REQUESTS_PER_SECOND_<FAMILIA> y RATE_LIMIT_BURST_<FAMILIA>. Ajuste AIMD: un 429
+  informado por cualquier script pausa a todos (Retry-After) y baja la velocidad; sin 429
+  vuelve a subir de a poco.
+- Cada token va al pedido de mayor prioridad que esté esperando: `interactive`
+  (verify_sample.py) antes que `audit` (auditorías, content_index) antes que `bulk`
+  (pipeline_notas.py). Entre pedidos de la misma prioridad, por orden de llegada. La
+  prioridad es estricta: un borrado masivo sólo usa la cuota que dejan libre los demás.
+
+Los scripts lo usan si ARC_QUOTA_BROKER apunta al socket (o a `host:puerto`); el limitador
+local de cada proceso sigue funcionando igual. Si el broker no responde (no acepta la conexión
+o el saludo en CONNECT_TIMEOUT segundos, o cierra la conexión), siguen sólo con el limitador
+local. Un token que tarda no es una falla: cada ARC_QUOTA_TIMEOUT segundos de espera se le
+pregunta al broker si sigue vivo (`PING`) y, si contesta, se sigue esperando; sólo si no
+contesta en CONNECT_TIMEOUT se pasa al limitador local. ARC_QUOTA_PRIORITY fuerza la
+prioridad de un proceso.
+
+Uso:
+  python quota_broker.py serve --socket /tmp/arc_quota.sock
+  ARC_QUOTA_BROKER=/tmp/arc_quota.sock python pipeline_notas.py --csv-dir borrar/
+  ARC_QUOTA_BROKER=/tmp/arc_quota.sock python auditoria_videos.py
+  python quota_broker.py status --socket /tmp/arc_quota.sock
+"""
+import argparse
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+from rate_limiter import TokenBucket
+
+DEFAULT_SOCKET = "/tmp/arc_quota.sock"
+# Prioridades, de mayor a menor
+PRIORITIES = ("interactive", "audit", "bulk")
+DEFAULT_PRIORITY = "audit"
+# Sin broker (o caído), cada cuánto se vuelve a intentar conectar
+RECONNECT_INTERVAL = 30.0
+# Segundos para conectar, recibir el saludo y contestar un PING: un broker colgado (p. ej.
+# detenido con SIGSTOP) no debe frenar a los scripts.
+CONNECT_TIMEOUT = 5.0
+# Cada cuántos segundos sin token se comprueba que el broker siga vivo. Con prioridades
+# estrictas un `bulk` puede esperar mucho mientras el tráfico de mayor prioridad usa toda la
+# cuota: esa espera es el reparto buscado, no una falla, así que no se sale del broker por ella.
+GRANT_TIMEOUT = float(os.getenv("ARC_QUOTA_TIMEOUT", "60"))
+
+
+def broker_address():
+    return os.getenv("ARC_QUOTA_BROKER", "")
+
+
+def _parse_address(address):
+    """`/ruta/al.sock` -> (AF_UNIX, ruta); `host:puerto` -> (AF_INET, (host, puerto))."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+    return socket.AF_UNIX, address
+
+
+# --- Broker ---
+
+class _Connection:
+    __slots__ = ("writer", "family", "priority", "tool", "closed")
+
+    def __init__(self, writer, family, priority, tool):
+        self.writer = writer
+        self.family = family
+        self.priority = priority
+        self.tool = tool
+        self.closed = False
+
+
+class _FamilyQueue:
+    """Token bucket (de una familia o de la organización) y los pedidos esperando, por (prioridad, llegada)."""
+
+    def __init__(self, name, rate, burst):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst=burst)
+        self.waiting = []
+        self.seq = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.granted = {}  # (prioridad, herramienta) -> tokens
+
+    def push(self, conn):
+        heapq.heappush(self.waiting, (PRIORITIES.index(conn.priority), next(self.seq), conn))
+        self.wakeup.set()
+
+    async def run(self):
+        bucket = self.bucket
+        while True:
+            while self.waiting and self.waiting[0][2].closed:
+                heapq.heappop(self.waiting)
+            if not self.waiting:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            now = time.monotonic()
+            if bucket.blocked_until > now:
+                await asyncio.sleep(bucket.blocked_until - now)
+                continue
+            bucket._refill(now)
+            if bucket.tokens < 1:
+                # Al despertar se vuelve a mirar el primero: si llegó uno más prioritario, va él
+                await asyncio.sleep((1 - bucket.tokens) / bucket.rate)
+                continue
+            bucket.tokens -= 1
+            _, _, conn = heapq.heappop(self.waiting)
+            conn.writer.write(b"OK\n")
+            key = (conn.priority, conn.tool)
+            self.granted[key] = self.granted.get(key, 0) + 1
+            # Sin 429 informados la velocidad vuelve a subir de a poco (AIMD)
+            bucket.on_success()
+
+    def stats(self):
+        waiting = {p: 0 for p in PRIORITIES}
+        for _, _, conn in self.waiting:
+            if not conn.closed:
+                waiting[conn.priority] += 1
+        return {
+            "rate": round(self.bucket.rate, 3),
+            "max_rate": self.bucket.max_rate,
+            "throttles": self.bucket.throttle_count,
+            "paused_seconds": round(max(0.0, self.bucket.blocked_until - time.monotonic()), 3),
+            "waiting": waiting,
+            "granted": {f"{p}:{t}": n for (p, t), n in sorted(self.granted.items())},
+        }
+
+
+class QuotaBroker:
+    """
+    Protocolo de líneas de texto: `HELLO <familia> <prioridad> <herramienta>` al conectar;
+    después `ACQ` (se responde `OK` cuando hay token; los pedidos de una conexión se
+    responden en orden), `THR <segundos>` (429 recibido, sin respuesta), `PING` (se responde
+    `PONG` enseguida, aunque haya tokens pendientes) y `STATS` (JSON).
+    """
+
+    def __init__(self, rate_for, burst_for, per_family=False):
+        self.rate_for = rate_for
+        self.burst_for = burst_for
+        self.per_family = per_family
+        self.families = {}
+        self.started = time.time()
+
+    def family(self, name):
+        """Cola de tokens de una familia (la de toda la organización si no es --per-family)."""
+        key = name if self.per_family else "org"
+        queue = self.families.get(key)
+        if queue is None:
+            rate_family = name if self.per_family else None
+            queue = self.families[key] = _FamilyQueue(key, self.rate_for(rate_family), self.burst_for(rate_family))
+            asyncio.create_task(queue.run())
+        return queue
+
+    async def handle(self, reader, writer):
+        conn = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                parts = line.decode("utf-8", "replace").split()
+                if not parts:
+                    continue
+                cmd = parts[0].upper()
+                if cmd == "HELLO":
+                    family = parts[1] if len(parts) > 1 else "content"
+                    priority = parts[2] if len(parts) > 2 and parts[2] in PRIORITIES else DEFAULT_PRIORITY
+                    conn = _Connection(writer, family, priority, parts[3] if len(parts) > 3 else "?")
+                    self.family(family)
+                    writer.write(b"OK\n")
+                elif cmd == "ACQ" and conn:
+                    self.family(conn.family).push(conn)
+                elif cmd == "THR" and conn:
+                    seconds = float(parts[1]) if len(parts) > 1 else 0.0
+                    self.family(conn.family).bucket.on_throttle(seconds or None)
+                elif cmd == "PING":
+                    writer.write(b"PONG\n")
+                elif cmd == "STATS":
+                    writer.write(json.dumps(self.stats()).encode("utf-8") + b"\n")
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            if conn:
+                conn.closed = True
+            writer.close()
+
+    def stats(self):
+        return {
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "families": {name: queue.stats() for name, queue in sorted(self.families.items())},
+        }
+
+
+async def serve(address, rate_for, burst_for, per_family=False):
+    broker = QuotaBroker(rate_for, burst_for, per_family)
+    family, addr = _parse_address(address)
+    if family == socket.AF_UNIX:
+        if os.path.exists(addr):
+            os.unlink(addr)
+        server = await asyncio.start_unix_server(broker.handle, path=addr)
+    else:
+        server = await asyncio.start_server(broker.handle, host=addr[0], port=addr[1])
+    scope = "por familia" if per_family else f"{rate_for(None)} req/s para toda la organización"
+    print(f"Broker de cuota escuchando en {address} ({scope})", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+# --- Cliente ---
+
+class QuotaClient:
+    """
+    Pide tokens al broker para una familia con una prioridad. `acquire()` bloquea (una
+    conexión por thread) y `acquire_async()` es para corrutinas (una conexión por event
+    loop, con los pedidos en cola). Mientras el broker conteste, se espera el token lo que
+    haga falta. Si no está disponible, cierra la conexión o no contesta un PING a tiempo
+    devuelve enseguida y avisa una vez: el limitador local sigue cuidando la velocidad.
+    """
+
+    def __init__(self, address, family="content", priority=DEFAULT_PRIORITY, tool=None):
+        self.address = address
+        self.family = family
+        self.priority = priority if priority in PRIORITIES else DEFAULT_PRIORITY
+        self.tool = tool or os.path.basename(sys.argv[0] or "python") or "python"
+        self.local = threading.local()
+        self.loops = {}
+        self.down_until = 0.0
+        self.warned = False
+
+    def _hello(self):
+        return f"HELLO {self.family} {self.priority} {self.tool}\n".encode("utf-8")
+
+    def _down(self, error):
+        self.down_until = time.monotonic() + RECONNECT_INTERVAL
+        if not self.warned:
+            print(f"⚠️ Broker de cuota no disponible en {self.address} ({error}); se sigue con el limitador local.")
+            self.warned = True
+
+    def _available(self):
+        return time.monotonic() >= self.down_until
+
+    def _sync_conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            family, addr = _parse_address(self.address)
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            conn = {"sock": sock, "buffer": bytearray(), "pongs": 0}
+            try:
+                sock.settimeout(CONNECT_TIMEOUT)
+                sock.connect(addr)
+                sock.sendall(self._hello())
+                if self._sync_readline(conn, CONNECT_TIMEOUT) != b"OK\n":
+                    raise ConnectionError("respuesta inesperada al saludo")
+            except OSError:
+                sock.close()
+                raise
+            self.local.conn = conn
+        return conn
+
+    @staticmethod
+    def _sync_readline(conn, timeout):
+        """
+        Lee una línea con `recv` y un buffer propio: a diferencia de `makefile`, después de un
+        timeout la conexión se puede seguir leyendo. Lanza socket.timeout si no llega a tiempo.
+        """
+        buffer = conn["buffer"]
+        conn["sock"].settimeout(timeout)
+        while b"\n" not in buffer:
+            chunk = conn["sock"].recv(4096)
+            if not chunk:
+                raise ConnectionError("el broker cerró la conexión")
+            buffer += chunk
+        end = buffer.index(b"\n") + 1
+        line = bytes(buffer[:end])
+        del buffer[:end]
+        return line
+
+    def _sync_grant(self, conn, timeout):
+        """Espera el próximo `OK` (descartando los `PONG` que quedaron de otros PING)."""
+        while True:
+            line = self._sync_readline(conn, timeout)
+            if line == b"PONG\n" and conn["pongs"]:
+                conn["pongs"] -= 1
+                continue
+            if line != b"OK\n":
+                raise ConnectionError(f"respuesta inesperada: {line!r}")
+            return
+
+    def _drop_sync(self):
+        conn = getattr(self.local, "conn", None)
+        self.local.conn = None
+        if conn:
+            try:
+                conn["sock"].close()
+            except OSError:
+                pass
+
+    def acquire(self):
+        if not self._available():
+            return
+        try:
+            conn = self._sync_conn()
+            conn["sock"].sendall(b"ACQ\n")
+            while True:
+                try:
+                    self._sync_grant(conn, GRANT_TIMEOUT)
+                    return
+                except socket.timeout:
+                    pass
+                # Sin token todavía: si el broker contesta el PING sólo está repartiendo la
+                # cuota a otros, y se sigue esperando en la misma conexión
+                conn["sock"].sendall(b"PING\n")
+                conn["pongs"] += 1
+                line = self._sync_readline(conn, CONNECT_TIMEOUT)
+                if line == b"OK\n":
+                    return
+                if line != b"PONG\n":
+                    raise ConnectionError(f"respuesta inesperada: {line!r}")
+                conn["pongs"] -= 1
+        except OSError as e:
+            self._drop_sync()
+            self._down(str(e) or "sin respuesta")
+
+    async def _async_conn(self):
+        loop = asyncio.get_running_loop()
+        state = self.loops.get(loop)
+        if state is None:
+            state = self.loops[loop] = {"lock": asyncio.Lock(), "writer": None, "pending": None}
+        async with state["lock"]:
+            # Otro pedido pudo haber marcado el broker como caído mientras se esperaba el lock
+            if not self._available():
+                raise ConnectionError("broker no disponible")
+            if state["writer"] is None or state["writer"].is_closing():
+                reader, writer = await asyncio.wait_for(self._open_async(), CONNECT_TIMEOUT)
+                state["writer"] = writer
+                state["pending"] = pending = []
+                state["pongs"] = pongs = []
+                state["reader"] = asyncio.create_task(self._read_grants(reader, pending, pongs))
+        return state
+
+    async def _open_async(self):
+        family, addr = _parse_address(self.address)
+        if family == socket.AF_UNIX:
+            reader, writer = await asyncio.open_unix_connection(addr)
+        else:
+            reader, writer = await asyncio.open_connection(*addr)
+        try:
+            writer.write(self._hello())
+            if await reader.readline() != b"OK\n":
+                raise ConnectionError("respuesta inesperada al saludo")
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+    async def _read_grants(self, reader, pending, pongs):
+        """Cada `OK` corresponde al pedido más viejo de esta conexión; cada `PONG`, al PING más viejo."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line == b"PONG\n":
+                    if pongs:
+                        fut = pongs.pop(0)
+                        if not fut.done():
+                            fut.set_result(None)
+                elif pending:
+                    fut = pending.pop(0)
+                    if not fut.done():
+                        fut.set_result(None)
+        finally:
+            for fut in pending + pongs:
+                if not fut.done():
+                    fut.set_exception(ConnectionError("el broker cerró la conexión"))
+                    # Quien esperaba pudo haberse ido por timeout: no avisar de excepciones sin leer
+                    fut.exception()
+            pending.clear()
+            pongs.clear()
+
+    async def acquire_async(self):
+        if not self._available():
+            return
+        try:
+            state = await self._async_conn()
+            fut = asyncio.get_running_loop().create_future()
+            state["pending"].append(fut)
+            state["writer"].write(b"ACQ\n")
+            while True:
+                # shield: si el que espera se cancela, el token igual llega y se descarta en orden
+                try:
+                    await asyncio.wait_for(asyncio.shield(fut), GRANT_TIMEOUT)
+                    return
+                except asyncio.TimeoutError:
+                    pass
+                # Sin token todavía: si el broker contesta el PING sólo está repartiendo la
+                # cuota a otros, y se sigue esperando en la misma conexión
+                pong = asyncio.get_running_loop().create_future()
+                state["pongs"].append(pong)
+                state["writer"].write(b"PING\n")
+                await asyncio.wait_for(asyncio.shield(pong), CONNECT_TIMEOUT)
+        except (OSError, asyncio.TimeoutError) as e:
+            state = self.loops.get(asyncio.get_running_loop())
+            if state and state["writer"]:
+                state["writer"].close()
+                state["writer"] = None
+                # Los demás pedidos de esta conexión fallan ya, sin esperar su propio timeout
+                state["reader"].cancel()
+            self._down(str(e) or "sin respuesta")
+
+    def throttle(self, seconds):
+        """
+        Informa un 429 al broker: pausa a todos los procesos de la familia y baja la velocidad.
+        Dentro de un event loop no bloquea: se escribe en la conexión de ese loop (si no hay
+        una abierta, el broker no está en uso ahí y no hay a quién avisar).
+        """
+        if not self._available():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None:
+            state = self.loops.get(loop)
+            if state and state["writer"] is not None and not state["writer"].is_closing():
+                state["writer"].write(f"THR {seconds or 0:.3f}\n".encode("utf-8"))
+            return
+        try:
+            self._sync_conn()["sock"].sendall(f"THR {seconds or 0:.3f}\n".encode("utf-8"))
+        except OSError as e:
+            self._drop_sync()
+            self._down(e)
+
+
+def quota_client_from_env(family="content", priority=None):
+    """QuotaClient si ARC_QUOTA_BROKER está definido, o None. ARC_QUOTA_PRIORITY pisa `priority`."""
+    address = broker_address()
+    if not address:
+        return None
+    priority = os.getenv("ARC_QUOTA_PRIORITY") or priority or DEFAULT_PRIORITY
+    return QuotaClient(address, family, priority)
+
+
+def fetch_stats(address):
+    family, addr = _parse_address(address)
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.settimeout(5)
+        sock.connect(addr)
+        f = sock.makefile("rwb")
+        f.write(b"STATS\n")
+        f.flush()
+        return json.loads(f.readline())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Broker local de cuota compartido por los scripts de Arc")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("serve", "Levantar el broker"), ("status", "Velocidad, esperas y tokens entregados")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("--socket", default=broker_address() or DEFAULT_SOCKET,
+                       help=f"Socket unix o host:puerto (default: ARC_QUOTA_BROKER o {DEFAULT_SOCKET})")
+        if name == "serve":
+            p.add_argument("--per-family", action="store_true",
+                           help="Una cuota por familia de endpoints en lugar de una para toda la organización")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        from dotenv import load_dotenv
+
+        from arc_client import default_burst, default_rate
+        load_dotenv()
+        try:
+            asyncio.run(serve(args.socket, default_rate, default_burst, args.per_family))
+        except KeyboardInterrupt:
+            pass
+    else:
+        data = fetch_stats(args.socket)
+        print(f"Broker en {args.socket} (activo hace {data['uptime_seconds']:.0f}s)")
+        for name, fam in data["families"].items():
+            waiting = ", ".join(f"{p}={n}" for p, n in fam["waiting"].items())
+            print(f"  {name:8} {fam['rate']:.2f}/{fam['max_rate']:.2f} req/s | 429: {fam['throttles']}"
+                  f" | pausa {fam['paused_seconds']:.1f}s | esperando: {waiting}")
+            for key, n in fam["granted"].items():
+                print(f"           {key}: {n} tokens")
+
+
+if __name__ == "__main__":
+    main()
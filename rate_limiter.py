@@ -0,0 +1,230 @@
+"""
+Limitadores de velocidad compartidos por los scripts (borrado y auditorías).
+
+- `AsyncRateLimiter`: para corrutinas (aiohttp).
+- `RateLimiter`: para código bloqueante (requests), seguro entre threads.
+- `SharedRateBudget`: token bucket en un archivo con lock, para repartir un mismo
+  presupuesto de req/s entre varios procesos de la misma máquina.
+- Con un `broker` (ver quota_broker.py) cada petición además espera su token del broker
+  local, que reparte la cuota entre todos los scripts según su prioridad.
+"""
+import asyncio
+import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Piso de velocidad al que puede bajar el limitador tras 429s repetidos.
+MIN_REQUESTS_PER_SECOND = 1.0
+
+
+class SharedRateBudget:
+    """
+    Token bucket guardado en `path` (tokens, último refill y pausa global), protegido con un
+    lock de archivo. Todos los procesos que apunten al mismo archivo comparten el presupuesto.
+    """
+    _FORMAT = "<ddd"
+    _SIZE = struct.calcsize(_FORMAT)
+
+    def __init__(self, path, requests_per_second, burst=None):
+        self.path = path
+        self.rate = float(requests_per_second)
+        self.capacity = float(burst) if burst else max(1.0, self.rate)
+        self.f = open(path, "a+b")
+
+    def _lock(self):
+        if fcntl:
+            fcntl.flock(self.f.fileno(), fcntl.LOCK_EX)
+        else:
+            self.f.seek(0)
+            msvcrt.locking(self.f.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock(self):
+        if fcntl:
+            fcntl.flock(self.f.fileno(), fcntl.LOCK_UN)
+        else:
+            self.f.seek(0)
+            msvcrt.locking(self.f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _read(self, now):
+        self.f.seek(0)
+        raw = self.f.read(self._SIZE)
+        if len(raw) < self._SIZE:
+            return self.capacity, now, 0.0
+        return struct.unpack(self._FORMAT, raw)
+
+    def _write(self, tokens, last, blocked_until):
+        self.f.seek(0)
+        self.f.truncate()
+        self.f.write(struct.pack(self._FORMAT, tokens, last, blocked_until))
+        self.f.flush()
+
+    def reserve(self):
+        """Reserva un token y devuelve cuántos segundos hay que esperar antes de usarlo."""
+        self._lock()
+        try:
+            now = time.time()
+            tokens, last, blocked_until = self._read(now)
+            # El reloj de pared es el único común entre procesos
+            start = max(now, blocked_until)
+            tokens = min(self.capacity, tokens + max(0.0, start - last) * self.rate)
+            tokens -= 1
+            self._write(tokens, max(start, last), blocked_until)
+        finally:
+            self._unlock()
+        delay = start - now
+        if tokens < 0:
+            delay += -tokens / self.rate
+        return delay
+
+    def pause(self, seconds):
+        """Pausa a todos los procesos durante `seconds` (por ejemplo tras un 429 con Retry-After)."""
+        self._lock()
+        try:
+            now = time.time()
+            tokens, last, blocked_until = self._read(now)
+            self._write(min(tokens, 0.0), last, max(blocked_until, now + seconds))
+        finally:
+            self._unlock()
+
+    def close(self):
+        self.f.close()
+
+
+class TokenBucket:
+    """
+    Token bucket con ajuste AIMD de la velocidad. No duerme: `_reserve` devuelve cuánto esperar.
+
+    - Permite ráfagas de hasta `burst` peticiones y luego un flujo sostenido de `rate` req/s.
+    - Cada llamador reserva su token y duerme sólo lo que le corresponde, así un waiter no
+      bloquea a los demás.
+    - Ante un 429 (`on_throttle`) reduce la velocidad de forma multiplicativa y pausa a todos
+      los waiters durante el `Retry-After`; mientras las respuestas sean limpias
+      (`on_success`) la va subiendo de a poco hasta `max_rate`.
+    - Si se pasa `shared_budget`, además respeta el presupuesto común entre procesos.
+    - Si se pasa `broker` (QuotaClient), además espera el token del broker y le informa los 429.
+    """
+    def __init__(self, requests_per_second, burst=None, min_rate=MIN_REQUESTS_PER_SECOND,
+                 max_rate=None, increase_step=0.5, increase_interval=5.0, decrease_factor=0.5,
+                 decrease_cooldown=1.0, shared_budget=None, broker=None):
+        self.rate = float(requests_per_second)
+        self.max_rate = float(max_rate or requests_per_second)
+        self.min_rate = min(float(min_rate), self.rate)
+        self.capacity = float(burst) if burst else max(1.0, self.rate)
+        self.increase_step = increase_step
+        self.increase_interval = increase_interval
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.shared_budget = shared_budget
+        self.broker = broker
+
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.blocked_until = 0.0
+        self.last_adjust = self.last_refill
+        self.throttle_count = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.last_refill
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.last_refill = now
+
+    def _reserve(self):
+        """Reserva un token (puede quedar en negativo: es la cola de espera) y devuelve la espera."""
+        with self._lock:
+            now = time.monotonic()
+            # Respetar una pausa global (Retry-After) antes de reservar
+            start = max(now, self.blocked_until)
+            self._refill(start)
+            self.tokens -= 1
+            delay = start - now
+            if self.tokens < 0:
+                delay += -self.tokens / self.rate
+        if self.shared_budget:
+            delay = max(delay, self.shared_budget.reserve())
+        return delay
+
+    def _pause_remaining(self):
+        return max(0.0, self.blocked_until - time.monotonic())
+
+    def on_success(self):
+        """Incremento aditivo: sube la velocidad cada `increase_interval` segundos sin 429."""
+        if self.rate >= self.max_rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now - self.last_adjust >= self.increase_interval:
+                self._refill(now)
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+                self.last_adjust = now
+
+    def on_throttle(self, retry_after=None):
+        """Decremento multiplicativo ante un 429 y pausa global según Retry-After."""
+        with self._lock:
+            now = time.monotonic()
+            self.throttle_count += 1
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+            # Varias peticiones pueden recibir 429 a la vez: reducir una sola vez por intervalo
+            if now - self.last_adjust >= self.decrease_cooldown:
+                self._refill(now)
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                self.tokens = min(self.tokens, 0.0)
+                self.last_adjust = now
+        if retry_after and self.shared_budget:
+            self.shared_budget.pause(retry_after)
+        if self.broker:
+            self.broker.throttle(retry_after)
+
+
+class AsyncRateLimiter(TokenBucket):
+    """Token bucket para corrutinas: `await limiter.wait()` antes de cada petición."""
+
+    async def wait(self):
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # Si mientras esperábamos llegó un 429, respetar también esa pausa
+        pause = self._pause_remaining()
+        while pause > 0:
+            await asyncio.sleep(pause)
+            pause = self._pause_remaining()
+        if self.broker:
+            await self.broker.acquire_async()
+
+
+class RateLimiter(TokenBucket):
+    """Token bucket para código bloqueante: `limiter.wait()` antes de cada petición."""
+
+    def wait(self):
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+        pause = self._pause_remaining()
+        while pause > 0:
+            time.sleep(pause)
+            pause = self._pause_remaining()
+        if self.broker:
+            self.broker.acquire()
+
+
+def shared_budget_from_env(requests_per_second, burst=None, family=None):
+    """
+    Devuelve el presupuesto compartido definido en ARC_RATE_BUDGET_FILE, o None si no hay.
+    Las familias de endpoints distintas de `content` usan su propio archivo
+    (`<ARC_RATE_BUDGET_FILE>.<familia>`), porque cada API tiene su propia cuota.
+    """
+    path = os.getenv("ARC_RATE_BUDGET_FILE")
+    if not path:
+        return None
+    if family and family != "content":
+        path = f"{path}.{family}"
+    return SharedRateBudget(path, requests_per_second, burst)
@@ -0,0 +1,386 @@
+"""
+Archivo columnar compacto para los reportes de notas (`notas_publicadas_*`), con índices que
+se leen con mmap: las consultas por rango de fechas o por ID son búsquedas binarias sobre el
+archivo, sin parsear ni cargar el reporte entero.
+
+Formato (`.arcc`, little endian):
+
+    ARCCOL1\\n | secciones alineadas a 8 bytes | header JSON | uint64 offset + uint32 largo del header
+
+- `dates`: int64 epoch ms por fila. Las filas están ordenadas por fecha (con
+  external_sort.iso_sort_key, que es este mismo valor), así que esta columna es a la vez el
+  índice de fechas. Las fechas cuyo texto no sale igual de `epoch_ms_to_iso` (`.96Z`,
+  offsets, fechas ilegibles) guardan además el texto original en el header (`date_text`),
+  así un reporte leído del `.arcc` es idéntico al CSV.
+- `ids`: ID_WIDTH bytes por fila (ver arc_ids.pack_id). Los IDs sin formato conocido van en
+  el header (`others`) y la fila guarda 0xFF + su posición.
+- `sections`: uint16 por fila, código de la sección de la URL (`/espectaculos/`,
+  `https://sitio/deportes/`, ...). La tabla de secciones va en el header.
+- `url_blocks`: el resto de cada URL, en bloques de BLOCK_ROWS filas comprimidos con zlib;
+  `url_block_offsets` (uint64) indica dónde empieza cada bloque.
+- `id_index`: (id empaquetado, uint32 fila) ordenado por ID, para buscar un ID puntual.
+
+Uso:
+  python report_archive.py convert --reports-dir reports_fotos --site nuevamujer
+  python report_archive.py query reports_fotos/nuevamujer/notas_publicadas_nuevamujer.arcc --after 2020-01-01T00:00:00Z --before 2020-01-31T23:59:59Z
+  python report_archive.py get reports_fotos/nuevamujer/notas_publicadas_nuevamujer.arcc --id QM7DK5UKRBE7FEBD2GAZMRMRWA
+  python report_archive.py export reports_fotos/nuevamujer/notas_publicadas_nuevamujer.arcc --out nuevamujer.csv
+"""
+import argparse
+import bisect
+import csv
+import glob
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from functools import lru_cache
+
+from arc_ids import ID_WIDTH, pack_id, unpack_id
+from external_sort import ExternalSorter, iso_sort_key
+from timestamps import NO_DATE, epoch_ms_to_iso, to_epoch_ms
+
+MAGIC = b"ARCCOL1\n"
+ARCHIVE_EXT = ".arcc"
+BLOCK_ROWS = 1024
+NOTAS_HEADER = ["story_id", "publish_date", "url"]
+_OTHER_TAG = 0xFF
+_INDEX_WIDTH = ID_WIDTH + 4
+_SEP = b"\0"
+_FOOTER = "<QI"
+
+
+def split_url(url):
+    """Separa la URL en (sección, resto): la sección es el host (si lo hay) más el primer segmento."""
+    if not url:
+        return "", ""
+    start = 0
+    scheme = url.find("://")
+    if scheme != -1:
+        host_end = url.find("/", scheme + 3)
+        if host_end == -1:
+            return url, ""
+        start = host_end
+    cut = url.find("/", start + 1)
+    if cut == -1:
+        return url[:start + 1], url[start + 1:]
+    return url[:cut + 1], url[cut + 1:]
+
+
+def _write_array(f, values):
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    values.tofile(f)
+
+
+def _pad8(f):
+    pad = (-f.tell()) % 8
+    if pad:
+        f.write(b"\0" * pad)
+
+
+def write_archive(path, rows, site=None):
+    """
+    Escribe filas (story_id, publish_date, url) ya ordenadas por fecha en un `.arcc`
+    (de forma atómica). Devuelve cuántas filas escribió. Las URLs se comprimen por bloque a
+    medida que llegan; en memoria quedan sólo las columnas de ancho fijo.
+    """
+    dates = array("q")
+    date_text = []
+    keys = bytearray()
+    section_codes = array("H")
+    sections = {}
+    others = []
+    blocks = []
+    block = []
+
+    def flush_block():
+        blocks.append(zlib.compress(_SEP.join(block), 6))
+        block.clear()
+
+    last = NO_DATE
+    for sid, pub, url in rows:
+        ms = to_epoch_ms(pub)
+        if ms < last:
+            raise ValueError(f"Las filas deben llegar ordenadas por fecha ({pub} después de {epoch_ms_to_iso(last)})")
+        last = ms
+        if pub and epoch_ms_to_iso(ms) != pub:
+            date_text.append((len(dates), pub))
+        dates.append(ms)
+        key = pack_id(sid)
+        if key is None:
+            key = bytes([_OTHER_TAG]) + len(others).to_bytes(ID_WIDTH - 1, "big")
+            others.append(sid)
+        keys += key
+        section, rest = split_url(url or "")
+        code = sections.get(section)
+        if code is None:
+            if len(sections) >= 0xFFFF:
+                raise ValueError("Demasiadas secciones de URL distintas para el archivo")
+            code = sections[section] = len(sections)
+        section_codes.append(code)
+        block.append(rest.encode("utf-8"))
+        if len(block) >= BLOCK_ROWS:
+            flush_block()
+    if block:
+        flush_block()
+
+    n = len(dates)
+    # Índice por ID: (clave, fila) ordenado por clave
+    order = sorted(range(n), key=lambda i: keys[i * ID_WIDTH:(i + 1) * ID_WIDTH])
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        layout = {}
+
+        def begin(name):
+            _pad8(f)
+            layout[name] = f.tell()
+
+        f.write(MAGIC)
+        begin("dates")
+        _write_array(f, dates)
+        begin("ids")
+        f.write(keys)
+        begin("sections")
+        _write_array(f, section_codes)
+        begin("url_block_offsets")
+        block_offsets = array("Q", [0])
+        for data in blocks:
+            block_offsets.append(block_offsets[-1] + len(data))
+        _write_array(f, block_offsets)
+        begin("url_blocks")
+        for data in blocks:
+            f.write(data)
+        begin("id_index")
+        for i in order:
+            f.write(keys[i * ID_WIDTH:(i + 1) * ID_WIDTH])
+            f.write(struct.pack("<I", i))
+
+        # El header va al final (recién ahí se conocen los offsets); los últimos bytes del
+        # archivo dicen dónde empieza.
+        header_at = f.tell()
+        encoded = json.dumps({"site": site, "rows": n, "block_rows": BLOCK_ROWS, "sections": list(sections),
+                              "others": others, "date_text": date_text, "layout": layout}).encode("utf-8")
+        f.write(encoded)
+        f.write(struct.pack(_FOOTER, header_at, len(encoded)))
+    os.replace(tmp, path)
+    return n
+
+
+class ReportArchive:
+    """Lector de un `.arcc` vía mmap. Usar como context manager o llamar a `close()`."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"'{path}' no es un archivo {ARCHIVE_EXT}")
+        header_at, header_len = struct.unpack_from(_FOOTER, self._mm, len(self._mm) - struct.calcsize(_FOOTER))
+        header = json.loads(bytes(self._mm[header_at:header_at + header_len]))
+        self.site = header["site"]
+        self.rows = header["rows"]
+        self.block_rows = header["block_rows"]
+        self.sections = header["sections"]
+        self._others = header["others"]
+        self._date_text = dict(header.get("date_text", ()))
+        self._layout = header["layout"]
+        n = self.rows
+        view = memoryview(self._mm)
+        self._dates = view[self._layout["dates"]:self._layout["dates"] + 8 * n].cast("q")
+        self._section_codes = view[self._layout["sections"]:self._layout["sections"] + 2 * n].cast("H")
+        n_blocks = (n + self.block_rows - 1) // self.block_rows
+        offsets_at = self._layout["url_block_offsets"]
+        self._block_offsets = view[offsets_at:offsets_at + 8 * (n_blocks + 1)].cast("Q")
+        self._block = lru_cache(maxsize=32)(self._read_block)
+
+    def __len__(self):
+        return self.rows
+
+    def _id_at(self, i):
+        start = self._layout["ids"] + i * ID_WIDTH
+        key = self._mm[start:start + ID_WIDTH]
+        if key[0] == _OTHER_TAG:
+            return self._others[int.from_bytes(key[1:], "big")]
+        return unpack_id(key)
+
+    def _read_block(self, b):
+        base = self._layout["url_blocks"]
+        data = self._mm[base + self._block_offsets[b]:base + self._block_offsets[b + 1]]
+        return zlib.decompress(data).split(_SEP)
+
+    def _url_at(self, i):
+        b, pos = divmod(i, self.block_rows)
+        return self.sections[self._section_codes[i]] + self._block(b)[pos].decode("utf-8")
+
+    def row(self, i):
+        """Fila i como (story_id, publish_date, url)."""
+        pub = self._date_text.get(i) if self._date_text else None
+        return self._id_at(i), pub or epoch_ms_to_iso(self._dates[i]), self._url_at(i)
+
+    def iter_rows(self, start=0, stop=None):
+        for i in range(start, self.rows if stop is None else stop):
+            yield self.row(i)
+
+    def date_range(self, after=None, before=None):
+        """(inicio, fin) de las filas con publish_date en [after, before] (ISO, inclusivas)."""
+        lo = bisect.bisect_left(self._dates, to_epoch_ms(after)) if after else 0
+        # Sin fecha = NO_DATE: con `after` quedan fuera; sin `after` se incluyen al principio
+        hi = bisect.bisect_right(self._dates, to_epoch_ms(before)) if before else self.rows
+        return lo, max(lo, hi)
+
+    def query(self, after=None, before=None):
+        lo, hi = self.date_range(after, before)
+        return self.iter_rows(lo, hi)
+
+    def find(self, arc_id):
+        """Fila del ID (story_id, publish_date, url), o None si no está."""
+        key = pack_id(arc_id)
+        if key is None:
+            try:
+                return self.row(self._find_other(arc_id))
+            except ValueError:
+                return None
+        base = self._layout["id_index"]
+        lo, hi = 0, self.rows
+        while lo < hi:
+            mid = (lo + hi) // 2
+            at = base + mid * _INDEX_WIDTH
+            if self._mm[at:at + ID_WIDTH] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        at = base + lo * _INDEX_WIDTH
+        if lo < self.rows and self._mm[at:at + ID_WIDTH] == key:
+            (i,) = struct.unpack_from("<I", self._mm, at + ID_WIDTH)
+            return self.row(i)
+        return None
+
+    def _find_other(self, arc_id):
+        pos = self._others.index(arc_id)
+        key = bytes([_OTHER_TAG]) + pos.to_bytes(ID_WIDTH - 1, "big")
+        # Estas claves son las mayores del índice: búsqueda lineal desde el final
+        base = self._layout["id_index"]
+        for j in range(self.rows - 1, -1, -1):
+            at = base + j * _INDEX_WIDTH
+            if self._mm[at:at + ID_WIDTH] == key:
+                return struct.unpack_from("<I", self._mm, at + ID_WIDTH)[0]
+        raise ValueError(arc_id)
+
+    def close(self):
+        self._block.cache_clear()
+        self._dates.release()
+        self._section_codes.release()
+        self._block_offsets.release()
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def archive_path_for(csv_path):
+    """`notas_publicadas_<site>_<year>.csv` -> `notas_publicadas_<site>_<year>.arcc`."""
+    return os.path.splitext(csv_path)[0] + ARCHIVE_EXT
+
+
+def read_archive_rows(path):
+    """Todas las filas (story_id, publish_date, url) de un `.arcc`."""
+    with ReportArchive(path) as archive:
+        return [(sid, pub or "", url) for sid, pub, url in archive.iter_rows()]
+
+
+def _iter_csv_rows(paths):
+    for path in paths:
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for r in reader:
+                if r:
+                    yield r[0], r[1] if len(r) > 1 else "", r[2] if len(r) > 2 else ""
+
+
+def convert_site(reports_dir, site):
+    """
+    Junta los `notas_publicadas_<site>_<year>.csv` en un solo `.arcc` por sitio. Los CSV
+    viejos no siempre están ordenados, así que pasan por el ordenamiento externo.
+    """
+    site_dir = os.path.join(reports_dir, site)
+    paths = sorted(glob.glob(os.path.join(site_dir, f"notas_publicadas_{site}_[0-9][0-9][0-9][0-9].csv")))
+    if not paths:
+        return None, 0
+    out = os.path.join(site_dir, f"notas_publicadas_{site}{ARCHIVE_EXT}")
+    with ExternalSorter(key=lambda row: iso_sort_key(row[1])) as sorter:
+        sorter.extend(_iter_csv_rows(paths))
+        return out, write_archive(out, sorter.sorted_rows(), site=site)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archivo columnar de reportes de notas")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_convert = sub.add_parser("convert", help="Convertir los CSV anuales de cada sitio a un .arcc")
+    p_convert.add_argument("--reports-dir", default=os.getenv("REPORTS_DIR", "reports_fotos"))
+    p_convert.add_argument("--site", help="Sólo este sitio (default: todos los de --reports-dir)")
+
+    p_query = sub.add_parser("query", help="Filas en un rango de fechas")
+    p_query.add_argument("archive")
+    p_query.add_argument("--after", help="publish_date mínima (ISO)")
+    p_query.add_argument("--before", help="publish_date máxima (ISO)")
+    p_query.add_argument("--out", help="CSV de salida (default: stdout)")
+
+    p_get = sub.add_parser("get", help="Buscar un ID")
+    p_get.add_argument("archive")
+    p_get.add_argument("--id", required=True)
+
+    p_export = sub.add_parser("export", help="Volver a CSV")
+    p_export.add_argument("archive")
+    p_export.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        sites = [args.site] if args.site else sorted(
+            d for d in os.listdir(args.reports_dir) if os.path.isdir(os.path.join(args.reports_dir, d)))
+        for site in sites:
+            out, n = convert_site(args.reports_dir, site)
+            if out:
+                print(f"{site}: {n} notas en '{out}' ({os.path.getsize(out) / 1e6:.1f} MB).")
+            else:
+                print(f"{site}: no hay CSV anuales para convertir.")
+
+    elif args.command == "get":
+        with ReportArchive(args.archive) as archive:
+            row = archive.find(args.id)
+        if row is None:
+            print(f"'{args.id}' no está en '{args.archive}'.")
+            sys.exit(1)
+        csv.writer(sys.stdout).writerows([NOTAS_HEADER, row])
+
+    else:
+        after = getattr(args, "after", None)
+        before = getattr(args, "before", None)
+        with ReportArchive(args.archive) as archive:
+            lo, hi = archive.date_range(after, before)
+            rows = archive.iter_rows(lo, hi)
+            if args.out:
+                with open(args.out, "w", newline="", encoding="utf-8") as f:
+                    writer = csv.writer(f)
+                    writer.writerow(NOTAS_HEADER)
+                    writer.writerows(rows)
+                print(f"Se guardaron {hi - lo} filas en '{args.out}'.")
+            else:
+                writer = csv.writer(sys.stdout)
+                writer.writerow(NOTAS_HEADER)
+                writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Los scripts viven en la raíz del repo y leen la configuración de Arc al importarse
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("ARC_ACCESS_TOKEN", "test")
+os.environ.setdefault("ORG_ID", "test")
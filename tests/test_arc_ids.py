@@ -0,0 +1,93 @@
+import pytest
+
+from arc_ids import ID_WIDTH, IdSet, IdTable, pack_id, unpack_id
+
+STORY_ID = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+OTHER_STORY_ID = "7777777777777777777777777A"
+VIDEO_ID = "0f8fad5b-d9cb-469f-a165-70867728950e"
+
+
+@pytest.mark.parametrize("arc_id", [STORY_ID, OTHER_STORY_ID, "A" * 26, "7" * 26, VIDEO_ID])
+def test_pack_id_round_trip(arc_id):
+    key = pack_id(arc_id)
+    assert len(key) == ID_WIDTH
+    assert unpack_id(key) == arc_id
+
+
+@pytest.mark.parametrize("arc_id", ["", "abc", STORY_ID.lower(), STORY_ID[:-1], STORY_ID + "A", VIDEO_ID.upper()])
+def test_pack_id_rejects_unknown_formats(arc_id):
+    assert pack_id(arc_id) is None
+
+
+def test_pack_id_keeps_base32_order():
+    ids = [STORY_ID, OTHER_STORY_ID, "A" * 26, "B" + "A" * 25]
+    b32 = "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"
+    by_value = sorted(ids, key=lambda s: [b32.index(c) for c in s])
+    assert sorted(ids, key=pack_id) == by_value
+
+
+def _story_ids(n):
+    return [unpack_id((i * 7919).to_bytes(ID_WIDTH, "big")) for i in range(1, n + 1)]
+
+
+def test_id_set_membership_across_merges(monkeypatch):
+    monkeypatch.setattr(IdSet, "MIN_PENDING", 4)
+    ids = _story_ids(50)
+    ids_set = IdSet(ids + ids[:10] + ["no-valido", VIDEO_ID, "no-valido"])
+    assert len(ids_set) == 52
+    assert all(arc_id in ids_set for arc_id in ids)
+    assert "no-valido" in ids_set and VIDEO_ID in ids_set
+    assert STORY_ID not in ids_set
+    assert "otro" not in ids_set
+
+
+def test_id_table_rows_keep_optional_columns_and_date_texts():
+    table = IdTable.from_rows([
+        (STORY_ID, "sitio-a", "2023-05-01T10:00:00Z"),
+        (VIDEO_ID, "sitio-b", "2023-05-01T09:00:00.123Z", "https://x/1"),
+        ("sin-formato", "sitio-a", None, None, "2024-01-01T00:00:00Z"),
+    ])
+    assert list(table.rows()) == [
+        (STORY_ID, "sitio-a", "2023-05-01T10:00:00Z", None, None),
+        (VIDEO_ID, "sitio-b", "2023-05-01T09:00:00.123Z", "https://x/1", None),
+        ("sin-formato", "sitio-a", None, None, "2024-01-01T00:00:00Z"),
+    ]
+    assert list(table.rows("id", "site")) == [(STORY_ID, "sitio-a"), (VIDEO_ID, "sitio-b"), ("sin-formato", "sitio-a")]
+    assert table.max_date() == "2023-05-01T10:00:00Z"
+    assert table.max_date("last_updated") == "2024-01-01T00:00:00Z"
+    with pytest.raises(ValueError):
+        list(table.rows("otro"))
+
+
+def test_id_table_dedupe_keeps_first_and_sort_moves_texts():
+    table = IdTable.from_rows([
+        (STORY_ID, "s", "2023-03-01T00:00:00Z", "u1"),
+        (OTHER_STORY_ID, "s", "2023-01-01T00:00:00-03:00", "u2"),
+        (STORY_ID, "s", "2020-01-01T00:00:00Z", "u3"),
+        ("sin-formato", "s", None, "u4"),
+        ("sin-formato", "s", None, "u5"),
+    ])
+    assert table.dedupe() == 2
+    table.sort_by_date()
+    assert list(table.rows("id", "publish_date", "url")) == [
+        ("sin-formato", None, "u4"),
+        (OTHER_STORY_ID, "2023-01-01T00:00:00-03:00", "u2"),
+        (STORY_ID, "2023-03-01T00:00:00Z", "u1"),
+    ]
+
+
+def test_id_table_group_by_date_and_extend():
+    table = IdTable.from_rows([
+        (STORY_ID, "s", "2022-12-31T23:00:00Z"),
+        (OTHER_STORY_ID, "s", "2023-01-01T00:00:00Z"),
+        (VIDEO_ID, "s", None),
+    ])
+    groups = table.group_by_date("year")
+    assert set(groups) == {"2022", "2023", None}
+    assert [row[0] for row in groups["2023"].rows("id")] == [OTHER_STORY_ID]
+    assert [row[0] for row in groups[None].rows("id")] == [VIDEO_ID]
+
+    merged = IdTable()
+    merged.extend(groups["2022"])
+    merged.extend(IdTable.from_rows([("sin-formato", "s", None, "https://x")]))
+    assert list(merged.rows("id", "url")) == [(STORY_ID, None), ("sin-formato", "https://x")]
@@ -0,0 +1,116 @@
+import pytest
+
+from delete_queue import DeleteQueue, serve
+
+
+def _items(prefix, n, site="sitio", asset_type="story"):
+    return [(f"{prefix}{i:03d}", site, asset_type, False) for i in range(n)]
+
+
+def _shard(item):
+    return f"{item[2]}:{item[1]}"
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = DeleteQueue(str(tmp_path / "cola.sqlite"))
+    yield q
+    q.close()
+
+
+def test_enqueue_batches_by_shard_and_skips_queued_ids(queue):
+    stats = {}
+    items = _items("a", 5) + _items("v", 3, asset_type="video")
+    assert queue.enqueue(items, _shard, batch_size=2, stats=stats) == 8
+    assert stats == {"already_queued": 0, "batches": 5}
+    assert queue.enqueue(items[:3] + _items("b", 1), _shard, batch_size=2, stats=stats) == 1
+    assert stats["already_queued"] == 3
+    status = {row["shard"]: row for row in queue.status()}
+    assert status["story:sitio"]["ids"] == 6
+    assert status["video:sitio"]["ids"] == 3
+
+
+def test_expired_lease_is_stolen_and_old_token_is_fenced(queue):
+    queue.enqueue(_items("a", 4), _shard)
+    first = queue.lease("w1", lease_seconds=-1)
+    assert first.attempts == 1 and first.progress == 0
+    # Lease vencido: lo toma otro worker, con un token nuevo
+    second = queue.lease("w2")
+    assert second.batch_id == first.batch_id
+    assert second.token > first.token
+    assert second.attempts == 2
+    assert queue.lease("w3") is None
+
+    # El worker viejo ya no puede guardar avance, cerrar ni devolver el lote
+    assert queue.heartbeat(first.batch_id, first.token, 0, 2, ok=2) is None
+    assert queue.release(first.batch_id, first.token, 0, 2, ok=2) is None
+    assert not queue.complete(first.batch_id, first.token)
+    assert queue.status()[0]["ok"] == 0
+
+
+def test_active_lease_is_not_stolen(queue):
+    queue.enqueue(_items("a", 4), _shard)
+    assert queue.lease("w1", lease_seconds=60) is not None
+    assert queue.lease("w2") is None
+    assert queue.status()[0]["workers"] == 1
+
+
+def test_progress_survives_crash_and_results_count_once(queue):
+    items = _items("a", 4)
+    queue.enqueue(items, _shard)
+    lease = queue.lease("w1", lease_seconds=-1)
+    failed = [items[1]]
+    assert queue.heartbeat(lease.batch_id, lease.token, 0, 2, ok=1, failed_items=failed, lease_seconds=-1) == 2
+    # Respuesta perdida: el reintento del mismo tramo no suma de nuevo
+    assert queue.heartbeat(lease.batch_id, lease.token, 0, 2, ok=1, failed_items=failed, lease_seconds=-1) == 2
+
+    # El worker muere; el que toma el lote sigue desde el avance guardado
+    resumed = queue.lease("w2")
+    assert resumed.progress == 2
+    assert resumed.items == items
+    assert not queue.complete(resumed.batch_id, resumed.token)
+    assert queue.heartbeat(resumed.batch_id, resumed.token, 2, 4, ok=2) == 4
+    assert queue.complete(resumed.batch_id, resumed.token)
+
+    status = queue.status()[0]
+    assert (status["done"], status["processed"], status["ok"], status["failed"]) == (1, 4, 3, 1)
+    assert queue.remaining() == 0
+
+
+def test_release_returns_batch_with_progress(queue):
+    queue.enqueue(_items("a", 4), _shard)
+    lease = queue.lease("w1", lease_seconds=60)
+    assert queue.release(lease.batch_id, lease.token, 0, 3, ok=3) == 3
+    again = queue.lease("w2", lease_seconds=60)
+    assert (again.batch_id, again.progress, again.attempts) == (lease.batch_id, 3, 2)
+
+
+def test_preferred_shards_then_work_stealing(queue):
+    queue.enqueue(_items("a", 2, site="uno") + _items("b", 2, site="dos"), _shard, batch_size=1)
+    taken = [queue.lease("w1", lease_seconds=60, shards=["story:dos"]).shard for _ in range(3)]
+    # Primero los lotes del shard preferido; vacío ese, roba del otro
+    assert taken == ["story:dos", "story:dos", "story:uno"]
+
+
+def test_least_loaded_shard_without_preference(queue):
+    queue.enqueue(_items("a", 2, site="uno") + _items("b", 2, site="dos"), _shard, batch_size=1)
+    first = queue.lease("w1", lease_seconds=60)
+    second = queue.lease("w2", lease_seconds=60)
+    assert first.shard != second.shard
+
+
+def test_retry_failed_requeues_failed_items(queue):
+    items = _items("a", 3)
+    queue.enqueue(items, _shard)
+    lease = queue.lease("w1")
+    queue.heartbeat(lease.batch_id, lease.token, 0, 3, ok=1, failed_items=items[1:])
+    assert queue.complete(lease.batch_id, lease.token)
+    assert queue.retry_failed() == 2
+    retry = queue.lease("w1")
+    assert retry.items == items[1:] and retry.attempts == 1
+    assert queue.retry_failed() == 0
+
+
+def test_serve_requires_token_outside_loopback(queue):
+    with pytest.raises(ValueError):
+        serve(queue, host="0.0.0.0", port=0, token="")
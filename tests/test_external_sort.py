@@ -0,0 +1,52 @@
+import csv
+import os
+import random
+
+from external_sort import ExternalSorter, iso_sort_key, write_sorted_csv
+
+
+def _rows(n, seed=7):
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n):
+        day = rnd.randint(1, 28)
+        rows.append((f"id{i:04d}", f"2023-02-{day:02d}T{rnd.randint(0, 23):02d}:00:00Z"))
+    return rows
+
+
+def test_k_way_merge_matches_sorted_and_is_stable(tmp_path):
+    rows = _rows(1000)
+    key = lambda row: iso_sort_key(row[1])
+    with ExternalSorter(key, run_rows=64, tmp_dir=str(tmp_path)) as sorter:
+        sorter.extend(rows)
+        assert len(sorter) == 1000
+        assert len(os.listdir(tmp_path)) == 1
+        expected = sorted(rows, key=key)
+        assert list(sorter.sorted_rows()) == expected
+        # Se puede recorrer de nuevo hasta close()
+        assert list(sorter.sorted_rows()) == expected
+    assert os.listdir(tmp_path) == []
+
+
+def test_sorted_rows_without_spilling(tmp_path):
+    rows = _rows(10)
+    with ExternalSorter(lambda row: row[1], run_rows=100, tmp_dir=str(tmp_path)) as sorter:
+        sorter.extend(rows)
+        assert list(sorter.sorted_rows()) == sorted(rows, key=lambda row: row[1])
+        assert os.listdir(tmp_path) == []
+
+
+def test_iso_sort_key_orders_offsets_in_utc_and_empty_first():
+    dates = ["2023-01-01T00:00:00Z", "2023-01-01T01:00:00+02:00", "", "2023-01-01T00:00:00.500Z", "basura"]
+    ordered = sorted(dates, key=iso_sort_key)
+    assert set(ordered[:2]) == {"", "basura"}
+    # 01:00+02:00 es 23:00 UTC del día anterior
+    assert ordered[2:] == ["2023-01-01T01:00:00+02:00", "2023-01-01T00:00:00Z", "2023-01-01T00:00:00.500Z"]
+
+
+def test_write_sorted_csv_is_atomic(tmp_path):
+    path = str(tmp_path / "notas.csv")
+    assert write_sorted_csv(path, ["story_id", "publish_date"], iter(_rows(3))) == 3
+    assert not os.path.exists(path + ".tmp")
+    with open(path, newline="", encoding="utf-8") as f:
+        assert next(csv.reader(f)) == ["story_id", "publish_date"]
@@ -0,0 +1,102 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from partition_planner import ONE_SECOND, balance_windows, plan_from_epochs, plan_partitions, plan_partitions_async
+from timestamps import dt_to_iso, to_epoch_ms
+
+START = datetime(2023, 1, 1)
+END = datetime(2023, 12, 31, 23, 59, 59)
+
+
+def _buckets(counts):
+    return [(START + timedelta(hours=i), START + timedelta(hours=i + 1) - ONE_SECOND, c) for i, c in enumerate(counts)]
+
+
+def test_balance_windows_respects_max_and_keeps_every_result():
+    buckets = _buckets([3, 0, 4, 4, 0, 0, 2, 5, 1, 0])
+    windows = balance_windows(buckets, max_window=8)
+    assert all(c <= 8 for _, _, c in windows)
+    assert sum(c for _, _, c in windows) == 19
+    # Cantidad mínima de ventanas (ceil(19 / 8) = 3), cortando al llegar a ceil(19 / 3) = 7
+    assert [c for _, _, c in windows] == [7, 6, 6]
+    # Contiguas: los buckets vacíos se absorben en las ventanas vecinas
+    assert windows[0][0] == buckets[0][0]
+    for (_, e, _), (s, _, _) in zip(windows, windows[1:]):
+        assert s == e + ONE_SECOND
+
+
+def test_balance_windows_drops_trailing_empty_windows_and_empty_input():
+    windows = balance_windows(_buckets([5, 5, 0, 0]), max_window=5)
+    assert [c for _, _, c in windows] == [5, 5]
+    assert windows[-1][1] == _buckets([0] * 4)[1][1]
+    assert balance_windows(_buckets([0, 0]), max_window=5) == []
+    assert balance_windows([], max_window=5) == []
+
+
+def test_balance_windows_keeps_indivisible_bucket_over_max():
+    windows = balance_windows(_buckets([2, 12, 2]), max_window=10)
+    assert [c for _, _, c in windows] == [2, 12, 2]
+
+
+def _dates(n, seed=3):
+    rnd = random.Random(seed)
+    # Concentradas en marzo para forzar niveles más finos que el mes
+    span = int((END - START).total_seconds())
+    dates = [START + timedelta(seconds=rnd.randrange(span)) for _ in range(n // 2)]
+    dates += [datetime(2023, 3, 10) + timedelta(seconds=rnd.randrange(3 * 86400)) for _ in range(n - n // 2)]
+    return dates
+
+
+def _count_fn(dates):
+    return lambda s, e: sum(s <= d <= e for d in dates)
+
+
+def _check_plan(plan, dates, max_window):
+    assert plan
+    assert all(c <= max_window for _, _, c in plan)
+    assert sum(c for _, _, c in plan) == len(dates)
+    for s, e, c in plan:
+        assert c == _count_fn(dates)(s, e)
+
+
+def test_plan_partitions_splits_down_to_windows_under_max():
+    dates = _dates(400)
+    plan = plan_partitions(START, END, _count_fn(dates), max_window=50, max_workers=4)
+    _check_plan(plan, dates, 50)
+    assert len(plan) >= 8
+
+
+def test_plan_partitions_async_matches_sync():
+    dates = _dates(400)
+    count = _count_fn(dates)
+
+    async def count_async(s, e):
+        return count(s, e)
+
+    plan = asyncio.run(plan_partitions_async(START, END, count_async, max_window=50))
+    assert plan == plan_partitions(START, END, count, max_window=50)
+
+
+def test_plan_partitions_bisects_below_one_hour():
+    dates = [datetime(2023, 6, 1, 12, 0, s) for s in range(60)]
+    plan = plan_partitions(START, END, _count_fn(dates), max_window=7)
+    _check_plan(plan, dates, 7)
+
+
+def test_plan_from_epochs_covers_range():
+    dates = _dates(400)
+    epochs = [to_epoch_ms(dt_to_iso(d)) for d in dates] + [to_epoch_ms("2024-01-01T00:00:00Z")]
+    plan = plan_from_epochs(START, END, epochs, max_window=50)
+    _check_plan(plan, dates, 50)
+    assert plan[0][0] == START and plan[-1][1] == END
+    for (_, e, _), (s, _, _) in zip(plan, plan[1:]):
+        assert s == e + ONE_SECOND
+
+
+def test_plan_from_epochs_gives_up_on_a_full_hour():
+    epochs = [to_epoch_ms("2023-06-01T12:00:00Z")] * 11
+    assert plan_from_epochs(START, END, epochs, max_window=10) is None
+    assert plan_from_epochs(START, END, [], max_window=10) == []
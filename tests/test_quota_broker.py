@@ -0,0 +1,97 @@
+import asyncio
+import json
+import socket
+
+import pytest
+
+from quota_broker import QuotaBroker, QuotaClient, _Connection, _FamilyQueue, _parse_address
+
+
+class _Writer:
+    def __init__(self, name, log):
+        self.name = name
+        self.log = log
+
+    def write(self, data):
+        self.log.append((self.name, data))
+
+
+async def _grant_all(queue, expected, log):
+    task = asyncio.create_task(queue.run())
+    try:
+        while len(log) < expected:
+            await asyncio.sleep(0.001)
+    finally:
+        task.cancel()
+
+
+def test_grants_follow_priority_then_arrival():
+    async def scenario():
+        log = []
+        queue = _FamilyQueue("org", rate=1000, burst=1)
+        queue.bucket.tokens = 0
+        for name, priority in [("b1", "bulk"), ("a1", "audit"), ("i1", "interactive"), ("a2", "audit"), ("b2", "bulk")]:
+            queue.push(_Connection(_Writer(name, log), "content", priority, name))
+        assert queue.stats()["waiting"] == {"interactive": 1, "audit": 2, "bulk": 2}
+        await _grant_all(queue, 5, log)
+        return log, queue.stats()
+
+    log, stats = asyncio.run(scenario())
+    assert [name for name, _ in log] == ["i1", "a1", "a2", "b1", "b2"]
+    assert {data for _, data in log} == {b"OK\n"}
+    assert stats["granted"] == {"audit:a1": 1, "audit:a2": 1, "bulk:b1": 1, "bulk:b2": 1, "interactive:i1": 1}
+
+
+def test_closed_connections_are_skipped():
+    async def scenario():
+        log = []
+        queue = _FamilyQueue("org", rate=1000, burst=10)
+        gone = _Connection(_Writer("gone", log), "content", "interactive", "x")
+        queue.push(gone)
+        queue.push(_Connection(_Writer("bulk", log), "content", "bulk", "y"))
+        gone.closed = True
+        await _grant_all(queue, 1, log)
+        await asyncio.sleep(0.01)
+        return log
+
+    assert [name for name, _ in asyncio.run(scenario())] == ["bulk"]
+
+
+def test_broker_protocol_over_unix_socket(tmp_path):
+    path = str(tmp_path / "quota.sock")
+
+    async def scenario():
+        broker = QuotaBroker(lambda family: 1000.0, lambda family: 10, per_family=True)
+        server = await asyncio.start_unix_server(broker.handle, path=path)
+        async with server:
+            reader, writer = await asyncio.open_unix_connection(path)
+            writer.write(b"HELLO video desconocida test\nACQ\nACQ\nPING\n")
+            lines = [await asyncio.wait_for(reader.readline(), 5) for _ in range(4)]
+            writer.write(b"STATS\n")
+            stats = json.loads(await asyncio.wait_for(reader.readline(), 5))
+            writer.close()
+        return lines, stats
+
+    lines, stats = asyncio.run(scenario())
+    assert sorted(lines) == [b"OK\n", b"OK\n", b"OK\n", b"PONG\n"]
+    assert lines[0] == b"OK\n"
+    # Prioridad desconocida -> la de defecto; con per_family la cola es la de la familia
+    assert stats["families"]["video"]["granted"] == {"audit:test": 2}
+
+
+def test_client_without_broker_falls_back_immediately(tmp_path, capsys):
+    client = QuotaClient(str(tmp_path / "no-existe.sock"), priority="otra")
+    assert client.priority == "audit"
+    client.acquire()
+    client.acquire()
+    assert capsys.readouterr().out.count("no disponible") == 1
+    assert not client._available()
+
+
+@pytest.mark.parametrize("address, parsed", [
+    ("/tmp/arc_quota.sock", (socket.AF_UNIX, "/tmp/arc_quota.sock")),
+    ("127.0.0.1:8791", (socket.AF_INET, ("127.0.0.1", 8791))),
+    (":8791", (socket.AF_INET, ("127.0.0.1", 8791))),
+])
+def test_parse_address(address, parsed):
+    assert _parse_address(address) == parsed
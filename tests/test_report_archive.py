@@ -0,0 +1,80 @@
+import pytest
+
+import report_archive
+from arc_ids import ID_WIDTH, unpack_id
+from external_sort import iso_sort_key
+from report_archive import ReportArchive, read_archive_rows, split_url, write_archive
+
+
+def _story_id(i):
+    return unpack_id((i * 104729).to_bytes(ID_WIDTH, "big"))
+
+
+def _rows():
+    rows = [
+        ("sin-formato", "", "https://sitio.com/deportes/nota-sin-fecha"),
+        ("0f8fad5b-d9cb-469f-a165-70867728950e", "2019-12-31T22:00:00-03:00", "https://sitio.com/videos/uuid"),
+        (_story_id(1), "2020-01-01T00:00:00.960Z", "/espectaculos/relativa"),
+        (_story_id(2), "2020-01-01T00:00:01Z", ""),
+        (_story_id(3), "2020-01-01T00:00:01Z", "https://sitio.com"),
+    ]
+    for i in range(4, 40):
+        rows.append((_story_id(i), f"2020-01-{i // 2:02d}T{i % 24:02d}:00:00Z", f"https://sitio.com/seccion{i % 3}/nota-{i}"))
+    return sorted(rows, key=lambda row: iso_sort_key(row[1]))
+
+
+@pytest.fixture
+def archive_path(tmp_path, monkeypatch):
+    # Bloques chicos para que las URLs queden repartidas en varios bloques zlib
+    monkeypatch.setattr(report_archive, "BLOCK_ROWS", 4)
+    path = str(tmp_path / "notas_publicadas_sitio.arcc")
+    assert write_archive(path, _rows(), site="sitio") == len(_rows())
+    return path
+
+
+def test_round_trip_through_mmap(archive_path):
+    assert read_archive_rows(archive_path) == _rows()
+    with ReportArchive(archive_path) as archive:
+        assert archive.site == "sitio"
+        assert len(archive) == len(_rows())
+        assert archive.block_rows == 4
+        assert list(archive.iter_rows(3, 6)) == _rows()[3:6]
+
+
+def test_find_by_id(archive_path):
+    with ReportArchive(archive_path) as archive:
+        for row in _rows():
+            assert archive.find(row[0])[::2] == (row[0], row[2])
+        assert archive.find(_story_id(999)) is None
+        assert archive.find("otro-sin-formato") is None
+
+
+def test_query_date_range_is_inclusive(archive_path):
+    with ReportArchive(archive_path) as archive:
+        rows = list(archive.query(after="2020-01-01T00:00:01Z", before="2020-01-02T05:00:00Z"))
+    expected = [row for row in _rows()
+                if row[1] and iso_sort_key("2020-01-01T00:00:01Z") <= iso_sort_key(row[1]) <= iso_sort_key("2020-01-02T05:00:00Z")]
+    assert rows and [row[0] for row in rows] == [row[0] for row in expected]
+
+
+def test_write_requires_rows_sorted_by_date(tmp_path):
+    path = str(tmp_path / "x.arcc")
+    with pytest.raises(ValueError):
+        write_archive(path, [(_story_id(1), "2020-01-02T00:00:00Z", ""), (_story_id(2), "2020-01-01T00:00:00Z", "")])
+
+
+def test_rejects_files_without_magic(tmp_path):
+    path = tmp_path / "x.arcc"
+    path.write_bytes(b"story_id,publish_date,url\n" + b"\0" * 32)
+    with pytest.raises(ValueError):
+        ReportArchive(str(path))
+
+
+@pytest.mark.parametrize("url, parts", [
+    ("https://sitio.com/deportes/nota", ("https://sitio.com/deportes/", "nota")),
+    ("https://sitio.com", ("https://sitio.com", "")),
+    ("/espectaculos/nota", ("/espectaculos/", "nota")),
+    ("", ("", "")),
+])
+def test_split_url(url, parts):
+    assert split_url(url) == parts
@@ -0,0 +1,67 @@
+import math
+
+import pytest
+
+from verify_sample import stratified_estimate, wilson_interval
+
+Z95 = 1.959963984540054
+
+
+def test_wilson_interval_known_value():
+    lo, hi = wilson_interval(0.5, 100, Z95)
+    assert lo == pytest.approx(0.4038, abs=1e-4)
+    assert hi == pytest.approx(0.5962, abs=1e-4)
+
+
+@pytest.mark.parametrize("p", [0.0, 0.01, 0.3, 1.0])
+def test_wilson_interval_stays_in_unit_range_and_is_symmetric(p):
+    lo, hi = wilson_interval(p, 50, Z95)
+    assert 0.0 <= lo <= p + 1e-12
+    assert p <= hi <= 1.0
+    mirror_lo, mirror_hi = wilson_interval(1 - p, 50, Z95)
+    assert lo == pytest.approx(1 - mirror_hi)
+    assert hi == pytest.approx(1 - mirror_lo)
+
+
+def test_wilson_interval_with_zero_hits_is_not_degenerate():
+    lo, hi = wilson_interval(0.0, 100, Z95)
+    assert lo == pytest.approx(0.0, abs=1e-12)
+    assert 0.03 < hi < 0.04
+
+
+def test_wilson_interval_without_sample():
+    assert wilson_interval(0.0, 0, Z95) == (0.0, 1.0)
+
+
+def test_single_stratum_is_the_simple_proportion():
+    p, lo, hi = stratified_estimate({"a": 10000}, {"a": 7}, {"a": 100}, Z95)
+    assert p == pytest.approx(0.07)
+    assert lo < 0.07 < hi
+
+
+def test_strata_are_weighted_by_population():
+    sizes = {"grande": 900, "chico": 100}
+    # Mismo tamaño de muestra por estrato: sin ponderar, el estrato chico pesaría de más (30/100)
+    p, lo, hi = stratified_estimate(sizes, {"grande": 5, "chico": 25}, {"grande": 50, "chico": 50}, Z95)
+    assert p == pytest.approx(0.9 * 0.1 + 0.1 * 0.5)
+    assert lo < p < hi < 0.3
+
+
+def test_finite_population_correction_narrows_interval():
+    narrow = stratified_estimate({"a": 120}, {"a": 10}, {"a": 100}, Z95)
+    wide = stratified_estimate({"a": 10 ** 6}, {"a": 10}, {"a": 100}, Z95)
+    assert narrow[0] == wide[0]
+    assert narrow[2] - narrow[1] < wide[2] - wide[1]
+
+
+def test_census_without_variance_uses_total_sample():
+    p, lo, hi = stratified_estimate({"a": 50, "b": 50}, {"a": 0, "b": 0}, {"a": 50, "b": 50}, Z95)
+    assert (p, lo, hi) == (0.0, *wilson_interval(0.0, 100, Z95))
+
+
+def test_unsampled_strata_and_empty_input():
+    p, _, _ = stratified_estimate({"a": 100, "b": 100}, {"a": 10}, {"a": 50}, Z95)
+    assert p == pytest.approx(0.5 * 10 / 50)
+    assert stratified_estimate({}, {}, {}, Z95) == (0.0, 0.0, 1.0)
+    assert stratified_estimate({"a": 100}, {}, {}, Z95) == (0.0, 0.0, 1.0)
+    assert not math.isnan(stratified_estimate({"a": 100}, {"a": 1}, {"a": 1}, Z95)[1])
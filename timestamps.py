@@ -0,0 +1,193 @@
+"""
+Fechas de Arc (ISO-8601) compartidas por las auditorías, el particionado y los reportes.
+
+Casi todas las fechas que devuelve la Content API tienen la forma fija `YYYY-MM-DDTHH:MM:SSZ`:
+para esas se leen los campos por posición y el día se resuelve con un cache (en un año hay
+sólo 365 fechas distintas), sin strptime ni excepciones. Las variantes con milisegundos
+(`...:34.842Z`), con offset (`-03:00`) o sin zona (se asume UTC) pasan por fromisoformat.
+
+`parse_iso` devuelve siempre datetimes naive en UTC, así se pueden comparar entre sí sin
+importar con qué variante vino cada fecha. Para columnas enteras conviene trabajar con
+epochs en milisegundos (`to_epoch_ms_array`), que se ordenan y agrupan como enteros.
+"""
+from array import array
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+
+ISO_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+NO_DATE = -(2 ** 63)
+MS_PER_DAY = 86_400_000
+MS_PER_HOUR = 3_600_000
+BUCKET_LEVELS = ("year", "month", "day", "hour")
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_DATE = _EPOCH.date()
+
+
+@lru_cache(maxsize=1 << 16)
+def _days_from_date(text):
+    """`YYYY-MM-DD` -> días desde 1970-01-01."""
+    return (date(int(text[0:4]), int(text[5:7]), int(text[8:10])) - _EPOCH_DATE).days
+
+
+@lru_cache(maxsize=1 << 16)
+def _date_from_days(days):
+    """Días desde 1970-01-01 -> `YYYY-MM-DD`."""
+    return (_EPOCH_DATE + timedelta(days=days)).isoformat()
+
+
+# "YYYY-MM-DDTHH" -> segundos desde epoch al comienzo de esa hora. Un año tiene ~8.760 horas.
+_hour_starts = {}
+_HOUR_CACHE_MAX = 1 << 17
+
+
+def _hour_start(prefix):
+    seconds = _hour_starts.get(prefix)
+    if seconds is None:
+        seconds = _days_from_date(prefix[:10]) * 86400 + int(prefix[11:13]) * 3600
+        if len(_hour_starts) >= _HOUR_CACHE_MAX:
+            _hour_starts.clear()
+        _hour_starts[prefix] = seconds
+    return seconds
+
+
+# "MM:SS" -> segundos: una búsqueda en un dict es varias veces más rápida que dos int().
+_MINUTE_SECONDS = {f"{m:02d}:{sec:02d}": m * 60 + sec for m in range(60) for sec in range(60)}
+
+
+def _is_fixed_form(s):
+    return len(s) == 20 and s[19] == "Z" and s[10] == "T"
+
+
+def _slow_epoch_ms(s):
+    dt = datetime.fromisoformat(s[:-1] + "+00:00" if s.endswith("Z") else s)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    delta = dt - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000 + delta.microseconds // 1000
+
+
+def to_epoch_ms(s):
+    """Fecha ISO a epoch en milisegundos (UTC). NO_DATE si viene vacía o no se puede leer."""
+    if not s:
+        return NO_DATE
+    try:
+        if _is_fixed_form(s):
+            return (_hour_start(s[:13]) + _MINUTE_SECONDS[s[14:19]]) * 1000
+        return _slow_epoch_ms(s)
+    except (KeyError, ValueError):
+        return NO_DATE
+
+
+def epoch_ms_to_iso(ms):
+    """Epoch en ms a `YYYY-MM-DDTHH:MM:SSZ` (con `.mmm` si hay milisegundos). None para NO_DATE."""
+    if ms == NO_DATE:
+        return None
+    days, rest = divmod(ms, MS_PER_DAY)
+    seconds, millis = divmod(rest, 1000)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    text = f"{_date_from_days(days)}T{hours:02d}:{minutes:02d}:{seconds:02d}"
+    return f"{text}.{millis:03d}Z" if millis else f"{text}Z"
+
+
+def parse_iso(s):
+    """Fecha ISO a datetime naive en UTC, o None si viene vacía o no se puede leer."""
+    if not s:
+        return None
+    if _is_fixed_form(s):
+        try:
+            return datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]), int(s[11:13]), int(s[14:16]), int(s[17:19]))
+        except ValueError:
+            return None
+    ms = to_epoch_ms(s)
+    if ms == NO_DATE:
+        return None
+    return _EPOCH + timedelta(milliseconds=ms)
+
+
+def dt_to_iso(dt):
+    """datetime (naive = UTC, o con zona) a `YYYY-MM-DDTHH:MM:SSZ`."""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.strftime(ISO_FORMAT)
+
+
+def to_epoch_ms_array(values):
+    """Convierte una columna de fechas ISO en `array('q')` de epochs en ms (NO_DATE para las vacías)."""
+    hour_starts = _hour_starts
+    minute_seconds = _MINUTE_SECONDS
+    out = array("q")
+    append = out.append
+    for s in values:
+        if s and len(s) == 20 and s[19] == "Z":
+            start = hour_starts.get(s[:13])
+            ms = minute_seconds.get(s[14:19])
+            if start is not None and ms is not None:
+                append((start + ms) * 1000)
+                continue
+        append(to_epoch_ms(s))
+    return out
+
+
+def bucket_key(ms, level="year"):
+    """Clave de calendario UTC (`2021`, `2021-03`, `2021-03-07` o `2021-03-07T14`) de un epoch en ms."""
+    if ms == NO_DATE:
+        return None
+    days, rest = divmod(ms, MS_PER_DAY)
+    text = _date_from_days(days)
+    if level == "year":
+        return text[:4]
+    if level == "month":
+        return text[:7]
+    if level == "day":
+        return text
+    if level == "hour":
+        return f"{text}T{rest // MS_PER_HOUR:02d}"
+    raise ValueError(f"Nivel desconocido: {level} (usar uno de {BUCKET_LEVELS})")
+
+
+def bucket_keys(epochs, level="year"):
+    """`bucket_key` de cada epoch de la columna (None para NO_DATE), resolviendo cada día una sola vez."""
+    unit = MS_PER_HOUR if level == "hour" else MS_PER_DAY
+    keys = {}
+    out = []
+    append = out.append
+    for ms in epochs:
+        if ms == NO_DATE:
+            append(None)
+            continue
+        u = ms // unit
+        key = keys.get(u)
+        if key is None:
+            key = keys[u] = bucket_key(u * unit, level)
+        append(key)
+    return out
+
+
+def bucket_counts(epochs, level="year"):
+    """Cuenta epochs por bucket de calendario. Devuelve {clave: count} ordenado por clave."""
+    # Se agrupa primero por día (u hora) con una división entera y recién después se arma la
+    # clave de cada uno: en un año hay 365 días, no 250.000 claves que formatear
+    unit = MS_PER_HOUR if level == "hour" else MS_PER_DAY
+    per_unit = {}
+    undated = 0
+    for ms in epochs:
+        if ms == NO_DATE:
+            undated += 1
+            continue
+        u = ms // unit
+        per_unit[u] = per_unit.get(u, 0) + 1
+    counts = {}
+    for u, n in per_unit.items():
+        key = bucket_key(u * unit, level)
+        counts[key] = counts.get(key, 0) + n
+    result = dict(sorted(counts.items()))
+    if undated:
+        result[None] = undated
+    return result
+
+
+def argsort(epochs):
+    """Índices que ordenan la columna de epochs (estable; las filas sin fecha primero)."""
+    return sorted(range(len(epochs)), key=epochs.__getitem__)
@@ -1,47 +1,405 @@
-import os
+"""
+Verifica contra la Content API que los IDs de una lista de borrado existan, en lotes de hasta
+BATCH_SIZE IDs por petición (`q=_id:("A" OR "B" ...)`) en lugar de una búsqueda por ID.
+Los lotes se agrupan por sitio y se piden en paralelo bajo el limitador común de arc_client,
+así que 25.000 IDs son ~250 peticiones.
+
+Acepta los mismos archivos que pipeline_notas.py: CSVs (también .csv.gz) de las auditorías,
+directorios de CSVs o un TXT con un ID por línea. Sin columna de sitio se usa --website.
+
+Con --sample N no se verifica todo: se toma una muestra aleatoria estratificada por sitio y
+por posición en el archivo (--strata tramos contiguos por sitio), se clasifica cada ID
+(no existe, otro tipo, publicado después del corte) y se estima la tasa de error de la lista
+completa con intervalos de confianza.
+
+Uso:
+  python verify_sample.py todos_los_videos_para_eliminar_fayerwayer.csv
+  python verify_sample.py reports_fotos/nuevamujer --out verificacion.csv --missing-out faltantes.csv
+  python verify_sample.py ids.txt --website fayerwayer --workers 8
+  python verify_sample.py todos_los_videos_para_eliminar_*.csv --sample 1000 --expect-type video --cutoff 2024-12-31T23:59:59Z
+"""
+import argparse
 import csv
-import requests
+import itertools
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from statistics import NormalDist
+
 from dotenv import load_dotenv
 
+from arc_client import ArcClient
+from arc_ids import IdSet, IdTable
+from arc_metrics import finish_run, start_metrics_server
+from id_lists import BATCH_SIZE, fetch_batch, find_input_files, iter_ids_from_txt, iter_rows_from_csv
+from timestamps import NO_DATE, to_epoch_ms
+
 load_dotenv()
 ARC_ACCESS_TOKEN = os.getenv('ARC_ACCESS_TOKEN')
 ORG_ID = os.getenv('ORG_ID')
-if not (ARC_ACCESS_TOKEN and ORG_ID):
-    print('Faltan ARC_ACCESS_TOKEN u ORG_ID en .env')
-    raise SystemExit(1)
-
-API_BASE_URL = f"https://api.{ORG_ID}.arcpublishing.com/content/v4/search/published"
-
-csv_path = 'todos_los_videos_para_eliminar_fayerwayer.csv'
-
-ids = []
-with open(csv_path, newline='', encoding='utf-8') as f:
-    reader = csv.reader(f)
-    next(reader, None)
-    for i, row in enumerate(reader):
-        if i >= 5:
-            break
-        if row:
-            ids.append(row[0])
-
-session = requests.Session()
-session.headers.update({'Authorization': f'Bearer {ARC_ACCESS_TOKEN}', 'Content-Type': 'application/json'})
-
-for vid in ids:
-    params = {'q': f'_id:{vid}', 'size': 1, 'website': 'fayerwayer', '_sourceInclude': '_id,type,publish_date,headlines'}
-    r = session.get(API_BASE_URL, params=params, timeout=30)
+
+DEFAULT_WORKERS = 6
+SOURCE_INCLUDE = ['_id', 'type', 'publish_date', 'canonical_website']
+RESULT_HEADER = ['arc_id', 'website_name', 'exists', 'type', 'publish_date']
+SAMPLE_HEADER = ['arc_id', 'website_name', 'stratum', 'outcome', 'type', 'publish_date']
+DEFAULT_CUTOFF = os.getenv("DELETE_CUTOFF_DATE", "2024-12-31T23:59:59Z")
+DEFAULT_STRATA = 4
+# Resultados posibles de un ID muestreado; todo lo que no es "ok" es un error de la lista
+OUTCOMES = ('ok', 'missing', 'wrong_type', 'after_cutoff')
+
+
+def iter_input_ids(paths):
+    """(id, sitio) de cada archivo o directorio, con el mismo cargador que pipeline_notas (ver id_lists.py)."""
+    for path in paths:
+        if os.path.isdir(path):
+            for csv_path in find_input_files(path):
+                yield from iter_rows_from_csv(csv_path)
+        elif path.lower().endswith(('.csv', '.csv.gz')):
+            yield from iter_rows_from_csv(path)
+        else:
+            yield from iter_ids_from_txt(path)
+
+
+def iter_batches(rows, default_site=None, batch_size=BATCH_SIZE, stats=None):
+    """
+    Agrupa (id, sitio) en lotes (sitio, [ids]) de hasta `batch_size`, deduplicando en
+    streaming. Los IDs sin sitio (y sin `default_site`) se cuentan en stats['no_site'].
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault('duplicates', 0)
+    stats.setdefault('no_site', 0)
+    seen = IdSet()
+    pending = {}
+    for arc_id, site in rows:
+        site = site or default_site
+        if not site:
+            stats['no_site'] += 1
+            continue
+        if arc_id in seen:
+            stats['duplicates'] += 1
+            continue
+        seen.add(arc_id)
+        batch = pending.setdefault(site, [])
+        batch.append(arc_id)
+        if len(batch) >= batch_size:
+            yield site, pending.pop(site)
+    for site, batch in pending.items():
+        if batch:
+            yield site, batch
+
+
+def verify_batches(session, batches, workers=DEFAULT_WORKERS, source_include=SOURCE_INCLUDE, on_result=None):
+    """
+    Pide los lotes en paralelo (a lo sumo `workers * 2` en vuelo, así la entrada se lee en
+    streaming) y llama a `on_result(site, ids, found)` por lote, con `found` = {id: doc} o
+    None si el lote falló. Devuelve cuántos lotes fallaron.
+    """
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = {}
+
+        def drain(return_when):
+            nonlocal failed
+            done, _ = wait(in_flight, return_when=return_when)
+            for future in done:
+                site, ids = in_flight.pop(future)
+                try:
+                    found = future.result()
+                except Exception as e:
+                    print(f"Error verificando un lote de {len(ids)} IDs de '{site}': {e}")
+                    failed += 1
+                    found = None
+                if on_result:
+                    on_result(site, ids, found)
+
+        for site, ids in batches:
+            in_flight[pool.submit(fetch_batch, session, site, ids, source_include)] = (site, ids)
+            if len(in_flight) >= workers * 2:
+                drain(FIRST_COMPLETED)
+        while in_flight:
+            drain(FIRST_COMPLETED)
+    return failed
+
+
+# --- Muestreo estratificado ---
+
+def load_table(rows, default_site=None, stats=None):
+    """Carga (id, sitio) en una IdTable deduplicada, conservando el orden del archivo."""
+    if stats is None:
+        stats = {}
+    stats.setdefault('duplicates', 0)
+    stats.setdefault('no_site', 0)
+    table = IdTable()
+    seen = IdSet()
+    for arc_id, site in rows:
+        site = site or default_site
+        if not site:
+            stats['no_site'] += 1
+            continue
+        if arc_id in seen:
+            stats['duplicates'] += 1
+            continue
+        seen.add(arc_id)
+        table.append(arc_id, site)
+    return table
+
+
+def build_strata(table, position_strata=DEFAULT_STRATA):
+    """
+    Estratos (sitio, tramo) -> índices de fila. Cada sitio se parte en `position_strata`
+    tramos contiguos en el orden del archivo, así un error concentrado al principio o al
+    final de la lista no queda fuera de la muestra.
+    """
+    by_site = {}
+    for i, (site,) in enumerate(table.rows("site")):
+        by_site.setdefault(site, []).append(i)
+    strata = {}
+    for site, rows in by_site.items():
+        k = max(1, min(position_strata, len(rows)))
+        for part in range(k):
+            chunk = rows[part * len(rows) // k:(part + 1) * len(rows) // k]
+            if chunk:
+                strata[(site, part)] = chunk
+    return strata
+
+
+def allocate_sample(strata, sample_size, min_per_stratum=2):
+    """Tamaño de muestra por estrato, proporcional a su tamaño (con un mínimo por estrato)."""
+    total = sum(len(rows) for rows in strata.values())
+    alloc = {}
+    for key, rows in strata.items():
+        n = round(sample_size * len(rows) / total) if total else 0
+        alloc[key] = min(len(rows), max(min_per_stratum, n))
+    return alloc
+
+
+def classify(doc, expect_type=None, cutoff_ms=None):
+    if doc is None:
+        return 'missing'
+    if expect_type and doc.get('type') != expect_type:
+        return 'wrong_type'
+    if cutoff_ms is not None:
+        published = to_epoch_ms(doc.get('publish_date'))
+        if published != NO_DATE and published > cutoff_ms:
+            return 'after_cutoff'
+    return 'ok'
+
+
+def wilson_interval(p, n, z):
+    """Intervalo de Wilson para una proporción; se comporta bien con p cerca de 0 o 1."""
+    if n <= 0:
+        return 0.0, 1.0
+    denom = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+def stratified_estimate(strata_sizes, strata_hits, strata_samples, z):
+    """
+    Estimador estratificado de una proporción: p = sum(W_h * p_h) con W_h = N_h / N, varianza
+    con corrección por población finita. El intervalo es de Wilson sobre el tamaño de muestra
+    efectivo (n_eff = p(1-p)/var), o sobre la muestra total si la varianza da 0.
+    Devuelve (p, inferior, superior).
+    """
+    total = sum(strata_sizes.values())
+    n_total = sum(strata_samples.values())
+    if not total or not n_total:
+        return 0.0, 0.0, 1.0
+    p = 0.0
+    var = 0.0
+    for key, size in strata_sizes.items():
+        n = strata_samples.get(key, 0)
+        if not n:
+            continue
+        w = size / total
+        p_h = strata_hits.get(key, 0) / n
+        p += w * p_h
+        if n > 1:
+            var += w * w * (1 - n / size) * p_h * (1 - p_h) / (n - 1)
+    n_eff = p * (1 - p) / var if var > 0 else n_total
+    lo, hi = wilson_interval(p, n_eff, z)
+    return p, lo, hi
+
+
+def run_sample(session, table, args):
+    """Muestrea, verifica la muestra en lotes concurrentes y devuelve {estrato: Counter de resultados}."""
+    rng = random.Random(args.seed)
+    strata = build_strata(table, args.strata)
+    alloc = allocate_sample(strata, args.sample)
+    sampled = {}
+    for key, rows in strata.items():
+        for i in rng.sample(rows, alloc[key]):
+            sampled[i] = key
+    print(f"Muestra: {len(sampled)} de {len(table)} IDs en {len(strata)} estratos (sitio x tramo).")
+
+    ids_by_index = {}
+    for i, (arc_id, site) in enumerate(table.rows("id", "site")):
+        if i in sampled:
+            ids_by_index[arc_id] = (site, sampled[i])
+
+    def batches():
+        by_site = {}
+        for arc_id, (site, _) in ids_by_index.items():
+            by_site.setdefault(site, []).append(arc_id)
+        for site, ids in by_site.items():
+            for start in range(0, len(ids), BATCH_SIZE):
+                yield site, ids[start:start + BATCH_SIZE]
+
+    cutoff_ms = to_epoch_ms(args.cutoff) if args.cutoff else None
+    results = {key: {o: 0 for o in OUTCOMES} for key in strata}
+    out_f = open(args.out, 'w', newline='', encoding='utf-8') if args.out else None
+    out = csv.writer(out_f) if out_f else None
+    if out:
+        out.writerow(SAMPLE_HEADER)
+
+    def on_result(site, ids, found):
+        for arc_id in ids:
+            key = ids_by_index[arc_id][1]
+            if found is None:
+                continue
+            doc = found.get(arc_id)
+            outcome = classify(doc, args.expect_type, cutoff_ms)
+            results[key][outcome] += 1
+            if out:
+                out.writerow([arc_id, site, key[1], outcome, (doc or {}).get('type', ''), (doc or {}).get('publish_date', '')])
+
+    try:
+        failed = verify_batches(session, batches(), max(1, args.workers), on_result=on_result)
+    finally:
+        if out_f:
+            out_f.close()
+    return strata, results, failed
+
+
+def report_sample(strata, results, confidence):
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    sizes = {key: len(rows) for key, rows in strata.items()}
+    samples = {key: sum(counts.values()) for key, counts in results.items()}
+    total = sum(sizes.values())
+    print(f"\nEstimaciones para la lista completa ({total} IDs), confianza {confidence:.0%}:")
+    for outcome in OUTCOMES:
+        hits = {key: counts[outcome] for key, counts in results.items()}
+        p, lo, hi = stratified_estimate(sizes, hits, samples, z)
+        label = 'válidos' if outcome == 'ok' else outcome
+        print(f"  {label:13} {p:7.2%}  [{lo:6.2%} - {hi:6.2%}]  ~{round(p * total)} IDs  ({sum(hits.values())} en la muestra)")
+
+    print("\nPor sitio (error = todo lo que no es válido):")
+    for site in sorted({key[0] for key in strata}):
+        keys = [key for key in strata if key[0] == site]
+        site_sizes = {key: sizes[key] for key in keys}
+        errors = {key: samples[key] - results[key]['ok'] for key in keys}
+        p, lo, hi = stratified_estimate(site_sizes, errors, {key: samples[key] for key in keys}, z)
+        print(f"  {site:20} {sum(site_sizes.values()):>8} IDs  muestra {sum(samples[k] for k in keys):>5}"
+              f"  error {p:7.2%}  [{lo:6.2%} - {hi:6.2%}]")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verificación en lote de IDs de una lista de borrado")
+    parser.add_argument('paths', nargs='*', default=['todos_los_videos_para_eliminar_fayerwayer.csv'],
+                        help='CSVs, directorios de CSVs o TXT con IDs')
+    parser.add_argument('--website', help='Sitio para los IDs que no traen columna de sitio')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Lotes en paralelo (default: {DEFAULT_WORKERS}); la velocidad la limita arc_client')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help=f'IDs por petición (máx. {BATCH_SIZE})')
+    parser.add_argument('--limit', type=int, help='Verificar sólo los primeros N IDs')
+    parser.add_argument('--out', help='CSV con el resultado de cada ID')
+    parser.add_argument('--missing-out', help='CSV (arc_id,website_name) con los IDs que no existen')
+    parser.add_argument('--sample', type=int, help='Verificar sólo una muestra estratificada de N IDs y estimar el error')
+    parser.add_argument('--strata', type=int, default=DEFAULT_STRATA,
+                        help=f'Tramos por sitio según la posición en el archivo (default: {DEFAULT_STRATA})')
+    parser.add_argument('--expect-type', help='Tipo esperado (p. ej. video); otro tipo cuenta como error')
+    parser.add_argument('--cutoff', default=DEFAULT_CUTOFF,
+                        help=f'publish_date máxima esperada (default: DELETE_CUTOFF_DATE o {DEFAULT_CUTOFF}); vacío = sin corte')
+    parser.add_argument('--confidence', type=float, default=0.95, help='Nivel de confianza de los intervalos (default: 0.95)')
+    parser.add_argument('--seed', type=int, help='Semilla para repetir la misma muestra')
+    args = parser.parse_args()
+
+    if not (ARC_ACCESS_TOKEN and ORG_ID):
+        print('Faltan ARC_ACCESS_TOKEN u ORG_ID en .env')
+        raise SystemExit(1)
+
+    rows = iter_input_ids(args.paths)
+    if args.limit:
+        rows = itertools.islice(rows, args.limit)
+
+    if args.sample:
+        load_stats = {}
+        t0 = time.time()
+        table = load_table(rows, args.website, load_stats)
+        print(f"Cargados {len(table)} IDs en {time.time() - t0:.1f}s ({load_stats['duplicates']} duplicados,"
+              f" {load_stats['no_site']} sin sitio).")
+        if not len(table):
+            print("No hay IDs para muestrear.")
+            return
+        start_metrics_server()
+        t0 = time.time()
+        with ArcClient(token=ARC_ACCESS_TOKEN, verbose=False, priority="interactive") as session:
+            strata, results, failed = run_sample(session, table, args)
+        print(f"Muestra verificada en {time.time() - t0:.1f}s ({failed} lotes fallidos).")
+        report_sample(strata, results, args.confidence)
+        finish_run(concurrency=args.workers)
+        if failed:
+            sys.exit(1)
+        return
+
+    load_stats = {}
+    batches = iter_batches(rows, args.website, max(1, min(args.batch_size, BATCH_SIZE)), load_stats)
+
+    totals = {'checked': 0, 'found': 0, 'missing': 0, 'unknown': 0}
+    by_type = {}
+    out_f = open(args.out, 'w', newline='', encoding='utf-8') if args.out else None
+    missing_f = open(args.missing_out, 'w', newline='', encoding='utf-8') if args.missing_out else None
+    out = csv.writer(out_f) if out_f else None
+    missing = csv.writer(missing_f) if missing_f else None
+    if out:
+        out.writerow(RESULT_HEADER)
+    if missing:
+        missing.writerow(['arc_id', 'website_name'])
+
+    def on_result(site, ids, found):
+        totals['checked'] += len(ids)
+        if found is None:
+            totals['unknown'] += len(ids)
+            return
+        for arc_id in ids:
+            doc = found.get(arc_id)
+            if doc:
+                totals['found'] += 1
+                by_type[doc.get('type')] = by_type.get(doc.get('type'), 0) + 1
+            else:
+                totals['missing'] += 1
+                if missing:
+                    missing.writerow([arc_id, site])
+            if out:
+                out.writerow([arc_id, site, 'yes' if doc else 'no', (doc or {}).get('type', ''), (doc or {}).get('publish_date', '')])
+        if totals['checked'] % (BATCH_SIZE * 20) < len(ids):
+            print(f"--> {totals['checked']} IDs verificados ({totals['found']} existen, {totals['missing']} no)")
+
+    start_metrics_server()
+    t0 = time.time()
     try:
-        r.raise_for_status()
-    except Exception as e:
-        print(f'Error fetching {vid}:', e, r.text[:200])
-        continue
-    data = r.json()
-    elems = data.get('content_elements', [])
-    if not elems:
-        print(f'{vid}: not found in API response')
-        continue
-    el = elems[0]
-    t = el.get('type')
-    pd = el.get('publish_date')
-    title = el.get('headlines', {}).get('basic') if el.get('headlines') else None
-    print(f'{vid} -> type={t} publish_date={pd} title={title}')
+        with ArcClient(token=ARC_ACCESS_TOKEN, verbose=False, priority="interactive") as session:
+            failed = verify_batches(session, batches, max(1, args.workers), on_result=on_result)
+    finally:
+        for f in (out_f, missing_f):
+            if f:
+                f.close()
+    elapsed = time.time() - t0
+
+    print(f"\nVerificados {totals['checked']} IDs en {elapsed:.1f}s: {totals['found']} existen, "
+          f"{totals['missing']} no existen (o no están publicados), {totals['unknown']} sin verificar ({failed} lotes fallidos).")
+    if by_type:
+        print("Por tipo: " + ", ".join(f"{t}={n}" for t, n in sorted(by_type.items(), key=lambda kv: -kv[1])))
+    print(f"Descartados: {load_stats['duplicates']} duplicados | {load_stats['no_site']} sin sitio (usar --website)")
+    finish_run(concurrency=args.workers)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()